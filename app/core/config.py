@@ -11,6 +11,8 @@ class Settings(BaseModel):
     API_V1_STR: str = "/api/v1"
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     DATABASE_URL: str = os.getenv("DATABASE_URL", "your-database-url-here")
+    SQL_ECHO: bool = os.getenv("SQL_ECHO", "false").lower() == "true"
+    SLOW_QUERY_THRESHOLD_MS: int = int(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
     GOOGLE_CLIENT_ID: str = os.getenv("GOOGLE_CLIENT_ID", "your-google-client-id-here")
     GOOGLE_CLIENT_SECRET: str = os.getenv("GOOGLE_CLIENT_SECRET", "your-google-client-secret-here")
     GOOGLE_REDIRECT_CALLBACK: str = os.getenv("GOOGLE_REDIRECT_CALLBACK", "https://spark.elysiapartners.com/api/v1/auth/google/callback")
@@ -28,10 +30,117 @@ class Settings(BaseModel):
     SMTP_FROM_NAME: str = os.getenv("SMTP_FROM_NAME", "Elysia Partners")
     SMTP_USE_TLS: bool = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
     
+    # Email outbox sender: pooled SMTP sessions, per recipient domain pacing and retries
+    EMAIL_SMTP_CONNECTIONS: int = int(os.getenv("EMAIL_SMTP_CONNECTIONS", "3"))
+    EMAIL_CONNECTION_MAX_MESSAGES: int = int(os.getenv("EMAIL_CONNECTION_MAX_MESSAGES", "100"))
+    EMAIL_CONNECTION_IDLE_SECONDS: int = int(os.getenv("EMAIL_CONNECTION_IDLE_SECONDS", "60"))
+    EMAIL_RATE_PER_DOMAIN: float = float(os.getenv("EMAIL_RATE_PER_DOMAIN", "5"))
+    EMAIL_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+    EMAIL_RETRY_BASE_SECONDS: int = int(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+    EMAIL_RETRY_MAX_SECONDS: int = int(os.getenv("EMAIL_RETRY_MAX_SECONDS", "3600"))
+    EMAIL_POLL_INTERVAL_SECONDS: float = float(os.getenv("EMAIL_POLL_INTERVAL_SECONDS", "5"))
+    EMAIL_OUTBOX_RETENTION_DAYS: int = int(os.getenv("EMAIL_OUTBOX_RETENTION_DAYS", "7"))
+    # Locale used when an email has no variant in the recipient's locale
+    EMAIL_DEFAULT_LOCALE: str = os.getenv("EMAIL_DEFAULT_LOCALE", "en")
+    
     # Frontend URL for email verification links
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "https://spark.elysiapartners.com")
     
     # OpenAI Configuration
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")
+    # Generated agent prompts kept for identical wizard submissions; 0 disables the cache
+    PROMPT_CACHE_SIZE: int = int(os.getenv("PROMPT_CACHE_SIZE", "256"))
+    
+    # URL scraping: parser processes (0 parses inline), concurrent scrapes and max document size
+    SCRAPE_WORKERS: int = int(os.getenv("SCRAPE_WORKERS", "2"))
+    SCRAPE_MAX_CONCURRENCY: int = int(os.getenv("SCRAPE_MAX_CONCURRENCY", "8"))
+    SCRAPE_MAX_BYTES: int = int(os.getenv("SCRAPE_MAX_BYTES", str(5 * 1024 * 1024)))
+    
+    # Scrape cache: entries younger than MAX_AGE skip revalidation; TTL/size bound eviction
+    SCRAPE_CACHE_ENABLED: bool = os.getenv("SCRAPE_CACHE_ENABLED", "true").lower() == "true"
+    SCRAPE_CACHE_MAX_AGE_SECONDS: int = int(os.getenv("SCRAPE_CACHE_MAX_AGE_SECONDS", "0"))
+    SCRAPE_CACHE_TTL_SECONDS: int = int(os.getenv("SCRAPE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+    SCRAPE_CACHE_MAX_BYTES: int = int(os.getenv("SCRAPE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    
+    # Website crawls for knowledge: fetches per job, delay between requests to a host, limits
+    CRAWL_CONCURRENCY: int = int(os.getenv("CRAWL_CONCURRENCY", "4"))
+    CRAWL_HOST_DELAY_MS: int = int(os.getenv("CRAWL_HOST_DELAY_MS", "500"))
+    CRAWL_MAX_PAGES: int = int(os.getenv("CRAWL_MAX_PAGES", "500"))
+    CRAWL_MAX_JOBS: int = int(os.getenv("CRAWL_MAX_JOBS", "4"))
+    CRAWL_TIMEOUT: int = int(os.getenv("CRAWL_TIMEOUT", "20"))
+    
+    # Scheduled refresh of URL/crawl-sourced knowledge: sources refreshed at once, and per run
+    KNOWLEDGE_REFRESH_CONCURRENCY: int = int(os.getenv("KNOWLEDGE_REFRESH_CONCURRENCY", "2"))
+    KNOWLEDGE_REFRESH_BATCH: int = int(os.getenv("KNOWLEDGE_REFRESH_BATCH", "20"))
+    # Delete a refreshed file's old version once swapped; only safe if every assignment goes through this backend
+    KNOWLEDGE_REFRESH_DELETE_REPLACED: bool = os.getenv("KNOWLEDGE_REFRESH_DELETE_REPLACED", "false").lower() == "true"
+    
+    # Local knowledge index for preview and search: "hashing" needs no model download
+    KNOWLEDGE_INDEX_DIR: str = os.getenv("KNOWLEDGE_INDEX_DIR", "./data/knowledge_index")
+    KNOWLEDGE_CHUNK_CHARS: int = int(os.getenv("KNOWLEDGE_CHUNK_CHARS", "1200"))
+    KNOWLEDGE_CHUNK_OVERLAP: int = int(os.getenv("KNOWLEDGE_CHUNK_OVERLAP", "200"))
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "hashing")
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    EMBEDDING_DIM: int = int(os.getenv("EMBEDDING_DIM", "256"))
+    
+    # Pushing a tool or calendar change to every agent that uses it: concurrent Millis updates
+    AGENT_PROPAGATION_CONCURRENCY: int = int(os.getenv("AGENT_PROPAGATION_CONCURRENCY", "10"))
+    # POST /agent/bulk: Millis requests in flight, and operations per request
+    AGENT_BULK_CONCURRENCY: int = int(os.getenv("AGENT_BULK_CONCURRENCY", "8"))
+    AGENT_BULK_MAX_OPERATIONS: int = int(os.getenv("AGENT_BULK_MAX_OPERATIONS", "500"))
+    # Built calendar app_functions kept per agent and calendar version, saving key decryption
+    CALENDAR_FUNCTIONS_CACHE_SIZE: int = int(os.getenv("CALENDAR_FUNCTIONS_CACHE_SIZE", "1024"))
+    # Reconciling the agents table with Millis, and how old a synced copy may be to serve reads
+    AGENT_SYNC_INTERVAL_MINUTES: int = int(os.getenv("AGENT_SYNC_INTERVAL_MINUTES", "5"))
+    AGENT_SYNC_MAX_AGE_SECONDS: int = int(os.getenv("AGENT_SYNC_MAX_AGE_SECONDS", "900"))
+    # SIP sessions started through /sip are kept this long after they begin
+    SIP_SESSION_TTL_HOURS: int = int(os.getenv("SIP_SESSION_TTL_HOURS", "24"))
+    # GET /call-logs/stream: summaries queued per connection before it is dropped, keepalive interval
+    CALL_LOG_STREAM_QUEUE_SIZE: int = int(os.getenv("CALL_LOG_STREAM_QUEUE_SIZE", "256"))
+    CALL_LOG_STREAM_KEEPALIVE_SECONDS: float = float(os.getenv("CALL_LOG_STREAM_KEEPALIVE_SECONDS", "15"))
+    
+    # Automation webhook delivery: HTTP client, batching, per-endpoint concurrency and retries
+    WEBHOOK_TIMEOUT_SECONDS: float = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+    WEBHOOK_MAX_CONNECTIONS: int = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "50"))
+    WEBHOOK_BATCH_SIZE: int = int(os.getenv("WEBHOOK_BATCH_SIZE", "20"))
+    WEBHOOK_ENDPOINT_CONCURRENCY: int = int(os.getenv("WEBHOOK_ENDPOINT_CONCURRENCY", "2"))
+    WEBHOOK_MAX_ATTEMPTS: int = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "10"))
+    WEBHOOK_RETRY_BASE_SECONDS: int = int(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "30"))
+    WEBHOOK_RETRY_MAX_SECONDS: int = int(os.getenv("WEBHOOK_RETRY_MAX_SECONDS", "3600"))
+    # Consecutive failures that open an endpoint's circuit, and how long it stays open
+    WEBHOOK_BREAKER_THRESHOLD: int = int(os.getenv("WEBHOOK_BREAKER_THRESHOLD", "5"))
+    WEBHOOK_BREAKER_COOLDOWN_SECONDS: int = int(os.getenv("WEBHOOK_BREAKER_COOLDOWN_SECONDS", "300"))
+    WEBHOOK_POLL_INTERVAL_SECONDS: float = float(os.getenv("WEBHOOK_POLL_INTERVAL_SECONDS", "5"))
+    WEBHOOK_OUTBOX_RETENTION_DAYS: int = int(os.getenv("WEBHOOK_OUTBOX_RETENTION_DAYS", "7"))
+    
+    # Millis calls made through the outbox: retries with exponential backoff, worker poll, retention
+    MILLIS_OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("MILLIS_OUTBOX_MAX_ATTEMPTS", "8"))
+    MILLIS_OUTBOX_RETRY_BASE_SECONDS: int = int(os.getenv("MILLIS_OUTBOX_RETRY_BASE_SECONDS", "5"))
+    MILLIS_OUTBOX_RETRY_MAX_SECONDS: int = int(os.getenv("MILLIS_OUTBOX_RETRY_MAX_SECONDS", "600"))
+    MILLIS_OUTBOX_POLL_INTERVAL_SECONDS: float = float(os.getenv("MILLIS_OUTBOX_POLL_INTERVAL_SECONDS", "2"))
+    MILLIS_OUTBOX_RETENTION_DAYS: int = int(os.getenv("MILLIS_OUTBOX_RETENTION_DAYS", "7"))
+    
+    # Millis client: timeouts (slow endpoints generate, upload or page), retries of idempotent calls
+    MILLIS_TIMEOUT_SECONDS: float = float(os.getenv("MILLIS_TIMEOUT_SECONDS", "10"))
+    MILLIS_SLOW_TIMEOUT_SECONDS: float = float(os.getenv("MILLIS_SLOW_TIMEOUT_SECONDS", "60"))
+    MILLIS_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("MILLIS_CONNECT_TIMEOUT_SECONDS", "3"))
+    MILLIS_POOL_TIMEOUT_SECONDS: float = float(os.getenv("MILLIS_POOL_TIMEOUT_SECONDS", "5"))
+    MILLIS_RETRY_ATTEMPTS: int = int(os.getenv("MILLIS_RETRY_ATTEMPTS", "2"))
+    MILLIS_RETRY_BASE_SECONDS: float = float(os.getenv("MILLIS_RETRY_BASE_SECONDS", "0.2"))
+    MILLIS_RETRY_MAX_SECONDS: float = float(os.getenv("MILLIS_RETRY_MAX_SECONDS", "2"))
+    # Circuit breaker: opens when the failure rate over the window reaches the threshold
+    MILLIS_BREAKER_WINDOW_SECONDS: float = float(os.getenv("MILLIS_BREAKER_WINDOW_SECONDS", "30"))
+    MILLIS_BREAKER_MIN_REQUESTS: int = int(os.getenv("MILLIS_BREAKER_MIN_REQUESTS", "20"))
+    MILLIS_BREAKER_FAILURE_RATE: float = float(os.getenv("MILLIS_BREAKER_FAILURE_RATE", "0.5"))
+    MILLIS_BREAKER_COOLDOWN_SECONDS: int = int(os.getenv("MILLIS_BREAKER_COOLDOWN_SECONDS", "15"))
+    # Separate connection pools, so background jobs cannot take the connections requests need
+    MILLIS_INTERACTIVE_MAX_CONNECTIONS: int = int(os.getenv("MILLIS_INTERACTIVE_MAX_CONNECTIONS", "50"))
+    MILLIS_BACKGROUND_MAX_CONNECTIONS: int = int(os.getenv("MILLIS_BACKGROUND_MAX_CONNECTIONS", "10"))
+    
+    # Event loop watchdog
+    LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+    LOOP_MONITOR_INTERVAL_MS: int = int(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+    LOOP_STALL_THRESHOLD_MS: int = int(os.getenv("LOOP_STALL_THRESHOLD_MS", "500"))
 
 settings = Settings()
@@ -1,13 +1,14 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.core.config import settings
+from app.core.query_stats import register_query_stats
 from contextlib import asynccontextmanager
 
 DATABASE_URL = settings.DATABASE_URL
 
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True,
+    echo=settings.SQL_ECHO,
     future=True,
     pool_size=20,  # Increased pool size
     max_overflow=30,  # Increased max overflow
@@ -16,6 +17,9 @@ engine = create_async_engine(
     pool_recycle=1800,  # Recycle connections after 30 minutes
 )
 
+# Slow-query log and per-statement timing stats
+register_query_stats(engine)
+
 # Regular session factory for request handlers
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -0,0 +1,297 @@
+"""Prometheus metrics and the instrumentation helpers that feed them."""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import time
+
+import httpx
+from prometheus_client import Counter, Gauge, Histogram
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "API request latency by route template",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "API requests currently being served",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "SQLAlchemy pool connections currently checked out",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "SQLAlchemy pool connections open beyond pool_size",
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of outbound calls to external services",
+    ["upstream", "operation"],
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total",
+    "Failed outbound calls to external services",
+    ["upstream", "operation", "kind"],
+)
+UPSTREAM_BREAKER_STATE = Gauge(
+    "upstream_breaker_state",
+    "Circuit breaker state per upstream: 0 closed, 1 open, 2 half-open",
+    ["upstream"],
+)
+UPSTREAM_RETRIES = Counter(
+    "upstream_retries_total",
+    "Upstream requests retried, by the error or status that caused the retry",
+    ["upstream", "reason"],
+)
+UPSTREAM_SHORT_CIRCUITS = Counter(
+    "upstream_short_circuits_total",
+    "Upstream requests answered with 503 locally because the circuit was open",
+    ["upstream"],
+)
+JOB_DURATION = Histogram(
+    "background_job_duration_seconds",
+    "Duration of scheduled background jobs",
+    ["job"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+JOB_FAILURES = Counter(
+    "background_job_failures_total",
+    "Scheduled background job runs that raised",
+    ["job"],
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Delay between when a loop callback was due and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+EVENT_LOOP_STALLS = Counter(
+    "event_loop_stalls_total",
+    "Times the event loop was blocked longer than the stall threshold",
+)
+SCRAPE_CACHE_RESULTS = Counter(
+    "scrape_cache_results_total",
+    "Scrape cache outcomes: fresh, not_modified, unchanged or miss",
+    ["result"],
+)
+EMAIL_DELIVERIES = Counter(
+    "email_deliveries_total",
+    "Outbox email send attempts: sent, retry or failed",
+    ["result"],
+)
+EMAIL_DELIVERY_LATENCY = Histogram(
+    "email_delivery_latency_seconds",
+    "Time from queueing an email to the SMTP server accepting it",
+    buckets=(1, 2, 5, 10, 30, 60, 300, 900, 3600),
+)
+EMAIL_OUTBOX_PENDING = Gauge(
+    "email_outbox_pending",
+    "Emails waiting in the outbox",
+)
+SMTP_CONNECTIONS_OPENED = Counter(
+    "smtp_connections_opened_total",
+    "Authenticated SMTP sessions opened by the email sender",
+)
+PROMPT_CACHE_RESULTS = Counter(
+    "prompt_cache_results_total",
+    "Generated agent prompt cache lookups: hit or miss",
+    ["result"],
+)
+KNOWLEDGE_REFRESH_RESULTS = Counter(
+    "knowledge_refresh_results_total",
+    "Knowledge source refreshes: unchanged, updated, failed or orphaned",
+    ["result"],
+)
+AGENT_PROPAGATIONS = Counter(
+    "agent_propagations_total",
+    "Agent updates pushed to Millis after a tool or calendar changed, by result",
+    ["kind", "result"],
+)
+AGENT_CONFIG_UPDATES = Counter(
+    "agent_config_updates_total",
+    "Agent saves by what was sent to Millis: unchanged (nothing) or patched",
+    ["result"],
+)
+AGENT_BULK_OPERATIONS = Counter(
+    "agent_bulk_operations_total",
+    "Bulk agent operations by operation and status: ok, failed or skipped",
+    ["op", "status"],
+)
+AGENT_SYNC_DRIFT = Counter(
+    "agent_sync_drift_total",
+    "Agents found out of step with Millis by the sync: corrected, remote_only or missing_remote",
+    ["kind"],
+)
+CALL_LOG_STREAM_SUBSCRIBERS = Gauge(
+    "call_log_stream_subscribers",
+    "Open GET /call-logs/stream connections",
+)
+CALL_LOG_STREAM_DROPPED = Counter(
+    "call_log_stream_dropped_total",
+    "Call log streams dropped for falling CALL_LOG_STREAM_QUEUE_SIZE summaries behind",
+)
+WEBHOOK_DELIVERIES = Counter(
+    "webhook_deliveries_total",
+    "Automation webhook events by outcome: delivered, retry, failed or deferred (circuit open)",
+    ["result"],
+)
+WEBHOOK_DELIVERY_LAG = Histogram(
+    "webhook_delivery_lag_seconds",
+    "Time from an event being queued to its delivery",
+    buckets=(1, 5, 15, 60, 300, 900, 3600, 21600, 86400),
+)
+WEBHOOK_OUTBOX_PENDING = Gauge(
+    "webhook_outbox_pending",
+    "Webhook events waiting in the outbox",
+)
+WEBHOOK_BREAKERS_OPEN = Gauge(
+    "webhook_breakers_open",
+    "Webhook endpoints whose circuit is open in this process",
+)
+MILLIS_OUTBOX_OPERATIONS = Counter(
+    "millis_outbox_operations_total",
+    "Millis outbox operations by kind and outcome: done, retry or failed",
+    ["kind", "result"],
+)
+MILLIS_OUTBOX_PENDING = Gauge(
+    "millis_outbox_pending",
+    "Millis outbox operations not yet done or failed",
+)
+KNOWLEDGE_REFRESH_BYTES_SAVED = Counter(
+    "knowledge_refresh_bytes_saved_total",
+    "Bytes not re-uploaded because refreshed knowledge content was unchanged",
+)
+
+# ASGI scope of the request being served, for attributing work (e.g. slow queries) to a route
+request_scope: ContextVar[dict | None] = ContextVar("request_scope", default=None)
+
+def current_route() -> str | None:
+    scope = request_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', None) or scope['path']}"
+
+def normalize_path(path: str) -> str:
+    """Collapse id-like path segments so metric labels stay low-cardinality."""
+    segments = path.strip("/").split("/")
+    normalized = []
+    for index, segment in enumerate(segments):
+        # Route words are lowercase; generated ids carry digits, capitals or are long
+        if index > 0 and (any(char.isdigit() or char.isupper() for char in segment) or len(segment) >= 24):
+            normalized.append("{id}")
+        else:
+            normalized.append(segment)
+    return "/" + "/".join(normalized)
+
+@contextmanager
+def track_upstream(upstream: str, operation: str):
+    """Time an outbound call; exceptions are counted as errors and re-raised."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        UPSTREAM_ERRORS.labels(upstream, operation, type(e).__name__).inc()
+        raise
+    finally:
+        UPSTREAM_REQUEST_DURATION.labels(upstream, operation).observe(time.perf_counter() - start)
+
+def record_upstream_status(upstream: str, operation: str, status_code: int):
+    """Count a completed call that returned an error status."""
+    if status_code >= 400:
+        UPSTREAM_ERRORS.labels(upstream, operation, str(status_code)).inc()
+
+def track_job(name: str):
+    """Decorator recording duration and failures of an async background job."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                JOB_FAILURES.labels(name).inc()
+                raise
+            finally:
+                JOB_DURATION.labels(name).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """httpx transport wrapper that records latency and errors per upstream operation."""
+
+    def __init__(self, upstream: str, transport: httpx.AsyncBaseTransport | None = None):
+        self.upstream = upstream
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        operation = f"{request.method} {normalize_path(request.url.path)}"
+        with track_upstream(self.upstream, operation):
+            response = await self.transport.handle_async_request(request)
+        record_upstream_status(self.upstream, operation, response.status_code)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per route template and in-flight requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        token = request_scope.set(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_scope.reset(token)
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(scope["method"], route_path, str(status)).observe(time.perf_counter() - start)
+
+def register_pool_metrics(engine):
+    """Report pool usage of an (async) SQLAlchemy engine at scrape time."""
+    pool = engine.pool
+    DB_POOL_CHECKED_OUT.set_function(lambda: pool.checkedout())
+    # QueuePool.overflow() starts at -pool_size; only connections beyond the pool count
+    DB_POOL_OVERFLOW.set_function(lambda: max(pool.overflow(), 0))
+
+def instrument_stripe():
+    """Time every Stripe API call by wrapping the SDK's shared HTTP client."""
+    import stripe
+
+    client = stripe.default_http_client or stripe.new_default_http_client(
+        verify_ssl_certs=stripe.verify_ssl_certs,
+        proxy=stripe.proxy,
+    )
+    if getattr(client, "_metrics_instrumented", False):
+        return
+    original_request = client.request
+
+    def request(method, url, headers, post_data=None, **kwargs):
+        operation = f"{method.upper()} {normalize_path(httpx.URL(url).path)}"
+        with track_upstream("stripe", operation):
+            response = original_request(method, url, headers, post_data, **kwargs)
+        record_upstream_status("stripe", operation, response[1])
+        return response
+
+    client.request = request
+    client._metrics_instrumented = True
+    stripe.default_http_client = client
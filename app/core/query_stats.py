@@ -0,0 +1,113 @@
+"""
+Slow-query logging and per-statement timing stats, fed by SQLAlchemy cursor events.
+
+Statements are grouped by fingerprint (literals and bind parameters replaced by ``?``,
+IN/VALUES lists collapsed) so the stats stay bounded however many distinct values are
+queried. Stats are kept per process.
+"""
+from functools import lru_cache
+import json
+import logging
+import re
+import threading
+import time
+
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.core.metrics import current_route
+
+logger = logging.getLogger(__name__)
+
+MAX_FINGERPRINTS = 2000
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETER = re.compile(r"\$\d+|%\(\w+\)s|(?<!:):\w+\b|\?")
+_LIST = re.compile(r"\((?:\s*\?(?:::\w+)?\s*,)+\s*\?(?:::\w+)?\s*\)")
+_VALUES_ROWS = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _PARAMETER.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _LIST.sub("(...)", normalized)
+    normalized = _VALUES_ROWS.sub(r"\1, ...", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+class QueryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+
+    def record(self, statement_fingerprint: str, duration: float, slow: bool):
+        with self._lock:
+            entry = self._stats.get(statement_fingerprint)
+            if entry is None:
+                if len(self._stats) >= MAX_FINGERPRINTS:
+                    statement_fingerprint = "<other>"
+                    entry = self._stats.get(statement_fingerprint)
+                if entry is None:
+                    entry = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "slow_count": 0}
+                    self._stats[statement_fingerprint] = entry
+            entry["count"] += 1
+            entry["total_seconds"] += duration
+            entry["max_seconds"] = max(entry["max_seconds"], duration)
+            if slow:
+                entry["slow_count"] += 1
+
+    def snapshot(self, sort: str = "total", limit: int = 50) -> list[dict]:
+        with self._lock:
+            rows = [
+                {
+                    "fingerprint": key,
+                    "count": entry["count"],
+                    "total_ms": round(entry["total_seconds"] * 1000, 2),
+                    "mean_ms": round(entry["total_seconds"] / entry["count"] * 1000, 2),
+                    "max_ms": round(entry["max_seconds"] * 1000, 2),
+                    "slow_count": entry["slow_count"],
+                }
+                for key, entry in self._stats.items()
+            ]
+        sort_key = {"total": "total_ms", "mean": "mean_ms", "max": "max_ms", "count": "count", "slow": "slow_count"}[sort]
+        rows.sort(key=lambda row: row[sort_key], reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+query_stats = QueryStats()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start_time"].pop()
+    statement_fingerprint = fingerprint(statement)
+    slow = duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS
+    query_stats.record(statement_fingerprint, duration, slow)
+    if slow:
+        logger.warning(json.dumps({
+            "event": "slow_query",
+            "duration_ms": round(duration * 1000, 2),
+            "fingerprint": statement_fingerprint,
+            "rowcount": cursor.rowcount,
+            "executemany": executemany,
+            "route": current_route() or "background",
+        }))
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
+
+def register_query_stats(engine):
+    """Attach the timing listeners to an (async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
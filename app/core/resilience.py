@@ -0,0 +1,159 @@
+"""
+Timeouts, retries and a circuit breaker for calls to Millis.
+
+Every Millis request goes through ``ResilientTransport``:
+
+- Each request gets a timeout for its endpoint: MILLIS_TIMEOUT_SECONDS, or
+  MILLIS_SLOW_TIMEOUT_SECONDS for the endpoints that legitimately take long.
+- Requests with idempotent methods (GET, HEAD, OPTIONS, PUT, DELETE) that fail to connect,
+  time out, or get a 429/502/503/504 are retried up to MILLIS_RETRY_ATTEMPTS times with
+  jittered exponential backoff. POSTs are never retried here: Millis is not known to honour
+  ``Idempotency-Key``, so a repeated POST could create a second resource.
+- A circuit breaker watches the outcomes of the last MILLIS_BREAKER_WINDOW_SECONDS. Once at
+  least MILLIS_BREAKER_MIN_REQUESTS have been made and MILLIS_BREAKER_FAILURE_RATE of them
+  failed (5xx or no response), it opens: requests get an immediate 503 response for
+  MILLIS_BREAKER_COOLDOWN_SECONDS, which callers handle like any Millis error. Then one
+  request probes Millis, and its outcome closes or reopens the breaker.
+"""
+from collections import deque
+import asyncio
+import httpx
+import logging
+import random
+import time
+
+from app.core.config import settings
+from app.core.metrics import UPSTREAM_BREAKER_STATE, UPSTREAM_RETRIES, UPSTREAM_SHORT_CIRCUITS
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {429, 502, 503, 504}
+# Millis endpoints that generate, upload or page through a lot
+SLOW_PATHS = ("/chat/completions", "/knowledge/", "/call-logs", "/phones/purchase", "/phones/import")
+
+CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+STATE_NAMES = {CLOSED: "closed", OPEN: "open", HALF_OPEN: "half_open"}
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker over a sliding time window."""
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        UPSTREAM_BREAKER_STATE.labels(upstream).set(CLOSED)
+
+    def _set_state(self, state: int):
+        if state == self.state:
+            return
+        self.state = state
+        UPSTREAM_BREAKER_STATE.labels(self.upstream).set(state)
+        if state == OPEN:
+            logger.warning(f"{self.upstream} circuit opened; failing fast for {settings.MILLIS_BREAKER_COOLDOWN_SECONDS}s")
+        else:
+            logger.info(f"{self.upstream} circuit {STATE_NAMES[state]}")
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < settings.MILLIS_BREAKER_COOLDOWN_SECONDS:
+                return False
+            self._set_state(HALF_OPEN)
+        if self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def record(self, ok: bool):
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            self.probing = False
+            self._outcomes.clear()
+            if ok:
+                self._set_state(CLOSED)
+            else:
+                self.opened_at = now
+                self._set_state(OPEN)
+            return
+        if self.state == OPEN:
+            return
+        self._outcomes.append((now, ok))
+        while self._outcomes and self._outcomes[0][0] < now - settings.MILLIS_BREAKER_WINDOW_SECONDS:
+            self._outcomes.popleft()
+        if len(self._outcomes) < settings.MILLIS_BREAKER_MIN_REQUESTS:
+            return
+        failures = sum(1 for _, outcome_ok in self._outcomes if not outcome_ok)
+        if failures / len(self._outcomes) >= settings.MILLIS_BREAKER_FAILURE_RATE:
+            self.opened_at = now
+            self._outcomes.clear()
+            self._set_state(OPEN)
+
+    def release(self):
+        """Forget a request that ended without telling us anything about the upstream."""
+        if self.state == HALF_OPEN:
+            self.probing = False
+
+def endpoint_timeout(path: str) -> httpx.Timeout:
+    seconds = settings.MILLIS_SLOW_TIMEOUT_SECONDS if path.startswith(SLOW_PATHS) else settings.MILLIS_TIMEOUT_SECONDS
+    return httpx.Timeout(seconds, connect=settings.MILLIS_CONNECT_TIMEOUT_SECONDS, pool=settings.MILLIS_POOL_TIMEOUT_SECONDS)
+
+def retry_delay(attempt: int, response: httpx.Response | None = None) -> float:
+    delay = min(settings.MILLIS_RETRY_BASE_SECONDS * 2 ** attempt, settings.MILLIS_RETRY_MAX_SECONDS)
+    if response is not None and response.headers.get("Retry-After", "").isdigit():
+        delay = min(float(response.headers["Retry-After"]), settings.MILLIS_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.5)
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """httpx transport wrapper applying endpoint timeouts, retries and a circuit breaker."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker):
+        self.transport = transport
+        self.breaker = breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions["timeout"] = endpoint_timeout(request.url.path).as_dict()
+        retryable = request.method in IDEMPOTENT_METHODS
+        attempts = 1 + (max(settings.MILLIS_RETRY_ATTEMPTS, 0) if retryable else 0)
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                UPSTREAM_SHORT_CIRCUITS.labels(self.breaker.upstream).inc()
+                return httpx.Response(
+                    503,
+                    text=f"{self.breaker.upstream} is unavailable, please try again shortly",
+                    headers={"Retry-After": str(settings.MILLIS_BREAKER_COOLDOWN_SECONDS)},
+                    request=request,
+                    # Tells callers the request never left this process
+                    extensions={"short_circuit": True},
+                )
+            response = None
+            try:
+                response = await self.transport.handle_async_request(request)
+            except httpx.PoolTimeout:
+                # Our own connection limit, not a sign of upstream health
+                self.breaker.release()
+                raise
+            except httpx.TransportError as e:
+                self.breaker.record(False)
+                if attempt + 1 >= attempts:
+                    raise
+                reason = type(e).__name__
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                self.breaker.record(response.status_code < 500)
+                if response.status_code not in RETRY_STATUSES or attempt + 1 >= attempts:
+                    return response
+                await response.aclose()
+                reason = str(response.status_code)
+            UPSTREAM_RETRIES.labels(self.breaker.upstream, reason).inc()
+            await asyncio.sleep(retry_delay(attempt, response))
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+millis_breaker = CircuitBreaker("millis")
@@ -1,13 +1,18 @@
 """Database models.""" 
 
-from .agent import Agent
+from .agent import Agent, AgentTool, AgentCalendar
 from .call_log import CallLog
 from .campaign_schedule import CampaignSchedule, FrequencyType
 from .campaign import Campaign
-from .knowledge import Knowledge
+from .knowledge import Knowledge, KnowledgeSource, AgentKnowledgeFile
 from .user import User, OAuthAccount
 from .phone import Phone
 from .tool import Tools
 from .automation import AutomationWebhook
 from .calendar import Calendar
 from .verification_code import VerificationCode
+from .scrape_cache import ScrapeCache
+from .email_outbox import EmailOutbox
+from .sip_session import SipSession
+from .webhook_outbox import WebhookOutbox
+from .millis_outbox import MillisOutbox
@@ -8,8 +8,29 @@ class Agent(Base):
     id = Column(String, primary_key=True,unique=True, nullable=False)
     name = Column(Text)
     config = Column(JSON, nullable=True)
-    sip = Column(JSON, nullable=False, default={})
+    sip = Column(JSON, nullable=False, default={})  # no longer written; SIP sessions live in sip_sessions
     tools = Column(JSON, nullable=False, default=[])
     created_at = Column(BigInteger, nullable=True)
-    user_id = Column(UUID(as_uuid=True), nullable=True)
+    user_id = Column(UUID(as_uuid=True), nullable=True, index=True)
     stopped_due_to_credit = Column(Boolean, nullable=False, default=False)
+    app_functions_hash = Column(String(64), nullable=True)  # sha256 of the app_functions last sent to Millis
+    status = Column(Text, nullable=True)  # active or disabled on Millis, "missing" once gone from it
+    remote_hash = Column(String(64), nullable=True)  # sha256 of the Millis record at the last sync
+    synced_at = Column(BigInteger, nullable=True)  # when the last sync confirmed this row
+    knowledge_messages = Column(JSON, nullable=True)  # messages last sent with set_agent_files; None if never sent from here
+
+class AgentTool(Base):
+    """Tools attached to an agent, mirroring ``Agent.tools`` for lookups by tool."""
+    __tablename__ = "agent_tools"
+
+    agent_id = Column(String, primary_key=True)
+    tool_id = Column(UUID(as_uuid=True), primary_key=True, index=True)
+    user_id = Column(UUID(as_uuid=True), nullable=True)
+
+class AgentCalendar(Base):
+    """Calendars an agent books through, mirroring ``config["calendar_ids"]`` for lookups by calendar."""
+    __tablename__ = "agent_calendars"
+
+    agent_id = Column(String, primary_key=True)
+    calendar_id = Column(UUID(as_uuid=True), primary_key=True, index=True)
+    user_id = Column(UUID(as_uuid=True), nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Text, BigInteger, String
+from sqlalchemy import Column, Text, BigInteger, String, Boolean
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from app.core.database import Base
@@ -11,4 +11,5 @@ class AutomationWebhook(Base):
     automation_id = Column(String, nullable=True)
     created_at = Column(BigInteger, nullable=True)
     user_id = Column(UUID(as_uuid=True), nullable=False)
+    batch = Column(Boolean, nullable=False, default=False)  # accepts several events per request as {"events": [...]}
 
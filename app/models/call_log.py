@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Float, Text, JSON, Integer
+from sqlalchemy import Column, Float, Text, JSON, Integer, Index
 from app.core.database import Base
 
 class CallLog(Base):
     __tablename__ = "call_logs"
+    __table_args__ = (
+        # Per-agent lookups by time: latest call, calls in a period
+        Index("ix_call_logs_agent_id_ts", "agent_id", "ts"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     agent_id = Column(Text, nullable=True)
     agent_config = Column(JSON, nullable=True) # Object
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Text, BigInteger, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+from app.core.database import Base
+
+class EmailOutbox(Base):
+    """Emails waiting to be sent, or recently sent, by the SMTP sender."""
+    __tablename__ = "email_outbox"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String, nullable=True)  # e.g. verification, password_reset
+    to_email = Column(Text, nullable=False)
+    subject = Column(Text, nullable=False)
+    html_content = Column(Text, nullable=False)
+    text_content = Column(Text, nullable=True)
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, sending, sent or failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(BigInteger, nullable=False, index=True)
+    locked_at = Column(BigInteger, nullable=True)  # when a sender claimed it
+    last_error = Column(Text, nullable=True)
+    created_at = Column(BigInteger, nullable=False)
+    sent_at = Column(BigInteger, nullable=True)
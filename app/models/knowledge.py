@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Text, BigInteger, String
+from sqlalchemy import Column, Text, BigInteger, String, JSON, Integer
 from sqlalchemy.dialects.postgresql import UUID
+import uuid
 from app.core.database import Base
 
 class Knowledge(Base):
@@ -12,3 +13,31 @@ class Knowledge(Base):
     size = Column(BigInteger, nullable=True)
     created_at = Column(BigInteger, nullable=True)
     user_id = Column(UUID(as_uuid=True), nullable=True)
+
+class KnowledgeSource(Base):
+    """Where a knowledge file's content came from, and how often to refresh it."""
+    __tablename__ = "knowledge_sources"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    knowledge_id = Column(String, nullable=False, index=True)  # current file; changes on each re-upload
+    source_type = Column(Text, nullable=False)  # "url" or "crawl"
+    url = Column(Text, nullable=False)
+    options = Column(JSON, nullable=False, default={})  # crawl max_depth / max_pages
+    content_hash = Column(String(64), nullable=True)  # sha256 of the uploaded text
+    size = Column(BigInteger, nullable=True)
+    refresh_interval = Column(Integer, nullable=True)  # seconds; null disables refresh
+    next_refresh_at = Column(BigInteger, nullable=True, index=True)
+    last_checked_at = Column(BigInteger, nullable=True)
+    last_changed_at = Column(BigInteger, nullable=True)
+    last_error = Column(Text, nullable=True)
+    bytes_saved = Column(BigInteger, nullable=False, default=0)  # uploads skipped because nothing changed
+    created_at = Column(BigInteger, nullable=True)
+    user_id = Column(UUID(as_uuid=True), nullable=True)
+
+class AgentKnowledgeFile(Base):
+    """Knowledge files assigned to an agent, as last sent to Millis set_agent_files."""
+    __tablename__ = "agent_knowledge_files"
+
+    agent_id = Column(String, primary_key=True)
+    knowledge_id = Column(String, primary_key=True, index=True)
+    position = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,26 @@
+from sqlalchemy import Boolean, Column, Text, BigInteger, Integer, String, JSON
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+from app.core.database import Base
+
+class MillisOutbox(Base):
+    """Millis calls recorded with the local change they belong to, and carried out by the outbox worker."""
+    __tablename__ = "millis_outbox"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)  # also the Idempotency-Key sent to Millis
+    user_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    kind = Column(String, nullable=False)  # e.g. create_agent, delete_phone
+    method = Column(String, nullable=False)
+    path = Column(Text, nullable=False)
+    payload = Column(JSON, nullable=True)
+    resource_id = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, remote_done, done or failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(BigInteger, nullable=False, index=True)
+    locked_at = Column(BigInteger, nullable=True)  # when a worker or the request claimed it
+    status_code = Column(Integer, nullable=True)  # of the last Millis response
+    response = Column(JSON, nullable=True)  # Millis's response once the call succeeded
+    last_error = Column(Text, nullable=True)
+    outcome_unknown = Column(Boolean, nullable=False, default=False)  # the last call may have reached Millis unanswered
+    created_at = Column(BigInteger, nullable=False)
+    completed_at = Column(BigInteger, nullable=True)
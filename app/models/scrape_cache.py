@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Text, BigInteger, Integer, String
+from app.core.database import Base
+
+class ScrapeCache(Base):
+    __tablename__ = "scrape_cache"
+
+    url = Column(String, primary_key=True, nullable=False)  # canonical URL
+    etag = Column(Text, nullable=True)
+    last_modified = Column(Text, nullable=True)
+    content_hash = Column(String(64), nullable=False)  # sha256 of the raw document
+    text = Column(Text, nullable=False)
+    size = Column(BigInteger, nullable=False)  # bytes of stored text, for the size bound
+    fetched_at = Column(BigInteger, nullable=False)  # last full download
+    validated_at = Column(BigInteger, nullable=False)  # last time the origin confirmed it
+    accessed_at = Column(BigInteger, nullable=False, index=True)
+    hit_count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, BigInteger, String
+from sqlalchemy.dialects.postgresql import UUID
+from app.core.database import Base
+
+class SipSession(Base):
+    """SIP calls started through /sip, kept until SIP_SESSION_TTL_HOURS after they began."""
+    __tablename__ = "sip_sessions"
+
+    call_id = Column(String, primary_key=True, nullable=False)
+    agent_id = Column(String, nullable=False, index=True)
+    user_id = Column(UUID(as_uuid=True), nullable=True, index=True)
+    created_at = Column(BigInteger, nullable=False, index=True)
+    ended_at = Column(BigInteger, nullable=True)  # when it was hung up through DELETE /sip
@@ -15,5 +15,6 @@ class Tools(Base):
     webhook = Column(Text, nullable=True)
     header = Column(JSONB, nullable=True)
     method = Column(Text, nullable=True)
+    function_spec = Column(JSONB, nullable=True)  # compiled Millis function; cleared when the tool changes
     created_at = Column(BigInteger, nullable=True)
     user_id = Column(UUID(as_uuid=True), nullable=True)
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Text, BigInteger, Integer, String, JSON
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+from app.core.database import Base
+
+class WebhookOutbox(Base):
+    """Events waiting to be delivered, or recently delivered, to an automation webhook."""
+    __tablename__ = "webhook_outbox"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    webhook_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    user_id = Column(UUID(as_uuid=True), nullable=True)
+    webhook_url = Column(Text, nullable=False)
+    event_type = Column(String, nullable=False)  # e.g. call.ended, campaign.status
+    payload = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, delivering, delivered or failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(BigInteger, nullable=False, index=True)
+    locked_at = Column(BigInteger, nullable=True)  # when a deliverer claimed it
+    last_error = Column(Text, nullable=True)
+    created_at = Column(BigInteger, nullable=False)
+    delivered_at = Column(BigInteger, nullable=True)
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Literal
+
+from app.core.query_stats import query_stats
+from app.models import User
+from app.routers.user import require_admin
+from app.services.agent_sync import agent_sync
+
+router = APIRouter()
+
+@router.get("/query-stats")
+async def get_query_stats(
+    sort: Literal["total", "mean", "max", "count", "slow"] = "total",
+    limit: int = Query(50, ge=1, le=1000),
+    admin_user: User = Depends(require_admin)
+):
+    """
+    Per-statement timing aggregated by fingerprint, for this worker process. Requires admin privileges.
+    """
+    return query_stats.snapshot(sort=sort, limit=limit)
+
+@router.delete("/query-stats")
+async def reset_query_stats(admin_user: User = Depends(require_admin)):
+    """
+    Clear the aggregated query stats of this worker process. Requires admin privileges.
+    """
+    query_stats.reset()
+    return {"message": "Query stats reset"}
+
+@router.get("/agent-drift")
+async def get_agent_drift(admin_user: User = Depends(require_admin)):
+    """
+    The last agent sync's drift report across all users, including agents only on Millis. Requires admin privileges.
+    """
+    return agent_sync.report or {"synced_at": None}
+
+@router.post("/agent-sync")
+async def run_agent_sync(admin_user: User = Depends(require_admin)):
+    """
+    Reconcile the agents table with Millis now and return the drift report. Requires admin privileges.
+    """
+    return await agent_sync.run()
@@ -1,27 +1,25 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone
 from uuid import UUID
-import json, httpx, re
+import json
 
 from app.core.database import get_db
-from app.models import Agent, Tools, Calendar
+from app.core.metrics import AGENT_CONFIG_UPDATES
+from app.models import Agent, CallLog, Tools
 from app.routers.auth import current_active_user
-from app.schemas import AgentCreate, AgentUpdate
-from app.utils.httpx import get_httpx_headers, httpx_base_url
-from app.utils.encryption import decrypt_value
-from app.services.prompt_generator import generate_prompt_with_openai
-
-
-class AgentToolRequest(BaseModel):
-    id: str
-    timeout: int | None = None
-    run_after_call: bool | None = None
-    messages: list[str] | None = None
-    response_mode: str | None = None
-    execute_after_message: bool | None = None
-    exclude_session_id: bool | None = None
+from app.schemas import AgentCreate, AgentUpdate, AgentToolRequest, BulkAgentRequest
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
+from app.services.agent_bulk import run_bulk_operations
+from app.services.agent_config import apply_update, plan_update
+from app.services.agent_links import set_agent_calendars, set_agent_tools
+from app.services.agent_propagation import agent_tool_config
+from app.services.agent_sync import local_agent, local_agents, user_drift
+from app.services.millis_outbox import count_agent_slots, open_operation, operation_result, submit_operation
+from app.services.prompt_generator import generate_prompt_with_openai, stream_prompt_with_openai
 
 
 class PromptGenerationRequest(BaseModel):
@@ -31,12 +29,17 @@ class PromptGenerationRequest(BaseModel):
     purpose: str | None = None
     personality: str | None = None
     industry_prompt: str | None = None
+    stream: bool = False
 
 
 router = APIRouter()
 
 async def get_agents():
-    async with httpx.AsyncClient() as client:
+    """Every agent as Millis has it, from the synced local copy when the last sync is fresh enough."""
+    cached = await local_agents()
+    if cached is not None:
+        return cached
+    async with millis_client() as client:
         try:
             headers = get_httpx_headers()
             response = await client.get(f"{httpx_base_url}/agents", headers=headers)
@@ -49,7 +52,11 @@ async def get_agents():
             raise HTTPException(status_code=500, detail=str(e))
 
 async def get_agent_by_id(agent_id: str):
-    async with httpx.AsyncClient() as client:
+    """An agent as Millis has it, from the synced local copy when it is fresh enough."""
+    cached = await local_agent(agent_id)
+    if cached is not None:
+        return cached
+    async with millis_client() as client:
         try:
             headers = get_httpx_headers()
             response = await client.get(f"{httpx_base_url}/agents/{agent_id}", headers=headers)
@@ -61,18 +68,6 @@ async def get_agent_by_id(agent_id: str):
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
-def to_function_name(text: str) -> str:
-    # Lowercase the text
-    text = text.lower()
-    # Replace spaces and invalid characters with underscores
-    text = re.sub(r'[^a-z0-9_]', '_', text)
-    # Ensure it doesn't start with a number
-    if re.match(r'^[0-9]', text):
-        text = "_" + text
-    # Collapse multiple underscores
-    text = re.sub(r'_+', '_', text).strip('_')
-    return text
-
 @router.get("/")
 async def get_agents_db(db: AsyncSession = Depends(get_db), user = Depends(current_active_user)):
     try:
@@ -81,6 +76,59 @@ async def get_agents_db(db: AsyncSession = Depends(get_db), user = Depends(curre
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/summary")
+async def get_agents_summary(db: AsyncSession = Depends(get_db), user = Depends(current_active_user)):
+    """The user's agents without their configs, with today's call count and last call time."""
+    try:
+        now = datetime.now(timezone.utc)
+        start_of_day = datetime(now.year, now.month, now.day, tzinfo=timezone.utc).timestamp()
+        calls_today = (
+            select(func.count())
+            .where(CallLog.agent_id == Agent.id, CallLog.ts >= start_of_day)
+            .correlate(Agent)
+            .scalar_subquery()
+        )
+        last_call_at = (
+            select(func.max(CallLog.ts))
+            .where(CallLog.agent_id == Agent.id)
+            .correlate(Agent)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            select(
+                Agent.id,
+                Agent.name,
+                Agent.created_at,
+                Agent.stopped_due_to_credit,
+                Agent.status,
+                Agent.synced_at,
+                calls_today.label("calls_today"),
+                last_call_at.label("last_call_at"),
+            )
+            .where(Agent.user_id == user.id)
+            .order_by(Agent.created_at)
+        )
+        return [
+            {
+                "id": agent.id,
+                "name": agent.name,
+                "created_at": agent.created_at,
+                "stopped_due_to_credit": agent.stopped_due_to_credit,
+                "status": agent.status,
+                "synced_at": agent.synced_at,
+                "calls_today": agent.calls_today,
+                "last_call_at": agent.last_call_at,
+            }
+            for agent in result.all()
+        ]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/drift")
+async def get_agents_drift(user = Depends(current_active_user)):
+    """Where the user's agents differed from Millis at the last sync, and what was corrected."""
+    return user_drift(user.id)
+
 @router.post("/")
 async def create_agent(agent: AgentCreate, db: AsyncSession = Depends(get_db), user = Depends(current_active_user)):
     # Check if user has active subscription
@@ -90,9 +138,8 @@ async def create_agent(agent: AgentCreate, db: AsyncSession = Depends(get_db), u
             detail="Active subscription required to create agents. Please subscribe at A$299 per agent per month."
         )
     
-    # Count current agents
-    result = await db.execute(select(Agent).where(Agent.user_id == user.id))
-    current_agent_count = len(result.scalars().all())
+    # Count current agents, and those still being created
+    current_agent_count = await count_agent_slots(db, user.id)
     
     # Check if user has enough subscription quantity for another agent
     subscription_quantity = user.subscription_quantity or 0
@@ -102,31 +149,28 @@ async def create_agent(agent: AgentCreate, db: AsyncSession = Depends(get_db), u
             detail=f"You have {current_agent_count} agent(s) but only {subscription_quantity} subscription slot(s). Please upgrade your subscription to add more agents at A$299 per agent per month."
         )
     
-    async with httpx.AsyncClient() as client:
-        try:
-            headers = get_httpx_headers()
-            response = await client.post(f"{httpx_base_url}/agents", data=json.dumps(agent.model_dump()), headers=headers)
-            if response.status_code != 200 and response.status_code != 201:
-                raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
-            data = response.json()
-            db_agent = Agent(
-                id = data.get("id"),
-                name = agent.name,
-                config = agent.config,
-                user_id = user.id,
-                created_at = data.get("created_at"),
-            )
-            db.add(db_agent)
-            try:
-                await db.commit()
-                await db.refresh(db_agent)
-            except Exception as e:
-                print(f"Error while saving agent: {str(e)}")
-            return data
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        # Recorded first, so an agent Millis creates is saved locally even if this request dies
+        operation = await submit_operation(db, user.id, "create_agent", "POST", "/agents", agent.model_dump())
+        return operation_result(operation)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/bulk")
+async def bulk_agent_operations(request: BulkAgentRequest, db: AsyncSession = Depends(get_db), user = Depends(current_active_user)):
+    """
+    Run many agent operations in one request: update, attach_tools, duplicate, enable, disable.
+
+    Returns a result per operation in request order; one failing does not stop the others.
+    """
+    try:
+        return await run_bulk_operations(db, user, request.operations)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{agent_id}")
 async def get_agent_by_id_db(agent_id: str, db: AsyncSession = Depends(get_db), user = Depends(current_active_user)):
@@ -142,72 +186,35 @@ async def update_agent(agent_id: str, agent: AgentUpdate, db: AsyncSession = Dep
     db_agent = result.scalar_one_or_none()
     if not db_agent:
         raise HTTPException(status_code=404, detail=f"Not found agent {agent_id}")
-    async with httpx.AsyncClient() as client:
-        try:
-            headers = get_httpx_headers()
-            agent_data = agent.model_dump()
+    try:
+        plan = await plan_update(db, db_agent, user.id, agent.name, agent.config)
 
-            if "config" in agent_data and isinstance(agent_data["config"], dict):
-                config = agent_data["config"]
-                calendar_ids = config.get("calendar_ids", [])
-                
-                if calendar_ids:
-                    calendar_ids_list = calendar_ids if isinstance(calendar_ids, list) else [calendar_ids]
-                    calendar_uuid_list = []
-                    for cal_id in calendar_ids_list:
-                        try:
-                            if isinstance(cal_id, str):
-                                calendar_uuid_list.append(UUID(cal_id))
-                            else:
-                                calendar_uuid_list.append(cal_id)
-                        except:
-                            continue
-                    
-                    if calendar_uuid_list:
-                        calendars_result = await db.execute(
-                            select(Calendar).where(
-                                Calendar.id.in_(calendar_uuid_list),
-                                Calendar.user_id == user.id
-                            )
-                        )
-                        calendars = calendars_result.scalars().all()
-                        app_functions = config.get("app_functions", [])
-                        calendar_names = [cal.name for cal in calendars]
-                        app_functions = [f for f in app_functions if f.get("name") not in calendar_names]
-                        
-                        for calendar in calendars:
-                            function_config = {
-                                "name": calendar.name,
-                                "credentials": {
-                                    "api_key": decrypt_value(calendar.api_key),
-                                    "event_type_id": calendar.event_type_id,
-                                }
-                            }
-                            if calendar.contact_method:
-                                function_config["credentials"]["contact_method"] = calendar.contact_method
-                            app_functions.append(function_config)
-                        
-                        config["app_functions"] = app_functions
-                else:
-                    config["app_functions"] = []
-                
-                config_for_millisai = {k: v for k, v in config.items() if k != "calendar_ids"}
-                agent_data["config"] = config_for_millisai
+        response_text = "ok"
+        if plan.send:
+            async with millis_client() as client:
+                headers = get_httpx_headers()
+                payload = {"name": plan.name, "config": plan.patch}
+                response = await client.put(f"{httpx_base_url}/agents/{agent_id}", data=json.dumps(payload), headers=headers)
+                if response.status_code != 200 and response.status_code != 201:
+                    raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
+            response_text = response.text
+            AGENT_CONFIG_UPDATES.labels("patched").inc()
+        else:
+            AGENT_CONFIG_UPDATES.labels("unchanged").inc()
 
-            response = await client.put(f"{httpx_base_url}/agents/{agent_id}", data=json.dumps(agent_data), headers=headers)
-            if response.status_code != 200 and response.status_code != 201:
-                raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
-            db_agent.config = {**db_agent.config, **agent.config}
-            try:
-                await db.commit()
-                await db.refresh(db_agent)
-            except Exception as e:
-                print(f"Failed to save agent: {str(e)}")
-            return response.text
-        except HTTPException:
-            raise
+        apply_update(db_agent, plan)
+        try:
+            if "calendar_ids" in agent.config:
+                await set_agent_calendars(db, agent_id, user.id, agent.config["calendar_ids"])
+            await db.commit()
+            await db.refresh(db_agent)
         except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+            print(f"Failed to save agent: {str(e)}")
+        return response_text
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.put("/{agent_id}/tools")
@@ -221,37 +228,24 @@ async def update_agent_tool(
     db_agent = result.scalar_one_or_none()
     if not db_agent:
         raise HTTPException(status_code=404, detail=f"Not found agent {agent_id}")
-    agent_tools = []
+    tool_uuids = {}
     for tool in tools:
-        result = await db.execute(select(Tools).where(Tools.id == tool.id, Tools.user_id == user.id))
-        db_tool = result.scalar_one_or_none()
-        if not db_tool:
-            raise HTTPException(status_code=404, detail=f"Not found tool {tool.id}")
-        agent_tool = {
-            "name": to_function_name(db_tool.name) if db_tool.tool_id == "custom" else to_function_name(db_tool.tool_id),
-            "description": db_tool.description,
-            "webhook": db_tool.webhook,
-            "method": db_tool.method,
-        }
-        if db_tool.params is not None:
-            agent_tool["params"] = db_tool.params
-        if db_tool.header is not None:
-            agent_tool["header"] = db_tool.header
-        if tool.timeout is not None:
-            agent_tool["timeout"] = tool.timeout
-        if tool.run_after_call is not None:
-            agent_tool["run_after_call"] = tool.run_after_call
-        if tool.messages is not None:
-            agent_tool["messages"] = tool.messages
-        if tool.response_mode is not None:
-            agent_tool["response_mode"] = tool.response_mode
-        if tool.execute_after_message is not None:
-            agent_tool["execute_after_message"] = tool.execute_after_message
-        if tool.exclude_session_id is not None:
-            agent_tool["exclude_session_id"] = tool.exclude_session_id
-        agent_tools.append(agent_tool)
+        try:
+            tool_uuids[tool.id] = UUID(tool.id)
+        except ValueError:
+            continue
+    db_tools = {}
+    if tool_uuids:
+        result = await db.execute(
+            select(Tools).where(Tools.id.in_(set(tool_uuids.values())), Tools.user_id == user.id)
+        )
+        db_tools = {db_tool.id: db_tool for db_tool in result.scalars().all()}
+    missing = [tool.id for tool in tools if tool_uuids.get(tool.id) not in db_tools]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Not found tool {', '.join(dict.fromkeys(missing))}")
+    agent_tools = [agent_tool_config(db_tools[tool_uuids[tool.id]], tool.model_dump()) for tool in tools]
 
-    async with httpx.AsyncClient() as client:
+    async with millis_client() as client:
         try:
             headers = get_httpx_headers()
             payload = {
@@ -268,6 +262,7 @@ async def update_agent_tool(
             tools_data = [tool.model_dump() for tool in tools]
             db_agent.tools = tools_data
             try:
+                await set_agent_tools(db, agent_id, user.id, [tool.id for tool in tools])
                 await db.commit()
                 await db.refresh(db_agent)
             except Exception as e:
@@ -285,23 +280,16 @@ async def delete_agent(agent_id: str, db: AsyncSession = Depends(get_db), user =
     db_agent = result.scalar_one_or_none()
     if not db_agent:
         raise HTTPException(status_code=404, detail=f"Not found agent {agent_id}")
-    async with httpx.AsyncClient() as client:
-        try:
-            headers = get_httpx_headers()
-            response = await client.delete(f"{httpx_base_url}/agents/{agent_id}", headers=headers)
-            if response.status_code != 200 and response.status_code != 201:
-                raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
-            try:
-                await db.delete(db_agent)
-                await db.commit()
-                await db.refresh(db_agent)
-            except Exception as e:
-                print(f"Failed to delete agent: {str(e)}")
-            return response.text
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        # The agent and its links are removed once Millis has deleted it
+        operation = await open_operation(db, "delete_agent", agent_id)
+        if operation is None:
+            operation = await submit_operation(db, user.id, "delete_agent", "DELETE", f"/agents/{agent_id}", resource_id=agent_id)
+        return operation_result(operation)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{agent_id}/duplicate")
 async def duplicate_agent(agent_id: str, db: AsyncSession = Depends(get_db), user = Depends(current_active_user)):
@@ -309,7 +297,7 @@ async def duplicate_agent(agent_id: str, db: AsyncSession = Depends(get_db), use
     db_agent = result.scalar_one_or_none()
     if not db_agent:
         raise HTTPException(status_code=404, detail=f"Not found agent {agent_id}")
-    async with httpx.AsyncClient() as client:
+    async with millis_client() as client:
         try:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/agents/{agent_id}/duplicate", headers=headers)
@@ -347,7 +335,7 @@ async def get_call_histories(
     db_agent = result.scalar_one_or_none()
     if not db_agent:
         raise HTTPException(status_code=404, detail=f"Not found agent {agent_id}")
-    async with httpx.AsyncClient() as client:
+    async with millis_client() as client:
         try:
             headers = get_httpx_headers()
             response = await client.get(f"{httpx_base_url}/agents/{agent_id}/call-histories", headers=headers, params={ "start_at": start_at, "limit": limit })
@@ -365,7 +353,7 @@ async def set_embed_config(agent_id: str, embed_config: dict, db: AsyncSession =
     db_agent = result.scalar_one_or_none()
     if not db_agent:
         raise HTTPException(status_code=404, detail=f"Not found agent {agent_id}")
-    async with httpx.AsyncClient() as client:
+    async with millis_client() as client:
         try:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/agents/{agent_id}/embed", json=embed_config, headers=headers)
@@ -389,17 +377,28 @@ async def generate_agent_prompt(
         request: PromptGenerationRequest containing agent details
 
     Returns:
-        Generated prompt string
+        Generated prompt string, or with ``stream`` the prompt as plain text while it is generated
     """
+    fields = request.model_dump(exclude={"stream"})
+    if request.stream:
+        chunks = stream_prompt_with_openai(**fields)
+        try:
+            # Wait for the first piece so an OpenAI failure still gets an error status
+            first = await anext(chunks)
+        except StopAsyncIteration:
+            first = ""
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to generate prompt: {str(e)}")
+
+        async def body():
+            yield first
+            async for chunk in chunks:
+                yield chunk
+
+        return StreamingResponse(body(), media_type="text/plain; charset=utf-8")
+
     try:
-        prompt = await generate_prompt_with_openai(
-            agent_name=request.agent_name,
-            industry=request.industry,
-            description=request.description,
-            purpose=request.purpose,
-            personality=request.personality,
-            industry_prompt=request.industry_prompt,
-        )
+        prompt = await generate_prompt_with_openai(**fields)
         return {
             "prompt": prompt,
             "status": "success"
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 from app.core.config import settings
 from app.routers import (
+    admin,
     auth,
     health,
     agent,
@@ -19,6 +20,7 @@ from app.routers import (
     tool,
     automation,
     calendar,
+    operations,
 )
 
 api_router = APIRouter(prefix=settings.API_V1_STR)
@@ -41,3 +43,5 @@ api_router.include_router(stripe.router, prefix="/billing", tags=["billing"])
 api_router.include_router(tool.router, prefix="/tools", tags=["tools"])
 api_router.include_router(automation.router, prefix="/automation", tags=["automation"])
 api_router.include_router(calendar.router, prefix="/calendars", tags=["calendars"])
+api_router.include_router(operations.router, prefix="/operations", tags=["operations"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi_users import FastAPIUsers
 from fastapi_users.authentication import BearerTransport, JWTStrategy, AuthenticationBackend
 from fastapi_users.jwt import generate_jwt
@@ -220,11 +220,13 @@ async def verify_email_with_code(
 @router.post("/resend-verification")
 async def resend_verification_email(
     request: ResendVerificationRequest,
+    http_request: Request,
     db: AsyncSession = Depends(get_db),
     user_manager=Depends(get_user_manager)
 ):
     """Resend verification email with code to user."""
     from app.utils.email import email_service
+    from app.utils.email_templates import locale_from_accept_language
     from datetime import timedelta
     
     try:
@@ -262,7 +264,8 @@ async def resend_verification_email(
         # Send verification email with code
         await email_service.send_verification_email(
             to_email=user.email,
-            verification_code=verification_code
+            verification_code=verification_code,
+            locale=locale_from_accept_language(http_request.headers.get("accept-language"))
         )
         
         return {"message": "If an account exists with this email, a verification email has been sent."}
@@ -280,11 +283,13 @@ class ResetPasswordRequest(BaseModel):
 @router.post("/forgot-password")
 async def forgot_password(
     request: ForgotPasswordRequest,
+    http_request: Request,
     db: AsyncSession = Depends(get_db),
     user_manager=Depends(get_user_manager)
 ):
     """Request a password reset email."""
     from app.utils.email import email_service
+    from app.utils.email_templates import locale_from_accept_language
     from app.models import User
     
     try:
@@ -313,7 +318,8 @@ async def forgot_password(
         # Send password reset email
         await email_service.send_password_reset_email(
             to_email=user.email,
-            reset_token=reset_token
+            reset_token=reset_token,
+            locale=locale_from_accept_language(http_request.headers.get("accept-language"))
         )
         
         return {"message": "If an account exists with this email, a password reset link has been sent."}
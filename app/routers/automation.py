@@ -14,6 +14,7 @@ router = APIRouter()
 class WebhookRequest(BaseModel):
     webhook_url: str
     automation_id: str | None = None
+    batch: bool = False  # deliver several events per request as {"events": [...]}
 
 @router.post("/webhook")
 async def create_webhook(
@@ -44,12 +45,14 @@ async def create_webhook(
             # Update existing webhook
             existing_webhook.webhook_url = webhook_request.webhook_url
             existing_webhook.automation_id = webhook_request.automation_id
+            existing_webhook.batch = webhook_request.batch
             await db.commit()
             await db.refresh(existing_webhook)
             return {
                 "id": str(existing_webhook.id),
                 "webhook_url": existing_webhook.webhook_url,
                 "automation_id": existing_webhook.automation_id,
+                "batch": existing_webhook.batch,
                 "created_at": existing_webhook.created_at,
                 "message": "Webhook updated successfully"
             }
@@ -58,6 +61,7 @@ async def create_webhook(
             new_webhook = AutomationWebhook(
                 webhook_url=webhook_request.webhook_url,
                 automation_id=webhook_request.automation_id,
+                batch=webhook_request.batch,
                 user_id=current_user.id,
                 created_at=int(time.time() * 1000)  # milliseconds timestamp
             )
@@ -68,6 +72,7 @@ async def create_webhook(
                 "id": str(new_webhook.id),
                 "webhook_url": new_webhook.webhook_url,
                 "automation_id": new_webhook.automation_id,
+                "batch": new_webhook.batch,
                 "created_at": new_webhook.created_at,
                 "message": "Webhook created successfully"
             }
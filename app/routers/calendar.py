@@ -3,119 +3,17 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone
 from uuid import UUID
-import json
-import httpx
 
 from app.core.database import get_db
-from app.models import Calendar, Agent
+from app.models import Calendar
 from app.routers.auth import current_active_user
-from app.schemas.calendar import CalendarCreate, CalendarUpdate, CalendarResponse
-from app.utils.encryption import encrypt_value, decrypt_value
-from app.utils.httpx import get_httpx_headers, httpx_base_url
+from app.schemas.calendar import CalendarCreate, CalendarUpdate, CalendarResponse, CalendarUpdateResponse
+from app.services.agent_links import agents_using_calendar
+from app.services.agent_propagation import detach_calendar, propagate_calendar, report
+from app.utils.encryption import encrypt_value
 
 router = APIRouter()
 
-async def find_agents_using_calendar(calendar_id: UUID, calendar_name: str, db: AsyncSession, user) -> list[Agent]:
-    """Find all agents that use this calendar."""
-    result = await db.execute(select(Agent).where(Agent.user_id == user.id))
-    agents = result.scalars().all()
-    
-    using_agents = []
-    calendar_id_str = str(calendar_id)
-    for agent in agents:
-        if agent.config and isinstance(agent.config, dict):
-            calendar_ids = agent.config.get("calendar_ids", [])
-            # Handle both UUID strings and UUID objects in calendar_ids
-            if calendar_id_str in calendar_ids or calendar_id in calendar_ids:
-                using_agents.append(agent)
-    
-    return using_agents
-
-async def update_agent_app_functions_on_millisai(agent: Agent, calendar: Calendar, db: AsyncSession):
-    """Update agent's app_functions on MillisAI with calendar configuration."""
-    if not agent.config:
-        agent.config = {}
-    
-    app_functions = agent.config.get("app_functions", [])
-    app_functions = [f for f in app_functions if f.get("name") != calendar.name]
-    
-    function_config = {
-        "name": calendar.name,
-        "credentials": {
-            "api_key": decrypt_value(calendar.api_key),
-            "event_type_id": calendar.event_type_id,
-        }
-    }
-    
-    if calendar.contact_method:
-        function_config["credentials"]["contact_method"] = calendar.contact_method
-    
-    app_functions.append(function_config)
-    agent.config["app_functions"] = app_functions
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            headers = get_httpx_headers()
-            payload = {
-                "name": agent.name,
-                "config": {
-                    "app_functions": app_functions
-                }
-            }
-            response = await client.put(
-                f"{httpx_base_url}/agents/{agent.id}",
-                data=json.dumps(payload),
-                headers=headers
-            )
-            if response.status_code not in [200, 201]:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Failed to update agent on MillisAI: {response.text}"
-                )
-            
-            await db.commit()
-            await db.refresh(agent)
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error syncing with MillisAI: {str(e)}")
-
-async def remove_calendar_from_agent_app_functions(agent: Agent, calendar_name: str, db: AsyncSession):
-    """Remove calendar function from agent's app_functions on MillisAI."""
-    if not agent.config:
-        return
-    
-    app_functions = agent.config.get("app_functions", [])
-    app_functions = [f for f in app_functions if f.get("name") != calendar_name]
-    agent.config["app_functions"] = app_functions
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            headers = get_httpx_headers()
-            payload = {
-                "name": agent.name,
-                "config": {
-                    "app_functions": app_functions
-                }
-            }
-            response = await client.put(
-                f"{httpx_base_url}/agents/{agent.id}",
-                data=json.dumps(payload),
-                headers=headers
-            )
-            if response.status_code not in [200, 201]:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Failed to update agent on MillisAI: {response.text}"
-                )
-            
-            await db.commit()
-            await db.refresh(agent)
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error syncing with MillisAI: {str(e)}")
-
 @router.get("/", response_model=list[CalendarResponse])
 async def get_calendars(
     db: AsyncSession = Depends(get_db),
@@ -129,6 +27,26 @@ async def get_calendars(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/{calendar_id}/agents")
+async def get_calendar_agents(
+    calendar_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(current_active_user)
+):
+    """The agents that book through this calendar."""
+    try:
+        result = await db.execute(
+            select(Calendar.id).where(Calendar.id == calendar_id, Calendar.user_id == user.id)
+        )
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail=f"Calendar {calendar_id} not found")
+        agents = await agents_using_calendar(db, calendar_id, user.id)
+        return [{"id": agent.id, "name": agent.name} for agent in agents]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/", response_model=CalendarResponse)
 async def create_calendar(
     calendar: CalendarCreate,
@@ -162,7 +80,7 @@ async def create_calendar(
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.put("/{calendar_id}", response_model=CalendarResponse)
+@router.put("/{calendar_id}", response_model=CalendarUpdateResponse)
 async def update_calendar(
     calendar_id: UUID,
     calendar: CalendarUpdate,
@@ -179,6 +97,7 @@ async def update_calendar(
         if not db_calendar:
             raise HTTPException(status_code=404, detail=f"Calendar {calendar_id} not found")
         
+        previous_name = db_calendar.name
         db_calendar.name = calendar.name
         db_calendar.title = calendar.title
         db_calendar.provider = calendar.provider
@@ -193,11 +112,12 @@ async def update_calendar(
         except Exception as e:
             pass
         
-        using_agents = await find_agents_using_calendar(calendar_id, calendar.name, db, user)
-        for agent in using_agents:
-            await update_agent_app_functions_on_millisai(agent, db_calendar, db)
+        results = await propagate_calendar(db, db_calendar, user.id, previous_name)
         
-        return db_calendar
+        return CalendarUpdateResponse(
+            **CalendarResponse.model_validate(db_calendar).model_dump(),
+            agents=report(results),
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -220,20 +140,14 @@ async def delete_calendar(
         if not db_calendar:
             raise HTTPException(status_code=404, detail=f"Calendar {calendar_id} not found")
         
-        calendar_name = db_calendar.name
-        
-        using_agents = await find_agents_using_calendar(calendar_id, calendar_name, db, user)
-        calendar_id_str = str(calendar_id)
-        for agent in using_agents:
-            if agent.config and isinstance(agent.config, dict):
-                calendar_ids = agent.config.get("calendar_ids", [])
-                if calendar_id_str in calendar_ids:
-                    calendar_ids.remove(calendar_id_str)
-                elif calendar_id in calendar_ids:
-                    calendar_ids.remove(calendar_id)
-                agent.config["calendar_ids"] = calendar_ids
-            
-            await remove_calendar_from_agent_app_functions(agent, calendar_name, db)
+        results = await detach_calendar(db, db_calendar, user.id)
+        failed = [result for result in results if result.status != "updated"]
+        if failed:
+            # Keep the calendar while an agent on Millis still books through it
+            raise HTTPException(
+                status_code=502,
+                detail={"message": "Failed to remove the calendar from some agents", "agents": report(results)},
+            )
         
         try:
             await db.delete(db_calendar)
@@ -241,7 +155,7 @@ async def delete_calendar(
         except Exception as e:
             pass
         
-        return {"message": "Calendar deleted successfully"}
+        return {"message": "Calendar deleted successfully", "agents": report(results)}
     except HTTPException:
         raise
     except Exception as e:
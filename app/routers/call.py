@@ -1,9 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-import httpx
 
 from app.routers.auth import current_active_user
-from app.utils.httpx import get_httpx_headers, httpx_base_url
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
 from app.schemas import AgentGet
 
 router = APIRouter()
@@ -36,7 +35,7 @@ async def register_call(register_call_request: RegisterCallRequest, _ = Depends(
             "to_phone": register_call_request.to_phone,
             "session_continuation": register_call_request.session_continuation
         }
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/register_call", json=data, headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -61,7 +60,7 @@ async def register_sip_call(register_sip_call_request: RegisterCallRequest, _ =
             "to_phone": register_sip_call_request.to_phone,
             "session_continuation": register_sip_call_request.session_continuation
         }
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/register_sip_call", json=data, headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -76,7 +75,7 @@ async def register_sip_call(register_sip_call_request: RegisterCallRequest, _ =
 @router.post("/sessions/{session_id}/terminate")
 async def terminate_session(session_id: str, terminate_session_request: TerminateSessionRequest, _ = Depends(current_active_user)):
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/sessions/{session_id}/terminate", json=terminate_session_request.model_dump(), headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -101,7 +100,7 @@ async def start_outbound_call(start_outbound_call_request: StartOutboundCallRequ
             "to_phone": start_outbound_call_request.to_phone,
             "session_continuation": start_outbound_call_request.session_continuation
         }
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/start_outbound_call", json=data, headers=headers)
             if response.status_code != 200 and response.status_code != 201:
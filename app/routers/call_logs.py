@@ -1,16 +1,22 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select, cast
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
 import asyncio
-import httpx
+import json
 import os
+import random
 
+from app.core.config import settings
 from app.core.database import get_db, get_db_background
+from app.core.metrics import track_job
 from app.models import Agent, CallLog, User
 from app.routers.auth import current_active_user
+from app.services.call_log_stream import call_log_broker, call_summary
+from app.services.webhook_deliverer import add_webhook_events, webhook_deliverer
 # from app.utils.log import log_call_log
-from app.utils.httpx import get_httpx_headers, httpx_base_url
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
 
 router = APIRouter()
 
@@ -53,6 +59,8 @@ async def save_histories(histories: list):
         
     try:
         async with get_db_background() as session:
+            # Summaries to push to the owners' dashboards once the calls are saved
+            summaries = []
             for history in histories:
                 agent_id = history.get("agent_id")
                 cost_breakdown = history.get("cost_breakdown")
@@ -99,27 +107,49 @@ async def save_histories(histories: list):
                     # cost_breakdown already has margin applied above
                     cost = sum((item.get("credit") or 0) for item in cost_breakdown)
                 db_user.used_credit = (db_user.used_credit or 0) + cost
+                summaries.append((db_user.id, call_log, cost))
             try:
+                if summaries:
+                    # Ids are assigned on flush; the webhook events commit with the calls
+                    await session.flush()
+                    summaries = [(user_id, call_log, call_summary(call_log, cost)) for user_id, call_log, cost in summaries]
+                    await add_webhook_events(session, [
+                        (user_id, "call.ended", {**summary, "metadata": call_log.call_metadata, "recording": call_log.recording})
+                        for user_id, call_log, summary in summaries
+                    ])
                 await session.commit()
             except Exception as e:
                 print(f"Real Time: Failed to save history\n{str(e)}")
                 await session.rollback()
                 return False
+            for user_id, _, summary in summaries:
+                call_log_broker.publish(user_id, summary)
+            if summaries:
+                webhook_deliverer.notify()
             return True
     except Exception as e:
         print(f"Real Time: Failed to save call logs\n{str(e)}")
         return False
 
+# Backoff of get_all_logs after consecutive failures, so an outage is not hammered every few seconds
+BACKFILL_RETRY_BASE_SECONDS = 5
+BACKFILL_RETRY_MAX_SECONDS = 300
+
+def backfill_retry_delay(failures: int) -> float:
+    delay = min(BACKFILL_RETRY_BASE_SECONDS * 2 ** (failures - 1), BACKFILL_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.5)
+
 async def get_all_logs():
     await asyncio.sleep(10)  # Initial delay
     max_ts = await get_next_cursor()
+    failures = 0
     
     while True:
         try:
             print('-------------------------')
             print(f"Next cursor is {max_ts}")
             
-            async with httpx.AsyncClient() as client:
+            async with millis_client() as client:
                 headers = get_httpx_headers()
                 params = {
                     "limit": 100,
@@ -136,9 +166,11 @@ async def get_all_logs():
                 if histories:
                     success = await save_histories(histories)
                     if not success:
-                        await asyncio.sleep(5)  # Wait before retrying on failure
+                        failures += 1
+                        await asyncio.sleep(backfill_retry_delay(failures))
                         continue
                 
+                failures = 0
                 print('-------------------------')
                 max_ts = data.get("next_cursor", 0)
                 if not max_ts:
@@ -148,9 +180,12 @@ async def get_all_logs():
                 await asyncio.sleep(1)  # Small delay between batches
 
         except Exception as e:
-            print(f"Real Time: Failed to get all call logs\n{str(e)}")
-            await asyncio.sleep(10)
+            failures += 1
+            delay = backfill_retry_delay(failures)
+            print(f"Real Time: Failed to get all call logs, retrying in {delay:.0f}s\n{str(e)}")
+            await asyncio.sleep(delay)
 
+@track_job("get_next_logs")
 async def get_next_logs():
     last_time = await get_end_time()
     try:
@@ -162,7 +197,7 @@ async def get_next_logs():
         print('-------------------------')
         print(f"Start time is {start_time}")
         
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             params = {
                 "limit": 100,
@@ -221,6 +256,51 @@ async def get_logs(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/stream")
+async def stream_logs(
+    request: Request,
+    agent_id: str = None,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(current_active_user)
+):
+    """
+    Server-sent events with a summary of each new call of the user's agents, or of one
+    agent, as it is ingested. Comments are sent as keepalives; a ``dropped`` event means
+    the client fell behind and should reload the list and reconnect.
+    """
+    if agent_id:
+        result = await db.execute(select(Agent.id).where(Agent.id == agent_id, Agent.user_id == user.id))
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail=f"Not found agent {agent_id}")
+    # Hand the connection back to the pool rather than holding it for the life of the stream
+    await db.close()
+    subscription = call_log_broker.subscribe(user.id, agent_id)
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while not subscription.dropped:
+                try:
+                    summary = await asyncio.wait_for(subscription.queue.get(), timeout=settings.CALL_LOG_STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if subscription.dropped:
+                    break
+                yield f"event: call\ndata: {json.dumps(summary, default=str)}\n\n"
+            if subscription.dropped:
+                yield "event: dropped\ndata: {}\n\n"
+        finally:
+            call_log_broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/{session_id}")
 async def get_call_log(session_id: str, db: AsyncSession = Depends(get_db), _ = Depends(current_active_user)):
     try:
@@ -238,7 +318,7 @@ async def get_call_log(session_id: str, db: AsyncSession = Depends(get_db), _ =
 @router.delete("/{session_id}")
 async def delete_call_log(session_id: str, db: AsyncSession = Depends(get_db), _ = Depends(current_active_user)):
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.delete(f"{httpx_base_url}/call-logs/{session_id}", headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -2,12 +2,13 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-import httpx
 
 from app.core.database import get_db
 from app.models import Campaign
 from app.routers.auth import current_active_user
-from app.utils.httpx import get_httpx_headers, httpx_base_url
+from app.services.millis_outbox import open_operation, operation_result, submit_operation
+from app.services.webhook_deliverer import add_webhook_events, webhook_deliverer
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
 
 router = APIRouter()
 
@@ -23,7 +24,7 @@ class SetCallerRequest(BaseModel):
 
 async def get_campaigns():
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.get(f"{httpx_base_url}/campaigns", headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -42,7 +43,7 @@ async def create_campaign(
     user = Depends(current_active_user)
 ):
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/campaigns", json=create_campaign_request.model_dump(), headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -89,7 +90,7 @@ async def upload_campaign_record(
     if not db_campaign:
         raise HTTPException(status_code=404, detail=f"Not found campaign {campaign_id}")
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/campaigns/{campaign_id}/records", json=upload_campaign_record_request, headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -123,32 +124,42 @@ async def set_caller(
     if not db_campaign:
         raise HTTPException(status_code=404, detail=f"Not found campaign {campaign_id}")
     try:
-        async with httpx.AsyncClient() as client:
-            headers = get_httpx_headers()
-            response = await client.post(f"{httpx_base_url}/campaigns/{campaign_id}/set_caller", json=set_caller_request.model_dump(), headers=headers)
-            if response.status_code != 200 and response.status_code != 201:
-                raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
-            db_campaign.caller = set_caller_request.caller
-            try:
-                await db.commit()
-                await db.refresh(db_campaign)
-            except Exception as e:
-                print(f"Failed to update campaign: {str(e)}")
-            return response.text
+        # The caller is saved once Millis has accepted it, so its validation errors reach the user
+        operation = await submit_operation(
+            db, user.id, "set_caller", "POST", f"/campaigns/{campaign_id}/set_caller",
+            set_caller_request.model_dump(), resource_id=campaign_id,
+        )
+        return operation_result(operation)
 
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def record_campaign_status(db: AsyncSession, campaign_id: str, user_id, status: str):
+    """Save a campaign's new status and queue a campaign.status event for the user's webhooks."""
+    result = await db.execute(select(Campaign).where(Campaign.id == campaign_id, Campaign.user_id == user_id))
+    db_campaign = result.scalar_one_or_none()
+    if not db_campaign:
+        return
+    db_campaign.status = status
+    try:
+        await add_webhook_events(db, [(user_id, "campaign.status", {"campaign_id": campaign_id, "name": db_campaign.name, "status": status})])
+        await db.commit()
+        webhook_deliverer.notify()
+    except Exception as e:
+        await db.rollback()
+        print(f"Failed to update campaign: {str(e)}")
+
 @router.post("/{campaign_id}/start")
-async def start_campaign(campaign_id: str, _ = Depends(current_active_user)):
+async def start_campaign(campaign_id: str, db: AsyncSession = Depends(get_db), user = Depends(current_active_user)):
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/campaigns/{campaign_id}/start", headers=headers)
             if response.status_code != 200 and response.status_code != 201:
                 raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
+            await record_campaign_status(db, campaign_id, user.id, "started")
             return response.text
 
     except HTTPException:
@@ -157,13 +168,14 @@ async def start_campaign(campaign_id: str, _ = Depends(current_active_user)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/{campaign_id}/stop")
-async def stop_campaign(campaign_id: str, _ = Depends(current_active_user)):
+async def stop_campaign(campaign_id: str, db: AsyncSession = Depends(get_db), user = Depends(current_active_user)):
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/campaigns/{campaign_id}/stop", headers=headers)
             if response.status_code != 200 and response.status_code != 201:
                 raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
+            await record_campaign_status(db, campaign_id, user.id, "paused")
             return response.text
 
     except HTTPException:
@@ -200,18 +212,11 @@ async def delete_campaign(
         raise HTTPException(status_code=404, detail=f"Not found campaign {campaign_id}")
 
     try:
-        async with httpx.AsyncClient() as client:
-            headers = get_httpx_headers()
-            response = await client.delete(f"{httpx_base_url}/campaigns/{campaign_id}", headers=headers)
-            if response.status_code != 200 and response.status_code != 201:
-                raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
-            try:
-                await db.delete(db_campaign)
-                await db.commit()
-                await db.refresh(db_campaign)
-            except Exception as e:
-                print(f"Failed to delete campaign: {str(e)}")
-            return response.text
+        # The campaign is removed once Millis has deleted it
+        operation = await open_operation(db, "delete_campaign", campaign_id)
+        if operation is None:
+            operation = await submit_operation(db, user.id, "delete_campaign", "DELETE", f"/campaigns/{campaign_id}", resource_id=campaign_id)
+        return operation_result(operation)
 
     except HTTPException:
         raise
@@ -221,7 +226,7 @@ async def delete_campaign(
 # @router.get("/{campaign_id}/info")
 async def get_campaign_info(campaign_id: str):
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.get(f"{httpx_base_url}/campaigns/{campaign_id}/info", headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -246,7 +251,7 @@ async def update_campaign_info(
         raise HTTPException(status_code=404, detail=f"Not found campaign {campaign_id}")
 
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.put(f"{httpx_base_url}/campaigns/{campaign_id}/info", json=request.model_dump(), headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -280,7 +285,7 @@ async def delete_campaign_record(
         raise HTTPException(status_code=404, detail=f"Not found campaign {campaign_id}")
 
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.delete(f"{httpx_base_url}/campaigns/{campaign_id}/records/{phone}", headers=headers)
             if response.status_code != 200 and response.status_code != 201:
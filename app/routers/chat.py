@@ -2,10 +2,9 @@ from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from io import BytesIO
-import httpx
 
 from app.routers.auth import current_active_user
-from app.utils.httpx import get_httpx_headers, httpx_base_url
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
 from app.schemas import AgentGet
 
 router = APIRouter()
@@ -28,7 +27,7 @@ async def chat(chat_request: ChatRequest, _ = Depends(current_active_user)):
             },
             "end_of_session": False
         }
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/chat/completions", json=data, headers=headers)
             if response.status_code != 200 and response.status_code != 201:
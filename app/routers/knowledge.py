@@ -1,111 +1,23 @@
-from datetime import datetime, timezone
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, File, Query, UploadFile, status
 from pydantic import BaseModel, Field
-from sqlalchemy import select
+from typing import Literal
+from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
-import httpx, json
 import logging
-from bs4 import BeautifulSoup
 
 from app.core.database import get_db
-from app.models import Knowledge
+from app.models import Knowledge, KnowledgeSource
 from app.routers.auth import current_active_user
-from app.utils.httpx import get_httpx_headers, httpx_base_url
+from app.services.crawler import website_crawler
+from app.services.knowledge_files import create_knowledge_file, delete_knowledge_file, register_source, set_agent_files
+from app.services.knowledge_index import IndexMismatch, get_chunks, index_text, search
+from app.services.scraper import DocumentTooLarge, parse_html, scrape_url
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Helper Functions for URL Scraping
-def extract_text_from_html(html: str) -> str:
-    """
-    Extract clean text from HTML content.
-    
-    Args:
-        html: HTML content as string
-        
-    Returns:
-        Clean text content
-    """
-    try:
-        # Parse HTML with BeautifulSoup
-        soup = BeautifulSoup(html, 'lxml')
-    except Exception:
-        # Fallback to html5lib if lxml fails
-        soup = BeautifulSoup(html, 'html5lib')
-    
-    # Remove script, style, and other non-content elements
-    for element in soup(['script', 'style', 'noscript', 'meta', 'link', 'head']):
-        element.decompose()
-    
-    # Get text content
-    text = soup.get_text(separator=' ', strip=True)
-    
-    # Clean up whitespace
-    lines = (line.strip() for line in text.splitlines())
-    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-    text = ' '.join(chunk for chunk in chunks if chunk)
-    
-    return text
-
-async def scrape_url(url: str, timeout: int = 30) -> str:
-    """
-    Scrape text content from a URL.
-    
-    Args:
-        url: The URL to scrape
-        timeout: Request timeout in seconds (default: 30)
-        
-    Returns:
-        Extracted text content
-        
-    Raises:
-        ValueError: If URL is invalid
-        httpx.RequestError: If request fails
-    """
-    # Validate URL format
-    if not url.startswith(('http://', 'https://')):
-        raise ValueError(f"Invalid URL format: {url}. URL must start with http:// or https://")
-    
-    # Set headers to mimic a browser request
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip, deflate',
-        'Connection': 'keep-alive',
-    }
-    
-    try:
-        # Make the request using httpx
-        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()  # Raise an exception for bad status codes
-            
-            # Check content type
-            content_type = response.headers.get('Content-Type', '').lower()
-            if 'text/html' not in content_type and 'text/plain' not in content_type:
-                logger.warning(f"Unexpected content type: {content_type} for URL: {url}")
-            
-            # Extract text from HTML
-            text = extract_text_from_html(response.text)
-            
-            if not text or len(text.strip()) == 0:
-                raise ValueError(f"No text content found on the page: {url}")
-            
-            return text
-            
-    except httpx.TimeoutException as e:
-        raise ValueError(f"Request timeout after {timeout} seconds for URL: {url}") from e
-    except httpx.ConnectError as e:
-        raise ValueError(f"Connection error while fetching URL: {url}") from e
-    except httpx.HTTPStatusError as e:
-        raise ValueError(f"HTTP error {e.response.status_code} while fetching URL: {url}") from e
-    except httpx.HTTPError as e:
-        raise ValueError(f"HTTP error while fetching URL {url}: {str(e)}") from e
-    except Exception as e:
-        raise ValueError(f"Error scraping URL {url}: {str(e)}") from e
-
 class GeneratePresignedUrlRequest(BaseModel):
     filename: str
 
@@ -134,6 +46,21 @@ class ScrapeUrlRequest(BaseModel):
             }
         }
 
+class CrawlRequest(BaseModel):
+    url: str = Field(..., description="Start page, or a sitemap.xml listing the pages to crawl")
+    name: str | None = Field(None, description="Knowledge file name, defaults to the site name")
+    description: str = ""
+    max_depth: int = Field(2, ge=0, le=5, description="Link hops to follow from the start pages")
+    max_pages: int = Field(50, ge=1, description="Pages to include in the knowledge file")
+    refresh_interval_hours: int | None = Field(None, ge=1, description="Re-crawl this often and re-upload if the content changed")
+
+class KnowledgeSourceRequest(BaseModel):
+    url: str = Field(..., description="Page (or crawl start page) the knowledge file was built from")
+    source_type: Literal["url", "crawl"] = "url"
+    refresh_interval_hours: int | None = Field(24, ge=1, description="Refresh schedule; null stops refreshing")
+    max_depth: int = Field(2, ge=0, le=5)
+    max_pages: int = Field(50, ge=1)
+
 class ScrapeUrlResponse(BaseModel):
     text: str = Field(..., description="Extracted text content from the URL")
     
@@ -150,7 +77,7 @@ async def generate_presigned_url(
     _ = Depends(current_active_user)
 ):
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/knowledge/generate_presigned_url", json=generate_presigned_url_request.model_dump(), headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -169,28 +96,7 @@ async def create_file(
     user = Depends(current_active_user)
 ):
     try:
-        async with httpx.AsyncClient() as client:
-            headers = get_httpx_headers()
-            response = await client.post(f"{httpx_base_url}/knowledge/create_file", data=json.dumps(create_file_request.model_dump()), headers=headers)
-            if response.status_code != 200 and response.status_code != 201:
-                raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
-            id = create_file_request.object_key.split("/")[1].split("_")[0]
-            db_knowledge = Knowledge(
-                id = id,
-                name = create_file_request.name,
-                description = create_file_request.description,
-                file_type = create_file_request.file_type,
-                size = create_file_request.size,
-                created_at = int(datetime.now(timezone.utc).timestamp()),
-                user_id = user.id
-            )
-            db.add(db_knowledge)
-            try:
-                await db.commit()
-                await db.refresh(db_knowledge)
-            except Exception as e:
-                print(f"Error while saving knowledge: {str(e)}")
-            return response.json()
+        return await create_knowledge_file(db, user.id, create_file_request.model_dump())
 
     except HTTPException:
         raise
@@ -209,18 +115,7 @@ async def delete_file(
         db_knowledge = result.scalar_one_or_none()
         if not db_knowledge:
             raise HTTPException(status_code=404, detail=f"Not found knowledge {id}")
-        async with httpx.AsyncClient() as client:
-            headers = get_httpx_headers()
-            response = await client.post(f"{httpx_base_url}/knowledge/delete_file", json=delete_file_request.model_dump(), headers=headers)
-            if response.status_code != 200 and response.status_code != 201:
-                raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
-            try:
-                await db.delete(db_knowledge)
-                await db.commit()
-                await db.refresh(db_knowledge)
-            except Exception as e:
-                print(f"Failed to delete knowledge: {str(e)}")
-            return response.text
+        return await delete_knowledge_file(db, db_knowledge)
 
     except HTTPException:
         raise
@@ -228,14 +123,18 @@ async def delete_file(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/set_agent_files")
-async def set_agent_files(set_agent_files_request: SetAgentFilesRequest, _ = Depends(current_active_user)):
+async def set_agent_files_endpoint(
+    set_agent_files_request: SetAgentFilesRequest,
+    db: AsyncSession = Depends(get_db),
+    _ = Depends(current_active_user)
+):
     try:
-        async with httpx.AsyncClient() as client:
-            headers = get_httpx_headers()
-            response = await client.post(f"{httpx_base_url}/knowledge/set_agent_files", json=set_agent_files_request.model_dump(), headers=headers)
-            if response.status_code != 200 and response.status_code != 201:
-                raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
-            return response.text
+        return await set_agent_files(
+            db,
+            set_agent_files_request.agent_id,
+            set_agent_files_request.files,
+            set_agent_files_request.messages,
+        )
 
     except HTTPException:
         raise
@@ -255,7 +154,7 @@ async def list_files_db(db: AsyncSession = Depends(get_db), user = Depends(curre
 # @router.get("/list_files")
 async def list_files():
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.get(f"{httpx_base_url}/knowledge/list_files", headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -290,6 +189,11 @@ async def scrape_url_endpoint(request: ScrapeUrlRequest):
         
         return ScrapeUrlResponse(text=text)
         
+    except DocumentTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     except ValueError as e:
         logger.error(f"Validation error: {str(e)}")
         # Check if it's a connection/timeout/HTTP error (should be 502) or validation error (400)
@@ -309,3 +213,161 @@ async def scrape_url_endpoint(request: ScrapeUrlRequest):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An unexpected error occurred: {str(e)}"
         )
+
+@router.post("/crawl", status_code=status.HTTP_202_ACCEPTED)
+async def start_crawl(request: CrawlRequest, user = Depends(current_active_user)):
+    """
+    Crawl a website and ingest its pages as one knowledge file.
+
+    The crawl runs in the background; poll GET /knowledge/crawl/{job_id} for progress.
+    """
+    if not request.url.startswith(('http://', 'https://')):
+        raise HTTPException(status_code=400, detail=f"Invalid URL format: {request.url}. URL must start with http:// or https://")
+    job = website_crawler.start(
+        user.id,
+        request.url,
+        max_depth=request.max_depth,
+        max_pages=request.max_pages,
+        name=request.name or f"Website: {request.url}",
+        description=request.description,
+        refresh_interval=request.refresh_interval_hours * 3600 if request.refresh_interval_hours else None,
+    )
+    return job.to_dict()
+
+@router.get("/crawl/{job_id}")
+async def get_crawl(job_id: str, user = Depends(current_active_user)):
+    job = website_crawler.get(job_id, user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Not found crawl job {job_id}")
+    return job.to_dict()
+
+@router.get("/sources")
+async def list_sources(db: AsyncSession = Depends(get_db), user = Depends(current_active_user)):
+    """Refresh state of the user's URL- and crawl-sourced knowledge files."""
+    try:
+        result = await db.execute(select(KnowledgeSource).where(KnowledgeSource.user_id == user.id))
+        return result.scalars().all()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/{knowledge_id}/source")
+async def set_source(
+    knowledge_id: str,
+    request: KnowledgeSourceRequest,
+    db: AsyncSession = Depends(get_db),
+    user = Depends(current_active_user)
+):
+    """
+    Record the URL an existing knowledge file was built from so it is refreshed on a schedule.
+
+    The first refresh always re-uploads, since the current file's content is not known here.
+    """
+    if not request.url.startswith(('http://', 'https://')):
+        raise HTTPException(status_code=400, detail=f"Invalid URL format: {request.url}. URL must start with http:// or https://")
+    try:
+        result = await db.execute(select(Knowledge).where(Knowledge.id == knowledge_id, Knowledge.user_id == user.id))
+        if not result.scalar_one_or_none():
+            raise HTTPException(status_code=404, detail=f"Not found knowledge {knowledge_id}")
+        refresh_interval = request.refresh_interval_hours * 3600 if request.refresh_interval_hours else None
+        options = {"max_depth": request.max_depth, "max_pages": request.max_pages} if request.source_type == "crawl" else {}
+
+        result = await db.execute(select(KnowledgeSource).where(KnowledgeSource.knowledge_id == knowledge_id))
+        source = result.scalar_one_or_none()
+        if source is None:
+            source = register_source(db, user.id, knowledge_id, request.source_type, request.url, None, None, refresh_interval, options)
+            # Due straight away so the file is brought in line with the URL
+            source.next_refresh_at = source.created_at if refresh_interval else None
+        else:
+            if source.url != request.url or source.source_type != request.source_type:
+                source.content_hash = None
+            source.url = request.url
+            source.source_type = request.source_type
+            source.options = options
+            source.refresh_interval = refresh_interval
+            source.next_refresh_at = (source.last_checked_at or 0) + refresh_interval if refresh_interval else None
+        await db.commit()
+        await db.refresh(source)
+        return source
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/{knowledge_id}/source")
+async def delete_source(knowledge_id: str, db: AsyncSession = Depends(get_db), user = Depends(current_active_user)):
+    """Stop refreshing a knowledge file; the file itself is kept."""
+    try:
+        await db.execute(delete(KnowledgeSource).where(
+            KnowledgeSource.knowledge_id == knowledge_id,
+            KnowledgeSource.user_id == user.id,
+        ))
+        await db.commit()
+        return {"message": "Knowledge source removed"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/search")
+async def search_knowledge(
+    q: str = Query(..., min_length=1, description="Text to find similar passages for"),
+    k: int = Query(5, ge=1, le=50),
+    knowledge_id: list[str] | None = Query(None, description="Only search these files"),
+    user = Depends(current_active_user)
+):
+    """Most similar chunks across the user's indexed knowledge files."""
+    try:
+        return await search(user.id, q, k, knowledge_id)
+    except IndexMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{knowledge_id}/chunks")
+async def preview_chunks(
+    knowledge_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+    user = Depends(current_active_user)
+):
+    """The indexed text of a knowledge file, chunk by chunk."""
+    try:
+        result = await get_chunks(user.id, knowledge_id, offset, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Knowledge {knowledge_id} is not indexed")
+    return result
+
+@router.post("/{knowledge_id}/index")
+async def index_file(
+    knowledge_id: str,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    user = Depends(current_active_user)
+):
+    """
+    Index the content of a file uploaded directly to Millis, which this backend never sees.
+
+    Accepts plain text, Markdown, CSV and HTML.
+    """
+    result = await db.execute(select(Knowledge).where(Knowledge.id == knowledge_id, Knowledge.user_id == user.id))
+    if not result.scalar_one_or_none():
+        raise HTTPException(status_code=404, detail=f"Not found knowledge {knowledge_id}")
+    content_type = (file.content_type or "").lower()
+    if not content_type.startswith("text/"):
+        raise HTTPException(status_code=415, detail=f"Cannot index {content_type or 'unknown'} content")
+    try:
+        content = await file.read()
+        if "html" in content_type:
+            text = await parse_html(content)
+        else:
+            text = content.decode("utf-8", errors="replace")
+        chunks = await index_text(user.id, knowledge_id, text)
+        return {"knowledge_id": knowledge_id, "chunks": chunks}
+    except IndexMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import UUID
+
+from app.core.database import get_db
+from app.models import MillisOutbox
+from app.routers.auth import current_active_user
+from app.services.millis_outbox import operation_state
+
+router = APIRouter()
+
+@router.get("/")
+async def get_operations(
+    status: str = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db),
+    user = Depends(current_active_user)
+):
+    """The user's recent Millis operations, newest first."""
+    try:
+        query = select(MillisOutbox).where(MillisOutbox.user_id == user.id)
+        if status:
+            query = query.where(MillisOutbox.status == status)
+        result = await db.execute(query.order_by(MillisOutbox.created_at.desc()).limit(limit))
+        return [operation_state(operation) for operation in result.scalars().all()]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{operation_id}")
+async def get_operation(operation_id: UUID, db: AsyncSession = Depends(get_db), user = Depends(current_active_user)):
+    """Where a Millis operation returned as pending has got to."""
+    try:
+        result = await db.execute(
+            select(MillisOutbox).where(MillisOutbox.id == operation_id, MillisOutbox.user_id == user.id)
+        )
+        operation = result.scalar_one_or_none()
+        if not operation:
+            raise HTTPException(status_code=404, detail=f"Not found operation {operation_id}")
+        return operation_state(operation)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -3,12 +3,12 @@ from pydantic import BaseModel
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone
-import httpx
 
 from app.core.database import get_db
 from app.models import Phone, User
 from app.routers.auth import current_active_user
-from app.utils.httpx import get_httpx_headers, httpx_base_url
+from app.services.millis_outbox import open_operation, operation_result, submit_operation
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
 
 router = APIRouter()
 
@@ -55,7 +55,7 @@ async def set_phone_agent(
         db_phone = result.scalar_one_or_none()
         if not db_phone:
             raise HTTPException(status_code=404, detail=f"Not found phone {phone}")
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/set_phone_agent", json=set_phone_agent_request.model_dump(), headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -76,7 +76,7 @@ async def set_phone_agent(
 # @router.get("/phones")
 async def get_phones():
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.get(f"{httpx_base_url}/phones", headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -91,7 +91,7 @@ async def get_phones():
 # @router.get("/phone/{phone_id}")
 async def get_phone(phone_id: str):
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.get(f"{httpx_base_url}/phones/{phone_id}", headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -142,18 +142,11 @@ async def delete_phone(
         db_phone = result.scalar_one_or_none()
         if not db_phone:
             raise HTTPException(status_code=404, detail=f"Not found phone {phone_id}")
-        async with httpx.AsyncClient() as client:
-            headers = get_httpx_headers()
-            response = await client.delete(f"{httpx_base_url}/phones/{phone_id}", headers=headers)
-            if response.status_code != 200 and response.status_code != 201:
-                raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
-            try:
-                await db.delete(db_phone)
-                await db.commit()
-                await db.refresh(db_phone)
-            except Exception as e:
-                print(f"Error while setting agent config: {str(e)}")
-            return {"detail": "Phone deleted successfully"}
+        # The phone is removed once Millis has deleted it
+        operation = await open_operation(db, "delete_phone", phone_id)
+        if operation is None:
+            operation = await submit_operation(db, user.id, "delete_phone", "DELETE", f"/phones/{phone_id}", resource_id=phone_id)
+        return operation_result(operation, {"detail": "Phone deleted successfully"})
 
     except HTTPException:
         raise
@@ -172,7 +165,7 @@ async def set_phone_tag(
         db_phone = result.scalar_one_or_none()
         if not db_phone:
             raise HTTPException(status_code=404, detail=f"Not found phone {phone_id}")
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.put(f"{httpx_base_url}/phones/{phone_id}", json=request.model_dump(), headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -202,7 +195,7 @@ async def set_agent_config_override(
         db_phone = result.scalar_one_or_none()
         if not db_phone:
             raise HTTPException(status_code=404, detail=f"Not found phone {phone}")
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/phones/{phone}/agent-config-override", json=agent_config_override, headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -232,7 +225,7 @@ async def set_agent(
         db_phone = result.scalar_one_or_none()
         if not db_phone:
             raise HTTPException(status_code=404, detail=f"Not found phone {phone}")
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/phones/{phone}/set_agent", json=request.model_dump(), headers=headers)
             if response.status_code != 200 and response.status_code != 201:
@@ -257,7 +250,7 @@ async def import_phone_number(
     user = Depends(current_active_user)
 ):
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             payload = {
                 "country": request.country,
@@ -320,7 +313,7 @@ async def purchase_phone_number(
         remain_credit = user.total_credit - user.used_credit
         if remain_credit < 3000:
             raise HTTPException(status_code=400, detail="You don't have enough credit")
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/phones/purchase", json=request.model_dump(), headers=headers)
             if response.status_code != 200 and response.status_code != 201:
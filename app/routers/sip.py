@@ -1,14 +1,13 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-from sqlalchemy import select, cast, Text
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime, timezone
-import httpx
+import time
 
 from app.core.database import get_db
-from app.models import Agent
+from app.models import Agent, SipSession
 from app.routers.auth import current_active_user
-from app.utils.httpx import get_httpx_headers, httpx_base_url
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
 from app.schemas import AgentGet
 
 router = APIRouter()
@@ -54,20 +53,18 @@ async def create_sip(
             },
             "region": create_sip_request.region
         }
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/sip", json=data, headers=headers)
             if response.status_code != 200 and response.status_code != 201:
                 raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
             data = response.json()
-            sip = db_agent.sip or dict()
-            sip[data.get("sip")] = datetime.now(timezone.utc).timestamp()
-            db_agent.sip = sip
-            try:
-                await db.commit()
-                await db.refresh(db_agent)
-            except Exception as e:
-                print(f"Failed to update agent: {str(e)}")
+            if data.get("sip"):
+                db.add(SipSession(call_id=data.get("sip"), agent_id=agent_id, user_id=user.id, created_at=int(time.time())))
+                try:
+                    await db.commit()
+                except Exception as e:
+                    print(f"Failed to save SIP session: {str(e)}")
             return data
 
     except HTTPException:
@@ -78,21 +75,22 @@ async def create_sip(
 @router.delete("/sip/{call_id}")
 async def delete_sip(call_id: str, db: AsyncSession = Depends(get_db), user = Depends(current_active_user)):
     try:
-        result = await db.execute(select(Agent).where(Agent.user_id == user.id, cast(Agent.sip, Text).contains(call_id)))
-        db_agent = result.scalar_one_or_none()
-        if not db_agent:
+        result = await db.execute(
+            select(SipSession).where(SipSession.call_id == call_id, SipSession.user_id == user.id, SipSession.ended_at.is_(None))
+        )
+        sip_session = result.scalar_one_or_none()
+        if not sip_session:
             raise HTTPException(status_code=404, detail=f"Not found call {call_id}")
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.delete(f"{httpx_base_url}/sip/{call_id}", headers=headers)
             if response.status_code != 200 and response.status_code != 201:
                 raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
-            db_agent.sip = {k: v for k, v in db_agent.sip.items() if call_id not in k}
+            sip_session.ended_at = int(time.time())
             try:
                 await db.commit()
-                await db.refresh(db_agent)
             except Exception as e:
-                print(f"Failed to update agent: {str(e)}")
+                print(f"Failed to update SIP session: {str(e)}")
             return response.text
 
     except HTTPException:
@@ -104,7 +102,7 @@ async def delete_sip(call_id: str, db: AsyncSession = Depends(get_db), user = De
 async def create_webrtc_offer(create_webrtc_offer_request: CreateWebrtcOfferRequest, _ = Depends(current_active_user)):
     """Create a WebRTC offer for a call."""
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.post(f"{httpx_base_url}/webrtc/offer", json=create_webrtc_offer_request.model_dump(), headers=headers)
             if response.status_code != 200 and response.status_code != 201:
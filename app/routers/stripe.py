@@ -8,6 +8,7 @@ import stripe
 import logging
 
 from app.core.database import get_db_background
+from app.core.metrics import track_job
 from app.models import User
 from app.routers.auth import current_active_user
 
@@ -352,6 +353,7 @@ async def check_and_process_auto_refill(user: User = Depends(current_active_user
     return {"refill_needed": False}
 
 # Background task to check all users for auto-refill
+@track_job("process_all_auto_refills")
 async def process_all_auto_refills():
     """Background task to process auto-refills for all users"""
     # This should be called by a cron job or background task scheduler
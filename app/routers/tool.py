@@ -5,8 +5,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone
 
 from app.core.database import get_db
-from app.models import Agent, Tools
+from app.models import Tools
 from app.routers.auth import current_active_user
+from app.services.agent_links import agents_using_tool
+from app.services.agent_propagation import propagate_tool, report
 
 router = APIRouter()
 
@@ -72,17 +74,7 @@ async def raise_for_tool(
     user
 ):
     # Check if the tool is connected to any agents
-    result = await db.execute(select(Agent).where(Agent.user_id == user.id))
-    agents = result.scalars().all()
-
-    connected_agents = []
-    for agent in agents:
-        if agent.tools:
-            # agent.tools is now a list of AgentToolRequest objects with 'id' field
-            for tool in agent.tools:
-                if tool.get('id') == tool_id:
-                    connected_agents.append(agent.name)
-                    break
+    connected_agents = [agent.name for agent in await agents_using_tool(db, tool_id, user.id)]
 
     if connected_agents:
         agent_names = ", ".join(connected_agents)
@@ -142,6 +134,21 @@ async def get_tool(tool_id: str, db: AsyncSession = Depends(get_db), user = Depe
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/{id}/agents")
+async def get_tool_agents(id: str, db: AsyncSession = Depends(get_db), user = Depends(current_active_user)):
+    """The agents this tool is attached to."""
+    try:
+        result = await db.execute(select(Tools.id).where(Tools.id == id, Tools.user_id == user.id))
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail=f"Not found tool {id}")
+        agents = await agents_using_tool(db, id, user.id)
+        return [{"id": agent.id, "name": agent.name} for agent in agents]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.patch("/{id}")
 async def update_tool(
     id: str,
@@ -154,8 +161,6 @@ async def update_tool(
     if not db_tool:
         raise HTTPException(status_code=404, detail=f"Not found tool {id}")
 
-    raise_for_tool(id, db, user)
-
     try:
         if request.name is not None:
             db_tool.name = request.name
@@ -169,10 +174,13 @@ async def update_tool(
             db_tool.header = request.header
         if request.method is not None:
             db_tool.method = request.method
+        db_tool.function_spec = None
 
         await db.commit()
         await db.refresh(db_tool)
-        return {"status": "ok"}
+        # Agents carry a copy of the tool; send them the new definition
+        results = await propagate_tool(db, db_tool, user.id)
+        return {"status": "ok", "agents": report(results)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -184,7 +192,7 @@ async def delete_tool(id: str, db: AsyncSession = Depends(get_db), user = Depend
     if not db_tool:
         raise HTTPException(status_code=404, detail=f"Not found tool {id}")
 
-    raise_for_tool(id, db, user)
+    await raise_for_tool(id, db, user)
 
     try:
         await db.delete(db_tool)
@@ -455,11 +463,13 @@ async def create_tool(
                 db_tool.header = request.header
             db_tool.method = request.method or "GET"
 
+        db_tool.function_spec = None
         if not is_in_db:
             db.add(db_tool)
         await db.commit()
         await db.refresh(db_tool)
-        return {"id": str(db_tool.id)}
+        results = await propagate_tool(db, db_tool, user.id) if is_in_db else []
+        return {"id": str(db_tool.id), "agents": report(results)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
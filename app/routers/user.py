@@ -2,12 +2,11 @@ from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from typing import List, Dict
-import httpx
 import uuid
 from pydantic import BaseModel
 
 from app.routers.auth import current_active_user
-from app.utils.httpx import get_httpx_headers, httpx_base_url
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
 from app.core.database import get_db
 from app.models import User
 from app.schemas.auth import UserRead, UserUpdate
@@ -29,7 +28,7 @@ def require_admin(current_user: User = Depends(current_active_user)):
 
 async def get_user_info():
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.get(f"{httpx_base_url}/user/info", headers=headers)
             if response.status_code != 200 and response.status_code != 201:
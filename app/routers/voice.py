@@ -1,13 +1,12 @@
 from fastapi import APIRouter, HTTPException
-import httpx
 
-from app.utils.httpx import get_httpx_headers, httpx_base_url
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
 
 router = APIRouter()
 
 @router.get("/custom")
 async def voice(lang_code: str = "en"):
-    async with httpx.AsyncClient() as client:
+    async with millis_client() as client:
         try:
             headers = get_httpx_headers()
             response = await client.get(f"{httpx_base_url}/voices/custom", params={"lang_code": lang_code}, headers=headers)
@@ -21,7 +20,7 @@ async def voice(lang_code: str = "en"):
 
 @router.get("/")
 async def get_voices(lang_code: str = "en"):
-    async with httpx.AsyncClient() as client:
+    async with millis_client() as client:
         try:
             headers = get_httpx_headers()
             response = await client.get(f"{httpx_base_url}/voices", params={"lang_code": lang_code}, headers=headers)
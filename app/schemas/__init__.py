@@ -1,3 +1,12 @@
 """Pydantic schemas for request/response models.""" 
 
-from .agent import AgentBase, AgentCreate, AgentUpdate, AgentDelete, AgentGet
+from .agent import (
+    AgentBase,
+    AgentCreate,
+    AgentUpdate,
+    AgentDelete,
+    AgentGet,
+    AgentToolRequest,
+    BulkAgentOperation,
+    BulkAgentRequest,
+)
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Literal
 
 class AgentBase(BaseModel):
     name: str
@@ -17,3 +18,26 @@ class AgentGet(AgentBase):
     id: str
     created_at: int
     pass
+
+class AgentToolRequest(BaseModel):
+    id: str
+    timeout: int | None = None
+    run_after_call: bool | None = None
+    messages: list[str] | None = None
+    response_mode: str | None = None
+    execute_after_message: bool | None = None
+    exclude_session_id: bool | None = None
+
+class BulkAgentOperation(BaseModel):
+    op: Literal["update", "attach_tools", "duplicate", "enable", "disable"]
+    agent_id: str
+    # update: a new name and/or top-level config fields merged over the stored config
+    name: str | None = None
+    config: dict | None = None
+    # attach_tools: tools added to the agent, or whose options are replaced if already attached
+    tools: list[AgentToolRequest] | None = None
+    # duplicate: number of copies
+    copies: int = Field(default=1, ge=1, le=20)
+
+class BulkAgentRequest(BaseModel):
+    operations: list[BulkAgentOperation] = Field(..., min_length=1)
@@ -50,3 +50,5 @@ class CalendarResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class CalendarUpdateResponse(CalendarResponse):
+    agents: list[dict] = Field(default_factory=list, description="Result of updating each agent that uses the calendar")
@@ -0,0 +1,236 @@
+"""
+Bulk agent operations, for rolling a change out across many agents in one request.
+
+Each operation updates, attaches tools to, duplicates, enables or disables one agent.
+Operations on the same agent run in the order given, and once one fails the rest for that
+agent are skipped; different agents proceed independently, with at most
+AGENT_BULK_CONCURRENCY Millis requests in flight. Agents and tools are loaded up front;
+an update is planned when it runs, from the agent as earlier operations left it. The local
+changes for all operations that succeeded are saved in one transaction at the end. The response carries a status per operation, so a
+partial failure tells the caller exactly which agents to retry.
+"""
+from dataclasses import asdict, dataclass, field
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from typing import Any
+import asyncio
+import json
+import logging
+
+from app.core.config import settings
+from app.core.metrics import AGENT_BULK_OPERATIONS, AGENT_CONFIG_UPDATES
+from app.models import Agent, Tools
+from app.schemas import BulkAgentOperation
+from app.services.agent_config import apply_update, plan_update
+from app.services.agent_links import set_agent_calendars, set_agent_tools, tool_ids_of
+from app.services.agent_propagation import build_agent_tools
+from app.services.millis_outbox import count_agent_slots
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
+
+logger = logging.getLogger(__name__)
+
+_slots: asyncio.Semaphore | None = None
+
+@dataclass
+class BulkItemResult:
+    index: int
+    op: str
+    agent_id: str
+    status: str  # ok, failed or skipped
+    status_code: int = 200
+    error: str | None = None
+    result: Any = None
+
+class BulkItemError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+@dataclass
+class _BulkRun:
+    db: AsyncSession
+    user: Any
+    agents: dict[str, Agent]
+    db_tools: dict
+    duplicate_slots: dict[int, bool]
+    results: list[BulkItemResult | None]
+    # The session is shared by every agent's operations, so queries through it take turns
+    db_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Local writes of successful operations, made in order after the Millis calls
+    new_agents: list[Agent] = field(default_factory=list)
+    tool_links: dict[str, list] = field(default_factory=dict)
+    calendar_links: dict[str, Any] = field(default_factory=dict)
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(max(settings.AGENT_BULK_CONCURRENCY, 1))
+    return _slots
+
+async def _millis(method: str, path: str, payload: dict | None = None):
+    async with _get_slots():
+        async with millis_client() as client:
+            headers = get_httpx_headers()
+            data = json.dumps(payload) if payload is not None else None
+            response = await client.request(method, f"{httpx_base_url}{path}", data=data, headers=headers)
+    if response.status_code != 200 and response.status_code != 201:
+        raise BulkItemError(response.status_code, response.text or "Unknown Error")
+    return response
+
+async def _update(run: _BulkRun, index: int, db_agent: Agent, operation: BulkAgentOperation):
+    # Planned from the agent as earlier operations left it, so their changes are kept
+    config = {**(db_agent.config or {}), **(operation.config or {})}
+    async with run.db_lock:
+        plan = await plan_update(run.db, db_agent, run.user.id, operation.name or db_agent.name, config)
+    if plan.send:
+        await _millis("PUT", f"/agents/{db_agent.id}", {"name": plan.name, "config": plan.patch})
+    AGENT_CONFIG_UPDATES.labels("patched" if plan.send else "unchanged").inc()
+    apply_update(db_agent, plan)
+    if "calendar_ids" in plan.config:
+        run.calendar_links[db_agent.id] = plan.config["calendar_ids"]
+    return "patched" if plan.send else "unchanged"
+
+async def _attach_tools(run: _BulkRun, index: int, db_agent: Agent, operation: BulkAgentOperation):
+    requested = {tool.id: tool.model_dump() for tool in operation.tools or []}
+    missing = []
+    for tool_id in requested:
+        parsed = tool_ids_of([{"id": tool_id}])
+        if not parsed or parsed[0] not in run.db_tools:
+            missing.append(tool_id)
+    if missing:
+        raise BulkItemError(404, f"Not found tool {', '.join(missing)}")
+    entries = [requested.pop(entry.get("id"), entry) for entry in db_agent.tools or []]
+    entries += list(requested.values())
+    agent_tools = build_agent_tools(entries, run.db_tools)
+    await _millis("PUT", f"/agents/{db_agent.id}", {"name": db_agent.name, "config": {"tools": agent_tools}})
+    db_agent.config = {**(db_agent.config or {}), "tools": agent_tools}
+    db_agent.tools = entries
+    run.tool_links[db_agent.id] = [entry["id"] for entry in entries]
+    return [entry["id"] for entry in entries]
+
+async def _duplicate(run: _BulkRun, index: int, db_agent: Agent, operation: BulkAgentOperation):
+    if not run.duplicate_slots[index]:
+        raise BulkItemError(403, "Not enough subscription slots for these copies. Please upgrade your subscription to add more agents.")
+    created = []
+    try:
+        for _ in range(operation.copies):
+            data = (await _millis("POST", f"/agents/{db_agent.id}/duplicate")).json()
+            run.new_agents.append(Agent(
+                id = data.get("id"),
+                name = data.get("name"),
+                config = data.get("config"),
+                created_at = data.get("created_at"),
+                user_id = run.user.id,
+            ))
+            created.append(data.get("id"))
+    except BulkItemError as e:
+        if created:
+            e.detail = f"{e.detail} (created {len(created)} of {operation.copies}: {', '.join(created)})"
+        raise
+    return created
+
+async def _set_status(run: _BulkRun, index: int, db_agent: Agent, operation: BulkAgentOperation):
+    if operation.op == "enable" and db_agent.stopped_due_to_credit:
+        raise BulkItemError(409, "Agent is stopped for lack of credit")
+    status = "active" if operation.op == "enable" else "disabled"
+    await _millis("POST", f"/agents/{db_agent.id}/status", {"status": status})
+    db_agent.status = status
+    return status
+
+HANDLERS = {
+    "update": _update,
+    "attach_tools": _attach_tools,
+    "duplicate": _duplicate,
+    "enable": _set_status,
+    "disable": _set_status,
+}
+
+async def _run_agent(run: _BulkRun, items: list[tuple[int, BulkAgentOperation]]):
+    """Run one agent's operations in order, skipping the rest after a failure."""
+    failed = False
+    for index, operation in items:
+        if run.results[index] is not None:
+            failed = True
+            continue
+        if failed:
+            run.results[index] = BulkItemResult(index, operation.op, operation.agent_id, "skipped", 424, "An earlier operation on this agent failed")
+            continue
+        try:
+            result = await HANDLERS[operation.op](run, index, run.agents[operation.agent_id], operation)
+            run.results[index] = BulkItemResult(index, operation.op, operation.agent_id, "ok", result=result)
+        except BulkItemError as e:
+            failed = True
+            run.results[index] = BulkItemResult(index, operation.op, operation.agent_id, "failed", e.status_code, e.detail)
+        except Exception as e:
+            failed = True
+            run.results[index] = BulkItemResult(index, operation.op, operation.agent_id, "failed", 500, str(e))
+
+async def run_bulk_operations(db: AsyncSession, user, operations: list[BulkAgentOperation]) -> dict:
+    if len(operations) > settings.AGENT_BULK_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.AGENT_BULK_MAX_OPERATIONS} operations per request")
+    updated = [operation.agent_id for operation in operations if operation.op == "update"]
+    if len(updated) != len(set(updated)):
+        raise HTTPException(status_code=400, detail="Combine the updates for an agent into one update operation")
+
+    agent_ids = {operation.agent_id for operation in operations}
+    result = await db.execute(select(Agent).where(Agent.id.in_(agent_ids), Agent.user_id == user.id))
+    agents = {agent.id: agent for agent in result.scalars().all()}
+
+    tool_ids = set()
+    for operation in operations:
+        if operation.op == "attach_tools" and operation.agent_id in agents:
+            tool_ids.update(tool_ids_of([tool.model_dump() for tool in operation.tools or []]))
+            tool_ids.update(tool_ids_of(agents[operation.agent_id].tools))
+    db_tools = {}
+    if tool_ids:
+        result = await db.execute(select(Tools).where(Tools.id.in_(tool_ids), Tools.user_id == user.id))
+        db_tools = {tool.id: tool for tool in result.scalars().all()}
+
+    results: list[BulkItemResult | None] = [None] * len(operations)
+    duplicate_slots = {}
+    # Duplicates take subscription slots in request order, as create_agent checks them
+    has_subscription = user.subscription_status in ["active", "trialing"]
+    free_slots = 0
+    if has_subscription and any(operation.op == "duplicate" for operation in operations):
+        free_slots = (user.subscription_quantity or 0) - await count_agent_slots(db, user.id)
+    for index, operation in enumerate(operations):
+        db_agent = agents.get(operation.agent_id)
+        if db_agent is None:
+            results[index] = BulkItemResult(index, operation.op, operation.agent_id, "failed", 404, f"Not found agent {operation.agent_id}")
+        elif operation.op == "duplicate":
+            duplicate_slots[index] = has_subscription and operation.copies <= free_slots
+            if duplicate_slots[index]:
+                free_slots -= operation.copies
+
+    run = _BulkRun(db, user, agents, db_tools, duplicate_slots, results)
+    by_agent: dict[str, list[tuple[int, BulkAgentOperation]]] = {}
+    for index, operation in enumerate(operations):
+        by_agent.setdefault(operation.agent_id, []).append((index, operation))
+    await asyncio.gather(*(_run_agent(run, items) for items in by_agent.values()))
+
+    saved = True
+    try:
+        for agent_id, ids in run.tool_links.items():
+            await set_agent_tools(db, agent_id, user.id, ids)
+        for agent_id, calendar_ids in run.calendar_links.items():
+            await set_agent_calendars(db, agent_id, user.id, calendar_ids)
+        db.add_all(run.new_agents)
+        await db.commit()
+    except Exception as e:
+        saved = False
+        await db.rollback()
+        logger.error(f"Failed to save bulk agent changes: {str(e)}")
+
+    counts = {"ok": 0, "failed": 0, "skipped": 0}
+    for item in results:
+        counts[item.status] += 1
+        AGENT_BULK_OPERATIONS.labels(item.op, item.status).inc()
+    return {
+        "results": [asdict(item) for item in results],
+        "succeeded": counts["ok"],
+        "failed": counts["failed"],
+        "skipped": counts["skipped"],
+        "saved": saved,
+    }
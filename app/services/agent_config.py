@@ -0,0 +1,138 @@
+"""
+Working out what an agent update actually changes before sending it to Millis.
+
+The frontend autosaves the whole agent config, and each save used to be sent to Millis in
+full with the calendar ``app_functions`` rebuilt, decrypting every calendar API key. Now
+top-level config keys are compared with the stored ``Agent.config`` and only the ones
+that differ are sent, as Millis merges config updates per key; a save that changes
+nothing makes no request. ``app_functions`` holds secrets, so rather than being stored it
+is compared by the fingerprint of what was last sent, ``Agent.app_functions_hash``. The
+calendar functions themselves are cached per agent, calendar set and calendar
+``updated_at``, so a calendar only has its key decrypted again after it changes.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import UUID
+import hashlib
+import json
+
+from app.core.config import settings
+from app.models import Agent, Calendar
+from app.utils.encryption import decrypt_value
+
+def fingerprint(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def config_patch(stored: dict | None, incoming: dict) -> dict:
+    """The top-level keys of ``incoming`` whose values differ from ``stored``."""
+    stored = stored or {}
+    return {key: value for key, value in incoming.items() if key not in stored or stored[key] != value}
+
+def calendar_function_config(calendar: Calendar) -> dict:
+    function_config = {
+        "name": calendar.name,
+        "credentials": {
+            "api_key": decrypt_value(calendar.api_key),
+            "event_type_id": calendar.event_type_id,
+        }
+    }
+    if calendar.contact_method:
+        function_config["credentials"]["contact_method"] = calendar.contact_method
+    return function_config
+
+class CalendarFunctionsCache:
+    """LRU of built calendar functions, keyed by agent and the ids and versions of its calendars."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, list[dict]] = OrderedDict()
+
+    def get(self, key: tuple) -> list[dict] | None:
+        functions = self._entries.get(key)
+        if functions is not None:
+            self._entries.move_to_end(key)
+        return functions
+
+    def put(self, key: tuple, functions: list[dict]):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = functions
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+calendar_functions_cache = CalendarFunctionsCache(settings.CALENDAR_FUNCTIONS_CACHE_SIZE)
+
+async def calendar_functions(db: AsyncSession, agent_id: str, user_id, calendar_ids: list) -> tuple[list[dict], list[str]]:
+    """The app_functions entries for an agent's calendars, and the calendars' function names."""
+    result = await db.execute(
+        select(Calendar).where(Calendar.id.in_(calendar_ids), Calendar.user_id == user_id).order_by(Calendar.id)
+    )
+    calendars = result.scalars().all()
+    names = [calendar.name for calendar in calendars]
+    # updated_at has one-second resolution, so the stored fields are part of the version too
+    key = (agent_id, tuple(
+        (str(calendar.id), calendar.updated_at, calendar.name, calendar.api_key, calendar.event_type_id, calendar.contact_method)
+        for calendar in calendars
+    ))
+    functions = calendar_functions_cache.get(key)
+    if functions is None:
+        functions = [calendar_function_config(calendar) for calendar in calendars]
+        calendar_functions_cache.put(key, functions)
+    return functions, names
+
+@dataclass
+class AgentUpdatePlan:
+    name: str
+    config: dict  # the incoming config, to merge into the stored one
+    patch: dict  # the top-level config keys to send to Millis
+    app_functions_hash: str
+    send: bool  # whether Millis needs a request at all
+
+async def plan_update(db: AsyncSession, db_agent: Agent, user_id, name: str, config: dict) -> AgentUpdatePlan:
+    """Work out what saving ``name`` and ``config`` on an agent has to send to Millis."""
+    outgoing = {k: v for k, v in config.items() if k not in ("calendar_ids", "app_functions")}
+    app_functions = config.get("app_functions", [])
+    calendar_ids = config.get("calendar_ids", [])
+
+    if calendar_ids:
+        calendar_ids_list = calendar_ids if isinstance(calendar_ids, list) else [calendar_ids]
+        calendar_uuid_list = []
+        for cal_id in calendar_ids_list:
+            try:
+                if isinstance(cal_id, str):
+                    calendar_uuid_list.append(UUID(cal_id))
+                else:
+                    calendar_uuid_list.append(cal_id)
+            except (ValueError, TypeError, AttributeError):
+                continue
+
+        if calendar_uuid_list:
+            functions, calendar_names = await calendar_functions(db, db_agent.id, user_id, calendar_uuid_list)
+            app_functions = [f for f in app_functions if f.get("name") not in calendar_names] + functions
+    else:
+        app_functions = []
+
+    # Send Millis only the top-level keys that changed since the last save
+    patch = config_patch(db_agent.config, outgoing)
+    app_functions_hash = fingerprint(app_functions)
+    if app_functions_hash != db_agent.app_functions_hash:
+        patch["app_functions"] = app_functions
+    return AgentUpdatePlan(
+        name=name,
+        config=config,
+        patch=patch,
+        app_functions_hash=app_functions_hash,
+        send=bool(patch) or name != db_agent.name,
+    )
+
+def apply_update(db_agent: Agent, plan: AgentUpdatePlan):
+    """Record a planned update on the agent once Millis has it; the caller saves."""
+    db_agent.name = plan.name
+    db_agent.config = {**(db_agent.config or {}), **plan.config}
+    db_agent.app_functions_hash = plan.app_functions_hash
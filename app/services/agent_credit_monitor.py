@@ -1,19 +1,23 @@
 """
 Service to monitor user credit and automatically stop/start agents based on credit availability.
 """
-import httpx
 import logging
 from sqlalchemy import select
 from app.core.database import get_db_background
+from app.core.metrics import track_job
 from app.models import User, Agent
-from app.utils.httpx import get_httpx_headers, httpx_base_url
+from app.services.agent_sync import local_agent
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
 
 logger = logging.getLogger(__name__)
 
 async def get_agent_status(agent_id: str) -> dict | None:
-    """Get the current status of an agent from the external API."""
+    """Get the current status of an agent, from the synced local copy when it is fresh enough."""
+    cached = await local_agent(agent_id)
+    if cached is not None:
+        return cached
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             response = await client.get(
                 f"{httpx_base_url}/agents/{agent_id}",
@@ -32,7 +36,7 @@ async def get_agent_status(agent_id: str) -> dict | None:
 async def set_agent_status(agent_id: str, status: str) -> bool:
     """Set the status of an agent (active/inactive) via the external API."""
     try:
-        async with httpx.AsyncClient() as client:
+        async with millis_client() as client:
             headers = get_httpx_headers()
             headers["Content-Type"] = "application/json"
             response = await client.post(
@@ -51,6 +55,7 @@ async def set_agent_status(agent_id: str, status: str) -> bool:
         return False
 
 
+@track_job("monitor_agent_credit")
 async def monitor_agent_credit():
     """
     Background task to monitor all users' credit and manage their agents.
@@ -102,6 +107,7 @@ async def monitor_agent_credit():
                                 success = await set_agent_status(agent.id, "disabled")
                                 if success:
                                     agent.stopped_due_to_credit = True
+                                    agent.status = "disabled"
                                     stopped_count += 1
                                     reason = "no subscription and no credit" if not has_active_subscription else "no credit (subscription active)"
                                     logger.info(f"Stopped agent {agent.id} for user {user.id} due to: {reason}")
@@ -110,6 +116,7 @@ async def monitor_agent_credit():
                                 success = await set_agent_status(agent.id, "active")
                                 if success:
                                     agent.stopped_due_to_credit = False
+                                    agent.status = "active"
                                     started_count += 1
                                     logger.info(f"Started agent {agent.id} for user {user.id} - subscription active and credit available")
 
@@ -0,0 +1,124 @@
+"""
+Which agents use which tools and calendars.
+
+An agent's tools live in ``Agent.tools`` and its calendars in ``config["calendar_ids"]``,
+both JSON, so finding the agents that use one tool or calendar meant loading and scanning
+every agent the user has. ``agent_tools`` and ``agent_calendars`` mirror those lists as
+indexed rows, kept in step by the agent endpoints that change them, so the question is
+one indexed join.
+"""
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import UUID
+import logging
+
+from app.core.database import get_db_background
+from app.models import Agent, AgentCalendar, AgentTool
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH = 500
+
+def _uuids(values) -> list[UUID]:
+    """Valid UUIDs among ``values`` in order, without duplicates; anything else is skipped."""
+    if values is None:
+        return []
+    if not isinstance(values, list):
+        values = [values]
+    uuids = []
+    for value in values:
+        try:
+            uuids.append(value if isinstance(value, UUID) else UUID(str(value)))
+        except ValueError:
+            continue
+    return list(dict.fromkeys(uuids))
+
+def tool_ids_of(tools) -> list[UUID]:
+    """Tool ids in an ``Agent.tools`` list."""
+    return _uuids([tool.get("id") for tool in tools or [] if isinstance(tool, dict)])
+
+async def set_agent_tools(db: AsyncSession, agent_id: str, user_id, tool_ids) -> None:
+    """Replace the tools recorded for an agent; the caller commits."""
+    await db.execute(delete(AgentTool).where(AgentTool.agent_id == agent_id))
+    db.add_all([AgentTool(agent_id=agent_id, tool_id=tool_id, user_id=user_id) for tool_id in _uuids(tool_ids)])
+
+async def set_agent_calendars(db: AsyncSession, agent_id: str, user_id, calendar_ids) -> None:
+    """Replace the calendars recorded for an agent; the caller commits."""
+    await db.execute(delete(AgentCalendar).where(AgentCalendar.agent_id == agent_id))
+    db.add_all([
+        AgentCalendar(agent_id=agent_id, calendar_id=calendar_id, user_id=user_id)
+        for calendar_id in _uuids(calendar_ids)
+    ])
+
+async def clear_agent_links(db: AsyncSession, agent_id: str) -> None:
+    """Forget a deleted agent's tools and calendars; the caller commits."""
+    await db.execute(delete(AgentTool).where(AgentTool.agent_id == agent_id))
+    await db.execute(delete(AgentCalendar).where(AgentCalendar.agent_id == agent_id))
+
+async def agents_using_tool(db: AsyncSession, tool_id, user_id) -> list[Agent]:
+    tool_id = _uuids(tool_id)
+    if not tool_id:
+        return []
+    result = await db.execute(
+        select(Agent)
+        .join(AgentTool, AgentTool.agent_id == Agent.id)
+        .where(AgentTool.tool_id == tool_id[0], Agent.user_id == user_id)
+        .order_by(Agent.name)
+    )
+    return list(result.scalars().all())
+
+async def agents_using_calendar(db: AsyncSession, calendar_id, user_id) -> list[Agent]:
+    calendar_id = _uuids(calendar_id)
+    if not calendar_id:
+        return []
+    result = await db.execute(
+        select(Agent)
+        .join(AgentCalendar, AgentCalendar.agent_id == Agent.id)
+        .where(AgentCalendar.calendar_id == calendar_id[0], Agent.user_id == user_id)
+        .order_by(Agent.name)
+    )
+    return list(result.scalars().all())
+
+async def backfill_agent_links():
+    """
+    Record the tools and calendars of agents saved before these tables existed.
+
+    Runs at startup. Existing rows are left alone, so it is safe to run every time.
+    """
+    tools_added = calendars_added = 0
+    try:
+        async with get_db_background() as db:
+            last_id = ""
+            while True:
+                rows = (await db.execute(
+                    select(Agent.id, Agent.user_id, Agent.tools, Agent.config["calendar_ids"])
+                    .where(Agent.id > last_id)
+                    .order_by(Agent.id)
+                    .limit(BACKFILL_BATCH)
+                )).all()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                tool_rows = [
+                    {"agent_id": agent_id, "tool_id": tool_id, "user_id": user_id}
+                    for agent_id, user_id, tools, _ in rows
+                    for tool_id in tool_ids_of(tools)
+                ]
+                calendar_rows = [
+                    {"agent_id": agent_id, "calendar_id": calendar_id, "user_id": user_id}
+                    for agent_id, user_id, _, calendar_ids in rows
+                    for calendar_id in _uuids(calendar_ids)
+                ]
+                if tool_rows:
+                    inserted = await db.execute(insert(AgentTool).values(tool_rows).on_conflict_do_nothing())
+                    tools_added += inserted.rowcount
+                if calendar_rows:
+                    inserted = await db.execute(insert(AgentCalendar).values(calendar_rows).on_conflict_do_nothing())
+                    calendars_added += inserted.rowcount
+                await db.commit()
+    except Exception as e:
+        logger.error(f"Failed to backfill agent tools and calendars: {str(e)}")
+        return
+    if tools_added or calendars_added:
+        logger.info(f"Backfilled {tools_added} agent tool and {calendars_added} agent calendar links")
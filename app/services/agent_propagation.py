@@ -0,0 +1,196 @@
+"""
+Function configs for tools and calendars, and pushing changes to the agents that use them.
+
+An agent carries a copy of each attached tool in ``config["tools"]`` and of each calendar
+in ``config["app_functions"]``, so editing a tool or calendar means rebuilding that block
+for every dependent agent and sending it to Millis. The updates run concurrently, at most
+AGENT_PROPAGATION_CONCURRENCY at a time across the process, over the shared Millis
+client; the local configs of the agents Millis accepted are then saved in one commit.
+Every caller gets a per-agent report, and one agent failing does not stop the others.
+"""
+from dataclasses import asdict, dataclass
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import json
+import logging
+import re
+
+from app.core.config import settings
+from app.core.metrics import AGENT_PROPAGATIONS
+from app.models import Agent, AgentCalendar, Calendar, Tools
+from app.services.agent_config import calendar_function_config, fingerprint
+from app.services.agent_links import agents_using_calendar, agents_using_tool, tool_ids_of
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
+
+logger = logging.getLogger(__name__)
+
+# Per-agent options of an attached tool, as saved in ``Agent.tools``
+TOOL_OPTIONS = ("timeout", "run_after_call", "messages", "response_mode", "execute_after_message", "exclude_session_id")
+
+_slots: asyncio.Semaphore | None = None
+
+@dataclass
+class PropagationResult:
+    agent_id: str
+    name: str | None
+    status: str  # updated or failed
+    error: str | None = None
+
+def to_function_name(text: str) -> str:
+    # Lowercase the text
+    text = text.lower()
+    # Replace spaces and invalid characters with underscores
+    text = re.sub(r'[^a-z0-9_]', '_', text)
+    # Ensure it doesn't start with a number
+    if re.match(r'^[0-9]', text):
+        text = "_" + text
+    # Collapse multiple underscores
+    text = re.sub(r'_+', '_', text).strip('_')
+    return text
+
+def tool_function_spec(db_tool: Tools) -> dict:
+    """The Millis function spec for a tool, compiled once and kept on the row until the tool changes."""
+    if db_tool.function_spec is None:
+        spec = {
+            "name": to_function_name(db_tool.name) if db_tool.tool_id == "custom" else to_function_name(db_tool.tool_id),
+            "description": db_tool.description,
+            "webhook": db_tool.webhook,
+            "method": db_tool.method,
+        }
+        if db_tool.params is not None:
+            spec["params"] = db_tool.params
+        if db_tool.header is not None:
+            spec["header"] = db_tool.header
+        db_tool.function_spec = spec
+    return db_tool.function_spec
+
+def agent_tool_config(db_tool: Tools, options: dict) -> dict:
+    """A tool as configured on one agent: its function spec plus the agent's options for it."""
+    config = dict(tool_function_spec(db_tool))
+    for option in TOOL_OPTIONS:
+        if options.get(option) is not None:
+            config[option] = options[option]
+    return config
+
+def build_agent_tools(entries: list[dict] | None, db_tools: dict) -> list[dict]:
+    """``config["tools"]`` for an ``Agent.tools`` list; entries whose tool is gone are dropped."""
+    agent_tools = []
+    for options in entries or []:
+        tool_id = tool_ids_of([options])
+        if tool_id and tool_id[0] in db_tools:
+            agent_tools.append(agent_tool_config(db_tools[tool_id[0]], options))
+    return agent_tools
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(max(settings.AGENT_PROPAGATION_CONCURRENCY, 1))
+    return _slots
+
+async def _push(agent: Agent, remote_config: dict) -> PropagationResult:
+    async with _get_slots():
+        try:
+            async with millis_client() as client:
+                headers = get_httpx_headers()
+                payload = {"name": agent.name, "config": remote_config}
+                response = await client.put(f"{httpx_base_url}/agents/{agent.id}", data=json.dumps(payload), headers=headers)
+            if response.status_code != 200 and response.status_code != 201:
+                return PropagationResult(agent.id, agent.name, "failed", f"{response.status_code}: {response.text or 'Unknown Error'}")
+        except Exception as e:
+            return PropagationResult(agent.id, agent.name, "failed", str(e))
+    return PropagationResult(agent.id, agent.name, "updated")
+
+async def _propagate(updates: list[tuple[Agent, dict, dict]], kind: str) -> list[PropagationResult]:
+    """
+    Send ``(agent, remote_config, local_config)`` updates to Millis concurrently and apply
+    the local config to each agent that was updated. The caller commits.
+    """
+    if not updates:
+        return []
+    results = await asyncio.gather(*(_push(agent, remote_config) for agent, remote_config, _ in updates))
+    for (agent, remote_config, local_config), result in zip(updates, results):
+        AGENT_PROPAGATIONS.labels(kind, result.status).inc()
+        if result.status == "updated":
+            agent.config = {**(agent.config or {}), **local_config}
+            if "app_functions" in remote_config:
+                agent.app_functions_hash = fingerprint(remote_config["app_functions"])
+        else:
+            logger.warning(f"Failed to update agent {agent.id} for a {kind} change: {result.error}")
+    return results
+
+async def _commit(db: AsyncSession, kind: str):
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Failed to save agent configs after a {kind} change: {str(e)}")
+
+async def propagate_tool(db: AsyncSession, db_tool: Tools, user_id) -> list[PropagationResult]:
+    """Rebuild ``config["tools"]`` of every agent using ``db_tool`` and push it to Millis."""
+    agents = await agents_using_tool(db, db_tool.id, user_id)
+    if not agents:
+        return []
+    tool_ids = {tool_id for agent in agents for tool_id in tool_ids_of(agent.tools)}
+    result = await db.execute(select(Tools).where(Tools.id.in_(tool_ids), Tools.user_id == user_id))
+    db_tools = {tool.id: tool for tool in result.scalars().all()}
+    db_tools[db_tool.id] = db_tool
+
+    updates = []
+    for agent in agents:
+        agent_tools = build_agent_tools(agent.tools, db_tools)
+        updates.append((agent, {"tools": agent_tools}, {"tools": agent_tools}))
+    results = await _propagate(updates, "tool")
+    await _commit(db, "tool")
+    return results
+
+def _without_functions(agent: Agent, *names: str | None) -> list[dict]:
+    app_functions = (agent.config or {}).get("app_functions", [])
+    return [f for f in app_functions if f.get("name") not in names]
+
+async def propagate_calendar(
+    db: AsyncSession,
+    calendar: Calendar,
+    user_id,
+    previous_name: str | None = None,
+) -> list[PropagationResult]:
+    """
+    Replace the calendar's function in ``config["app_functions"]`` of every agent using it.
+
+    ``previous_name`` is the function name before the change, whose entry is dropped too.
+    """
+    agents = await agents_using_calendar(db, calendar.id, user_id)
+    if not agents:
+        return []
+    function_config = calendar_function_config(calendar)
+    updates = []
+    for agent in agents:
+        app_functions = _without_functions(agent, calendar.name, previous_name) + [function_config]
+        updates.append((agent, {"app_functions": app_functions}, {"app_functions": app_functions}))
+    results = await _propagate(updates, "calendar")
+    await _commit(db, "calendar")
+    return results
+
+async def detach_calendar(db: AsyncSession, calendar: Calendar, user_id) -> list[PropagationResult]:
+    """
+    Remove a calendar that is being deleted from every agent using it, and forget the
+    links of the agents that were updated.
+    """
+    agents = await agents_using_calendar(db, calendar.id, user_id)
+    calendar_ids = {calendar.id, str(calendar.id)}
+    updates = []
+    for agent in agents:
+        app_functions = _without_functions(agent, calendar.name)
+        remaining = [cal_id for cal_id in (agent.config or {}).get("calendar_ids", []) if cal_id not in calendar_ids]
+        updates.append((agent, {"app_functions": app_functions}, {"app_functions": app_functions, "calendar_ids": remaining}))
+    results = await _propagate(updates, "calendar")
+    detached = [result.agent_id for result in results if result.status == "updated"]
+    if detached:
+        await db.execute(
+            delete(AgentCalendar).where(AgentCalendar.calendar_id == calendar.id, AgentCalendar.agent_id.in_(detached))
+        )
+    await _commit(db, "calendar")
+    return results
+
+def report(results: list[PropagationResult]) -> list[dict]:
+    return [asdict(result) for result in results]
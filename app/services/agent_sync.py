@@ -0,0 +1,198 @@
+"""
+Keeps the agents table in step with the agents on Millis.
+
+Every AGENT_SYNC_INTERVAL_MINUTES the Millis agent list is fetched, conditionally on the
+ETag of the last one so an unchanged list costs a 304, and reconciled into ``agents``:
+a row whose Millis record changed since the last sync (by fingerprint) takes Millis's
+name, status and config, keeping the keys that only exist locally (``calendar_ids``, and
+``app_functions``, whose sent form is tracked by ``app_functions_hash``). Rows record when
+they were last confirmed, so reads can be served locally with a freshness timestamp
+instead of asking Millis. What each run corrected, plus agents that exist on only one
+side, is kept as the drift report.
+"""
+from sqlalchemy import select, update
+import logging
+import time
+
+from app.core.config import settings
+from app.core.database import get_db_background
+from app.core.metrics import AGENT_SYNC_DRIFT, track_job
+from app.models import Agent
+from app.services.agent_config import fingerprint
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
+
+logger = logging.getLogger(__name__)
+
+# Config keys kept locally and not sent to Millis as stored
+LOCAL_CONFIG_KEYS = ("calendar_ids", "app_functions")
+
+def agent_drift(db_agent: Agent, remote: dict) -> list[str]:
+    """The fields where the local row differs from the Millis record."""
+    drift = []
+    if remote.get("name") != db_agent.name:
+        drift.append("name")
+    # A row synced for the first time has no status to compare yet
+    if db_agent.status is not None and remote.get("status") is not None and remote["status"] != db_agent.status:
+        drift.append("status")
+    remote_config = remote.get("config") or {}
+    local_config = db_agent.config or {}
+    for key in sorted(set(remote_config) | set(local_config)):
+        if key in LOCAL_CONFIG_KEYS:
+            continue
+        if key not in remote_config or key not in local_config or remote_config[key] != local_config[key]:
+            drift.append(f"config.{key}")
+    if fingerprint(remote_config.get("app_functions", [])) != db_agent.app_functions_hash:
+        drift.append("config.app_functions")
+    return drift
+
+def reconcile(db_agent: Agent, remote: dict, now: int):
+    """Take Millis's side of every drifted field."""
+    remote_config = remote.get("config") or {}
+    local_config = db_agent.config or {}
+    config = {k: v for k, v in remote_config.items() if k not in LOCAL_CONFIG_KEYS}
+    config.update({k: local_config[k] for k in LOCAL_CONFIG_KEYS if k in local_config})
+    db_agent.name = remote.get("name")
+    db_agent.config = config
+    if remote.get("status") is not None:
+        db_agent.status = remote["status"]
+    db_agent.app_functions_hash = fingerprint(remote_config.get("app_functions", []))
+    db_agent.remote_hash = fingerprint(remote)
+    db_agent.synced_at = now
+
+def agent_state(db_agent: Agent) -> dict:
+    """A local row in the shape Millis returns an agent, with when it was last confirmed."""
+    return {
+        "id": db_agent.id,
+        "name": db_agent.name,
+        "config": {k: v for k, v in (db_agent.config or {}).items() if k != "calendar_ids"},
+        "status": db_agent.status,
+        "created_at": db_agent.created_at,
+        "synced_at": db_agent.synced_at,
+    }
+
+class AgentSync:
+    def __init__(self):
+        self.etag: str | None = None
+        self.last_synced_at: int | None = None
+        self.report: dict | None = None
+
+    def is_fresh(self, synced_at: int | None) -> bool:
+        return synced_at is not None and time.time() - synced_at <= settings.AGENT_SYNC_MAX_AGE_SECONDS
+
+    async def _fetch(self) -> list[dict] | None:
+        """The Millis agent list, or None if it has not changed since the last fetch."""
+        headers = get_httpx_headers()
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        async with millis_client() as client:
+            response = await client.get(f"{httpx_base_url}/agents", headers=headers)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        self.etag = response.headers.get("ETag")
+        return response.json()
+
+    async def run(self) -> dict:
+        started = int(time.time())
+        remote_agents = await self._fetch()
+        async with get_db_background() as db:
+            if remote_agents is None:
+                # Nothing changed on Millis; every row is confirmed as of now
+                await db.execute(update(Agent).where(Agent.status.is_distinct_from("missing")).values(synced_at=started))
+                await db.commit()
+                self.last_synced_at = started
+                self.report = {**(self.report or {}), "synced_at": started, "not_modified": True}
+                return self.report
+
+            remote_by_id = {agent["id"]: agent for agent in remote_agents if agent.get("id")}
+            rows = (await db.execute(select(Agent.id, Agent.remote_hash, Agent.status))).all()
+            hashes = {agent_id: remote_hash for agent_id, remote_hash, _ in rows}
+            returned = {agent_id for agent_id, _, status in rows if status == "missing"}
+            changed = [
+                agent_id for agent_id, remote in remote_by_id.items()
+                if agent_id in hashes and (hashes[agent_id] != fingerprint(remote) or agent_id in returned)
+            ]
+            corrected = []
+            for offset in range(0, len(changed), 500):
+                result = await db.execute(select(Agent).where(Agent.id.in_(changed[offset:offset + 500])))
+                for db_agent in result.scalars().all():
+                    remote = remote_by_id[db_agent.id]
+                    drift = agent_drift(db_agent, remote)
+                    if drift:
+                        corrected.append({"id": db_agent.id, "user_id": str(db_agent.user_id), "fields": drift})
+                    reconcile(db_agent, remote, started)
+            changed_ids = set(changed)
+            unchanged = [agent_id for agent_id in remote_by_id if agent_id in hashes and agent_id not in changed_ids]
+            for offset in range(0, len(unchanged), 1000):
+                await db.execute(
+                    update(Agent).where(Agent.id.in_(unchanged[offset:offset + 1000])).values(synced_at=started)
+                )
+            missing_ids = [agent_id for agent_id in hashes if agent_id not in remote_by_id]
+            missing_remote = []
+            if missing_ids:
+                result = await db.execute(
+                    update(Agent).where(Agent.id.in_(missing_ids)).values(status="missing").returning(Agent.id, Agent.user_id)
+                )
+                missing_remote = [{"id": agent_id, "user_id": str(user_id)} for agent_id, user_id in result.all()]
+            await db.commit()
+
+        remote_only = [agent_id for agent_id in remote_by_id if agent_id not in hashes]
+        AGENT_SYNC_DRIFT.labels("corrected").inc(len(corrected))
+        AGENT_SYNC_DRIFT.labels("remote_only").inc(len(remote_only))
+        AGENT_SYNC_DRIFT.labels("missing_remote").inc(len(missing_remote))
+        if corrected or remote_only or missing_remote:
+            logger.warning(
+                f"Agent sync found drift: {len(corrected)} corrected, {len(remote_only)} only on Millis, "
+                f"{len(missing_remote)} missing from Millis"
+            )
+        self.last_synced_at = started
+        self.report = {
+            "synced_at": started,
+            "not_modified": False,
+            "remote_agents": len(remote_by_id),
+            "local_agents": len(hashes),
+            "corrected": corrected,
+            "remote_only": remote_only,
+            "missing_remote": missing_remote,
+        }
+        return self.report
+
+agent_sync = AgentSync()
+
+@track_job("sync_agents")
+async def sync_agents():
+    try:
+        await agent_sync.run()
+    except Exception as e:
+        logger.error(f"Agent sync failed: {str(e)}")
+
+async def local_agent(agent_id: str) -> dict | None:
+    """
+    The synced local copy of an agent, if it was confirmed within AGENT_SYNC_MAX_AGE_SECONDS.
+
+    An agent the last sync found missing on Millis has no copy to serve; asking Millis
+    answers for it.
+    """
+    async with get_db_background() as db:
+        db_agent = await db.get(Agent, agent_id)
+    if db_agent is None or db_agent.status == "missing" or not agent_sync.is_fresh(db_agent.synced_at):
+        return None
+    return agent_state(db_agent)
+
+async def local_agents() -> list[dict] | None:
+    """Every synced agent, if the last sync is within AGENT_SYNC_MAX_AGE_SECONDS."""
+    if not agent_sync.is_fresh(agent_sync.last_synced_at):
+        return None
+    async with get_db_background() as db:
+        result = await db.execute(select(Agent).where(Agent.synced_at.is_not(None), Agent.status.is_distinct_from("missing")))
+        return [agent_state(db_agent) for db_agent in result.scalars().all()]
+
+def user_drift(user_id) -> dict:
+    """The last drift report, narrowed to one user's agents."""
+    report = agent_sync.report or {}
+    user_id = str(user_id)
+    return {
+        "synced_at": report.get("synced_at"),
+        "corrected": [item for item in report.get("corrected", []) if item["user_id"] == user_id],
+        "missing_remote": [item for item in report.get("missing_remote", []) if item["user_id"] == user_id],
+    }
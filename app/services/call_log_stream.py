@@ -0,0 +1,79 @@
+"""
+Pushing newly ingested calls to open dashboards.
+
+Dashboards used to poll /call-logs and /dashboard to notice new calls, one poller per
+open tab. Now save_histories publishes a short summary of each call it commits to the
+broker, which fans it out to the subscriptions of the agent's owner, optionally narrowed
+to one agent. Each subscription has a queue of CALL_LOG_STREAM_QUEUE_SIZE summaries; a
+subscriber that falls that far behind is dropped rather than buffered without bound, and
+its stream ends with a ``dropped`` event so the client reloads the list and reconnects.
+
+The broker is in-process: a subscriber sees the calls ingested by the worker serving it.
+"""
+from dataclasses import dataclass, field
+import asyncio
+import logging
+import uuid
+
+from app.core.config import settings
+from app.core.metrics import CALL_LOG_STREAM_DROPPED, CALL_LOG_STREAM_SUBSCRIBERS
+
+logger = logging.getLogger(__name__)
+
+@dataclass(eq=False)
+class CallLogSubscription:
+    user_id: uuid.UUID
+    agent_id: str | None
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=max(settings.CALL_LOG_STREAM_QUEUE_SIZE, 1)))
+    dropped: bool = False
+
+class CallLogBroker:
+    def __init__(self):
+        self._subscriptions: dict[uuid.UUID, set[CallLogSubscription]] = {}
+
+    def subscribe(self, user_id: uuid.UUID, agent_id: str | None = None) -> CallLogSubscription:
+        subscription = CallLogSubscription(user_id, agent_id)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        CALL_LOG_STREAM_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: CallLogSubscription):
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if not subscriptions or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.user_id]
+        CALL_LOG_STREAM_SUBSCRIBERS.dec()
+
+    def publish(self, user_id: uuid.UUID, summary: dict):
+        for subscription in list(self._subscriptions.get(user_id, ())):
+            if subscription.agent_id and subscription.agent_id != summary.get("agent_id"):
+                continue
+            try:
+                subscription.queue.put_nowait(summary)
+            except asyncio.QueueFull:
+                # Too slow to keep up; the client catches up from /call-logs instead
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+                CALL_LOG_STREAM_DROPPED.inc()
+                logger.warning(f"Dropped a call log stream of user {user_id} that fell behind")
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+call_log_broker = CallLogBroker()
+
+def call_summary(call_log, cost: float) -> dict:
+    """What a dashboard needs to show a new call without fetching it."""
+    return {
+        "id": call_log.id,
+        "agent_id": call_log.agent_id,
+        "session_id": call_log.session_id,
+        "call_id": call_log.call_id,
+        "ts": call_log.ts,
+        "duration": call_log.duration,
+        "call_status": call_log.call_status,
+        "voip": call_log.voip,
+        "cost": cost,
+    }
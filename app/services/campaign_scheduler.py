@@ -7,6 +7,17 @@ from apscheduler.triggers.date import DateTrigger
 from app.core.database import get_db_background
 from app.models import CampaignSchedule, FrequencyType
 from app.routers.campaigns import start_campaign, stop_campaign
+from app.services.webhook_deliverer import add_webhook_events, webhook_deliverer
+
+def schedule_event(campaign: CampaignSchedule) -> dict:
+    """Payload of the campaign.status event sent when a schedule starts or stops a campaign."""
+    return {
+        "campaign_id": campaign.campaign_id,
+        "schedule_id": campaign.id,
+        "status": campaign.status,
+        "error": campaign.error,
+        "source": "schedule",
+    }
 
 class CampaignScheduler:
     def __init__(self):
@@ -142,7 +153,9 @@ class CampaignScheduler:
                             print(f"Failed to start campaign {campaign.campaign_id}")
                             campaign.status = "error"
                             campaign.error = str(e)
+                        await add_webhook_events(db, [(campaign.user_id, "campaign.status", schedule_event(campaign))])
                         await db.commit()
+                        webhook_deliverer.notify()
         except Exception as e:
             print(f"Error starting campaign {campaign_id}: {str(e)}")
 
@@ -159,7 +172,9 @@ class CampaignScheduler:
                     # await stop_campaign(campaign.campaign_id)
                     print(f"Campaign {campaign.campaign_id} stoped")
                     campaign.status = "scheduled"
+                    await add_webhook_events(db, [(campaign.user_id, "campaign.status", schedule_event(campaign))])
                     await db.commit()
+                    webhook_deliverer.notify()
         except Exception as e:
             print(f"Error stopping campaign {campaign_id}: {str(e)}")
 
@@ -0,0 +1,378 @@
+"""
+Multi-page website crawler for knowledge ingestion.
+
+A crawl job starts from a page or a sitemap.xml and follows same-site links breadth first
+up to a depth and page limit. Fetches share one connection pool, run with bounded
+concurrency and wait a politeness delay between requests to the same host, and
+robots.txt (including Crawl-delay) is respected. Pages are deduplicated by canonical URL
+and by a hash of their extracted text. The text of every page is written to a temporary
+file as it is crawled and uploaded as a single knowledge file through the create_file flow.
+
+Jobs are kept in memory by the process that runs them.
+"""
+import asyncio
+import contextvars
+import hashlib
+import logging
+import tempfile
+import time
+import uuid
+from typing import BinaryIO
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+import lxml.etree
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.database import get_db_background
+from app.services.knowledge_files import register_source, upload_knowledge_file
+from app.services.scraper import fetch_document, parse_page
+from app.utils.urls import canonicalize_url, site_of
+
+logger = logging.getLogger(__name__)
+
+CRAWLER_AGENT = "ElysiaKnowledgeCrawler"
+CRAWLER_HEADERS = {
+    'User-Agent': f'{CRAWLER_AGENT}/1.0 (+https://spark.elysiapartners.com)',
+    'Accept': 'text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.5',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+}
+SKIPPED_EXTENSIONS = (
+    ".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".css", ".js", ".json",
+    ".zip", ".gz", ".tar", ".mp3", ".mp4", ".avi", ".mov", ".woff", ".woff2", ".ttf", ".xml",
+)
+MAX_ROBOTS_DELAY = 10.0
+MAX_SITEMAP_URLS = 10_000
+FINISHED_JOB_TTL = 3600
+
+def parse_sitemap(content: bytes) -> tuple[bool, list[str]]:
+    """Return whether the document is a sitemap index, and the <loc> URLs it lists."""
+    parser = lxml.etree.XMLParser(resolve_entities=False, no_network=True, recover=True)
+    root = lxml.etree.fromstring(content, parser=parser)
+    if root is None:
+        return False, []
+    locations = [element.text.strip() for element in root.iter("{*}loc") if element.text]
+    return lxml.etree.QName(root).localname == "sitemapindex", locations[:MAX_SITEMAP_URLS]
+
+class CrawlJob:
+    def __init__(self, user_id, url: str, max_depth: int, max_pages: int, name: str, description: str, refresh_interval: int | None = None):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.url = url
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.name = name
+        self.description = description
+        self.refresh_interval = refresh_interval
+        self.status = "pending"
+        self.pages: list[dict] = []
+        self.pages_crawled = 0
+        self.duplicates = 0
+        self.blocked = 0
+        self.errors = 0
+        self.bytes_downloaded = 0
+        self.knowledge: dict | None = None
+        self.error: str | None = None
+        self.created_at = int(time.time())
+        self.finished_at: int | None = None
+
+    def record(self, url: str, status: str, **details):
+        self.pages.append({"url": url, "status": status, **details})
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "url": self.url,
+            "status": self.status,
+            "max_depth": self.max_depth,
+            "max_pages": self.max_pages,
+            "pages_crawled": self.pages_crawled,
+            "duplicates": self.duplicates,
+            "blocked": self.blocked,
+            "errors": self.errors,
+            "bytes_downloaded": self.bytes_downloaded,
+            "knowledge": self.knowledge,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "pages": self.pages,
+        }
+
+class WebsiteCrawler:
+    def __init__(self):
+        self.jobs: dict[str, CrawlJob] = {}
+        self._client: httpx.AsyncClient | None = None
+        self._job_slots: asyncio.Semaphore | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            connections = settings.CRAWL_CONCURRENCY * settings.CRAWL_MAX_JOBS
+            self._client = httpx.AsyncClient(
+                timeout=settings.CRAWL_TIMEOUT,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+            )
+        return self._client
+
+    def start(
+        self,
+        user_id,
+        url: str,
+        max_depth: int,
+        max_pages: int,
+        name: str,
+        description: str,
+        refresh_interval: int | None = None,
+    ) -> CrawlJob:
+        self._prune()
+        job = CrawlJob(user_id, url, max_depth, min(max_pages, settings.CRAWL_MAX_PAGES), name, description, refresh_interval)
+        self.jobs[job.id] = job
+        # A fresh context, so the job is not taken for part of the request that started it
+        # and its Millis calls use the background pool
+        task = asyncio.create_task(self._run(job), context=contextvars.Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str, user_id) -> CrawlJob | None:
+        job = self.jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_TTL
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    async def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _get_job_slots(self) -> asyncio.Semaphore:
+        if self._job_slots is None:
+            self._job_slots = asyncio.Semaphore(settings.CRAWL_MAX_JOBS)
+        return self._job_slots
+
+    async def crawl_to_file(self, job: CrawlJob, output: BinaryIO) -> str:
+        """
+        Crawl within the shared job limit, writing page text to ``output``.
+
+        Returns the sha256 of everything written, which is what gets uploaded.
+        """
+        async with self._get_job_slots():
+            job.status = "running"
+            await self._crawl(job, output)
+        if not job.pages_crawled:
+            raise ValueError("No text content found on the crawled pages")
+        output.seek(0)
+        digest = hashlib.sha256()
+        while chunk := output.read(1024 * 1024):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    async def _run(self, job: CrawlJob):
+        try:
+            with tempfile.TemporaryFile() as output:
+                content_hash = await self.crawl_to_file(job, output)
+                size = output.tell()
+                async with get_db_background() as db:
+                    knowledge_id, job.knowledge = await upload_knowledge_file(
+                        db,
+                        job.user_id,
+                        output,
+                        size,
+                        filename=f"{site_of(job.url) or 'website'}-crawl.txt",
+                        name=job.name,
+                        description=job.description,
+                    )
+                    # Recorded even without a schedule so a refresh can be enabled later
+                    register_source(
+                        db,
+                        job.user_id,
+                        knowledge_id,
+                        source_type="crawl",
+                        url=job.url,
+                        content_hash=content_hash,
+                        size=size,
+                        refresh_interval=job.refresh_interval,
+                        options={"max_depth": job.max_depth, "max_pages": job.max_pages},
+                    )
+                    await db.commit()
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except HTTPException as e:
+            job.status = "failed"
+            job.error = str(e.detail)
+        except Exception as e:
+            logger.error(f"Crawl {job.id} of {job.url} failed: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = int(time.time())
+
+    async def _crawl(self, job: CrawlJob, output: BinaryIO):
+        client = self._get_client()
+        start_url = canonicalize_url(job.url)
+        if start_url is None:
+            raise ValueError(f"Invalid URL format: {job.url}. URL must start with http:// or https://")
+        site = site_of(start_url)
+        hosts: dict[str, dict] = {}
+        seen_urls: set[str] = set()
+        seen_hashes: set[str] = set()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def enqueue(url: str, depth: int):
+            canonical = canonicalize_url(url)
+            # The frontier is capped so link-heavy sites cannot grow it without bound
+            if (
+                canonical is None
+                or canonical in seen_urls
+                or site_of(canonical) != site
+                or urlsplit(canonical).path.lower().endswith(SKIPPED_EXTENSIONS)
+                or len(seen_urls) >= job.max_pages * 20
+            ):
+                return
+            seen_urls.add(canonical)
+            queue.put_nowait((canonical, depth))
+
+        if urlsplit(start_url).path.lower().endswith(".xml"):
+            for url in await self._sitemap_urls(client, job, start_url):
+                enqueue(url, 0)
+        else:
+            enqueue(start_url, 0)
+
+        async def worker():
+            while True:
+                url, depth = await queue.get()
+                try:
+                    if job.pages_crawled < job.max_pages:
+                        await self._crawl_page(client, job, hosts, url, depth, seen_urls, seen_hashes, enqueue, output)
+                except Exception as e:
+                    job.errors += 1
+                    job.record(url, "error", error=str(e))
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(settings.CRAWL_CONCURRENCY)]
+        try:
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _crawl_page(self, client, job, hosts, url, depth, seen_urls, seen_hashes, enqueue, output):
+        host = await self._host_state(client, hosts, url)
+        if not host["robots"].can_fetch(CRAWLER_AGENT, url):
+            job.blocked += 1
+            job.record(url, "blocked_by_robots")
+            return
+        await self._wait_turn(host)
+
+        response, content = await fetch_document(client, url, settings.SCRAPE_MAX_BYTES, headers=CRAWLER_HEADERS)
+        job.bytes_downloaded += len(content)
+        content_type = response.headers.get('Content-Type', '').lower()
+        if 'text/html' not in content_type and 'text/plain' not in content_type:
+            job.record(url, "skipped", reason=f"content type {content_type or 'unknown'}")
+            return
+
+        final_url = canonicalize_url(str(response.url)) or url
+        if final_url != url:
+            if final_url in seen_urls:
+                job.duplicates += 1
+                job.record(url, "duplicate", of=final_url)
+                return
+            seen_urls.add(final_url)
+
+        text, hrefs, canonical = await parse_page(content, response.charset_encoding)
+        canonical = canonicalize_url(urljoin(final_url, canonical)) if canonical else None
+        if canonical and canonical != final_url:
+            if canonical in seen_urls:
+                job.duplicates += 1
+                job.record(url, "duplicate", of=canonical)
+                return
+            seen_urls.add(canonical)
+
+        if not text:
+            job.record(url, "empty")
+            return
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if digest in seen_hashes:
+            job.duplicates += 1
+            job.record(url, "duplicate")
+            return
+        if job.pages_crawled >= job.max_pages:
+            return
+        seen_hashes.add(digest)
+        job.pages_crawled += 1
+        output.write(f"# {final_url}\n\n{text}\n\n".encode("utf-8"))
+        job.record(url, "ok", depth=depth, chars=len(text))
+
+        if depth < job.max_depth:
+            for href in hrefs:
+                enqueue(urljoin(final_url, href), depth + 1)
+
+    async def _host_state(self, client: httpx.AsyncClient, hosts: dict, url: str) -> dict:
+        """Per-host politeness state, loading robots.txt on first use."""
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        state = hosts.get(origin)
+        if state is None:
+            state = hosts[origin] = {"lock": asyncio.Lock(), "next_at": 0.0, "robots": None, "delay": 0.0}
+        async with state["lock"]:
+            if state["robots"] is None:
+                robots = RobotFileParser(f"{origin}/robots.txt")
+                try:
+                    response = await client.get(f"{origin}/robots.txt", headers=CRAWLER_HEADERS)
+                    # RFC 9309: a missing robots.txt allows everything, an unreachable one
+                    # (a server error, or no answer) disallows everything
+                    if response.status_code in (401, 403) or response.status_code >= 500:
+                        robots.disallow_all = True
+                    elif response.status_code >= 400:
+                        robots.allow_all = True
+                    else:
+                        robots.parse(response.text.splitlines())
+                except httpx.HTTPError:
+                    robots.disallow_all = True
+                crawl_delay = robots.crawl_delay(CRAWLER_AGENT) if not (robots.allow_all or robots.disallow_all) else None
+                state["delay"] = max(settings.CRAWL_HOST_DELAY_MS / 1000, min(float(crawl_delay or 0), MAX_ROBOTS_DELAY))
+                state["robots"] = robots
+        return state
+
+    async def _wait_turn(self, state: dict):
+        async with state["lock"]:
+            delay = state["next_at"] - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            state["next_at"] = time.monotonic() + state["delay"]
+
+    async def _sitemap_urls(self, client: httpx.AsyncClient, job: CrawlJob, url: str, nested: int = 1) -> list[str]:
+        response, content = await fetch_document(client, url, settings.SCRAPE_MAX_BYTES, headers=CRAWLER_HEADERS)
+        job.bytes_downloaded += len(content)
+        is_index, locations = await asyncio.to_thread(parse_sitemap, content)
+        if not is_index:
+            return locations
+        urls = []
+        # Follow one level of sitemap index; deeper nesting is rare
+        for location in locations[:50] if nested > 0 else []:
+            try:
+                urls.extend(await self._sitemap_urls(client, job, location, nested - 1))
+            except (httpx.HTTPError, ValueError) as e:
+                job.errors += 1
+                job.record(location, "error", error=str(e))
+            if len(urls) >= MAX_SITEMAP_URLS:
+                break
+        return urls
+
+website_crawler = WebsiteCrawler()
@@ -0,0 +1,362 @@
+"""
+Queued email delivery over pooled SMTP connections.
+
+Emails are written to ``email_outbox`` and sent by a background sender, so a request that
+triggers an email only pays for one insert. The sender keeps up to EMAIL_SMTP_CONNECTIONS
+authenticated connections open and sends many messages over each, instead of a connect,
+STARTTLS and login per message. Sends are paced per recipient domain, since mailbox
+providers throttle senders per domain. Transient failures are retried with exponential
+backoff; permanent (5xx) rejections fail the message at once.
+
+Each message is sent by its own task, and the sender only claims as many messages as it
+has connections free, so a slow recipient holds one connection rather than a whole batch,
+and no claimed message waits behind others long enough to be reclaimed and sent twice. A
+message to a throttled domain is handed back until the domain has room again.
+Bodies, which carry reset tokens and verification codes, are cleared once a message is
+sent or failed.
+
+Rows are claimed with ``FOR UPDATE SKIP LOCKED``, so every API process can run a sender.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+import asyncio
+import logging
+import math
+import random
+import smtplib
+import time
+
+from sqlalchemy import delete, func, select, update
+
+from app.core.config import settings
+from app.core.database import get_db_background
+from app.core.metrics import (
+    EMAIL_DELIVERIES,
+    EMAIL_DELIVERY_LATENCY,
+    EMAIL_OUTBOX_PENDING,
+    SMTP_CONNECTIONS_OPENED,
+    track_job,
+    track_upstream,
+)
+from app.models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+CLAIM_BATCH = 50
+# A claimed message not resolved within this long is assumed lost with its sender
+STALE_CLAIM_SECONDS = 300
+
+def build_message(to_email: str, subject: str, html_content: str, text_content: str | None = None) -> MIMEMultipart:
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = f"{settings.SMTP_FROM_NAME} <{settings.SMTP_FROM_EMAIL}>"
+    msg['To'] = to_email
+
+    # Add text and HTML parts
+    if text_content:
+        msg.attach(MIMEText(text_content, 'plain'))
+    msg.attach(MIMEText(html_content, 'html'))
+    return msg
+
+def is_permanent(error: Exception) -> bool:
+    """Whether retrying cannot help: the server rejected the message or recipient outright."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        # Bad credentials are fixed in configuration, after which the message should go
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+class SMTPConnection:
+    """One authenticated SMTP session, reused across messages. Used from a worker thread."""
+
+    def __init__(self):
+        self.smtp: smtplib.SMTP | None = None
+        self.sent = 0
+        self.last_used = 0.0
+
+    def _connect(self):
+        self.close()
+        smtp = smtplib.SMTP(settings.SMTP_SERVER, settings.SMTP_PORT, timeout=30)
+        try:
+            if settings.SMTP_USE_TLS:
+                smtp.starttls()
+            if settings.SMTP_USERNAME:
+                smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+        except Exception:
+            smtp.close()
+            raise
+        SMTP_CONNECTIONS_OPENED.inc()
+        self.smtp = smtp
+        self.sent = 0
+
+    def _stale(self) -> bool:
+        return (
+            self.smtp is None
+            or self.sent >= settings.EMAIL_CONNECTION_MAX_MESSAGES
+            or time.monotonic() - self.last_used > settings.EMAIL_CONNECTION_IDLE_SECONDS
+        )
+
+    def send(self, msg: MIMEMultipart):
+        if self._stale():
+            self._connect()
+        try:
+            self.smtp.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped the session since its last use; one fresh attempt
+            self._connect()
+            self.smtp.send_message(msg)
+        self.sent += 1
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except Exception:
+            self.smtp.close()
+        self.smtp = None
+
+class DomainRateLimiter:
+    """Token bucket per recipient domain, EMAIL_RATE_PER_DOMAIN messages per second."""
+
+    def __init__(self):
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    def take(self, domain: str) -> float:
+        """Take a token for ``domain``; 0 if one was free, otherwise the seconds until one is."""
+        rate = settings.EMAIL_RATE_PER_DOMAIN
+        if rate <= 0:
+            return 0
+        burst = max(rate, 1)
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(domain, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        if tokens >= 1:
+            self._buckets[domain] = (tokens - 1, now)
+            return 0
+        self._buckets[domain] = (tokens, now)
+        return (1 - tokens) / rate
+
+class EmailSender:
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._connections: asyncio.Queue | None = None
+        self._all_connections: list[SMTPConnection] = []
+        self._deliveries: set[asyncio.Task] = set()
+        self._limiter = DomainRateLimiter()
+
+    def start(self):
+        if self._task is not None:
+            return
+        size = max(settings.EMAIL_SMTP_CONNECTIONS, 1)
+        self._wake = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="smtp")
+        self._connections = asyncio.Queue()
+        self._all_connections = [SMTPConnection() for _ in range(size)]
+        for connection in self._all_connections:
+            self._connections.put_nowait(connection)
+        self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Let messages in flight finish, so they are not sent again after a restart
+        if self._deliveries:
+            _, unfinished = await asyncio.wait(self._deliveries, timeout=30)
+            for task in unfinished:
+                task.cancel()
+        for connection in self._all_connections:
+            connection.close()
+        self._executor.shutdown(wait=False)
+
+    def notify(self):
+        """Wake the sender now rather than at its next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    def _capacity(self) -> int:
+        return min(len(self._all_connections), CLAIM_BATCH) - len(self._deliveries)
+
+    async def _run(self):
+        idle_since = time.monotonic()
+        while True:
+            try:
+                started = await self._drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Email sender failed: {str(e)}")
+                started = 0
+            if started or self._deliveries:
+                idle_since = time.monotonic()
+            if started and self._capacity() > 0:
+                continue
+            if not self._deliveries and time.monotonic() - idle_since > settings.EMAIL_CONNECTION_IDLE_SECONDS:
+                # Do not hold sessions open through quiet periods
+                await asyncio.get_running_loop().run_in_executor(self._executor, self._close_idle)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.EMAIL_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _close_idle(self):
+        for connection in self._all_connections:
+            if connection.smtp is not None and time.monotonic() - connection.last_used > settings.EMAIL_CONNECTION_IDLE_SECONDS:
+                connection.close()
+
+    async def _claim(self, capacity: int) -> list[EmailOutbox]:
+        """Claim up to ``capacity`` due messages, as many as can be sent right away."""
+        now = int(time.time())
+        async with get_db_background() as db:
+            await db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.status == "sending", EmailOutbox.locked_at < now - STALE_CLAIM_SECONDS)
+                .values(status="pending")
+            )
+            result = await db.execute(
+                select(EmailOutbox)
+                .where(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now)
+                .order_by(EmailOutbox.next_attempt_at)
+                .limit(capacity)
+                .with_for_update(skip_locked=True)
+            )
+            messages = result.scalars().all()
+            for message in messages:
+                message.status = "sending"
+                message.locked_at = now
+            pending = (await db.execute(
+                select(func.count()).select_from(EmailOutbox).where(EmailOutbox.status == "pending")
+            )).scalar_one()
+            await db.commit()
+        EMAIL_OUTBOX_PENDING.set(pending)
+        return messages
+
+    async def _drain_once(self) -> int:
+        capacity = self._capacity()
+        if capacity <= 0:
+            return 0
+        messages = await self._claim(capacity)
+        for message in messages:
+            task = asyncio.create_task(self._deliver(message))
+            self._deliveries.add(task)
+            task.add_done_callback(self._finished)
+        return len(messages)
+
+    def _finished(self, task: asyncio.Task):
+        self._deliveries.discard(task)
+        # A connection is free again
+        self.notify()
+
+    async def _deliver(self, message: EmailOutbox):
+        wait = self._limiter.take(message.to_email.rpartition("@")[2].lower())
+        if wait:
+            # Its domain is throttled; hand the row back rather than hold a slot waiting
+            await self._defer(message, math.ceil(wait))
+            return
+        msg = build_message(message.to_email, message.subject, message.html_content, message.text_content)
+        connection = await self._connections.get()
+        error = None
+        try:
+            with track_upstream("smtp", "send_message"):
+                await asyncio.get_running_loop().run_in_executor(self._executor, connection.send, msg)
+        except Exception as e:
+            error = e
+            if not isinstance(e, smtplib.SMTPResponseException | smtplib.SMTPRecipientsRefused):
+                # The session is in an unknown state; start the next message on a fresh one
+                await asyncio.get_running_loop().run_in_executor(self._executor, connection.close)
+        finally:
+            self._connections.put_nowait(connection)
+        await self._record(message, error)
+
+    async def _defer(self, message: EmailOutbox, delay: int):
+        try:
+            async with get_db_background() as db:
+                await db.execute(
+                    update(EmailOutbox)
+                    .where(EmailOutbox.id == message.id)
+                    .values(status="pending", locked_at=None, next_attempt_at=int(time.time()) + delay)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to defer email {message.id}: {str(e)}")
+
+    async def _record(self, message: EmailOutbox, error: Exception | None):
+        now = int(time.time())
+        values = {"attempts": message.attempts + 1, "locked_at": None}
+        # Bodies can hold reset tokens and verification codes; keep them only while needed
+        finished = {"html_content": "", "text_content": None}
+        if error is None:
+            values.update(status="sent", sent_at=now, last_error=None, **finished)
+            EMAIL_DELIVERIES.labels("sent").inc()
+            EMAIL_DELIVERY_LATENCY.observe(max(now - message.created_at, 0))
+            logger.info(f"Email sent successfully to {message.to_email}")
+        elif is_permanent(error) or values["attempts"] >= settings.EMAIL_MAX_ATTEMPTS:
+            values.update(status="failed", last_error=str(error), **finished)
+            EMAIL_DELIVERIES.labels("failed").inc()
+            logger.error(f"Failed to send email to {message.to_email}: {str(error)}")
+        else:
+            delay = min(settings.EMAIL_RETRY_BASE_SECONDS * 2 ** message.attempts, settings.EMAIL_RETRY_MAX_SECONDS)
+            values.update(status="pending", last_error=str(error), next_attempt_at=now + int(delay * random.uniform(0.8, 1.2)))
+            EMAIL_DELIVERIES.labels("retry").inc()
+            logger.warning(f"Sending email to {message.to_email} failed, retrying in {delay}s: {str(error)}")
+        try:
+            async with get_db_background() as db:
+                await db.execute(update(EmailOutbox).where(EmailOutbox.id == message.id).values(**values))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to record delivery of email {message.id}: {str(e)}")
+
+email_sender = EmailSender()
+
+async def enqueue_email(
+    to_email: str,
+    subject: str,
+    html_content: str,
+    text_content: str | None = None,
+    kind: str | None = None,
+) -> bool:
+    """Queue an email for the sender; returns whether it was queued."""
+    now = int(time.time())
+    try:
+        async with get_db_background() as db:
+            db.add(EmailOutbox(
+                kind=kind,
+                to_email=to_email,
+                subject=subject,
+                html_content=html_content,
+                text_content=text_content,
+                status="pending",
+                attempts=0,
+                next_attempt_at=now,
+                created_at=now,
+            ))
+            await db.commit()
+    except Exception as e:
+        logger.error(f"Failed to queue email to {to_email}: {str(e)}")
+        return False
+    email_sender.notify()
+    return True
+
+@track_job("purge_email_outbox")
+async def purge_email_outbox():
+    """Drop sent and failed emails older than EMAIL_OUTBOX_RETENTION_DAYS."""
+    cutoff = int(time.time()) - settings.EMAIL_OUTBOX_RETENTION_DAYS * 86400
+    async with get_db_background() as db:
+        await db.execute(
+            delete(EmailOutbox).where(EmailOutbox.status.in_(["sent", "failed"]), EmailOutbox.created_at < cutoff)
+        )
+        await db.commit()
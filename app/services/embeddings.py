@@ -0,0 +1,80 @@
+"""
+Text embeddings for the local knowledge index.
+
+The default ``hashing`` backend needs nothing beyond NumPy: word unigrams and bigrams are
+hashed into a fixed number of signed buckets and L2-normalised. It matches on shared
+vocabulary rather than meaning, but is deterministic, fast and runs anywhere. Setting
+EMBEDDING_BACKEND=sentence-transformers uses a local CPU model instead, if the optional
+``sentence-transformers`` package is installed.
+"""
+import re
+import zlib
+
+import numpy as np
+
+from app.core.config import settings
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+class HashingEmbedder:
+    name = "hashing"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        tokens = _TOKEN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        if not features:
+            return np.zeros(self.dim, dtype=np.float32)
+        # crc32 rather than hash(), which is salted per process
+        hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+        counts = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim)
+        # Dampen repeated terms so long chunks are not dominated by their most common words
+        vector = (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([self._embed_one(text) for text in texts])
+
+class SentenceTransformerEmbedder:
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDING_BACKEND=sentence-transformers requires the sentence-transformers package"
+            ) from e
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        vectors = self.model.encode(texts, batch_size=32, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32, copy=False)
+
+_embedder = None
+
+def get_embedder():
+    """The configured embedder; built on first use, since a model can take seconds to load."""
+    global _embedder
+    if _embedder is None:
+        if settings.EMBEDDING_BACKEND == "sentence-transformers":
+            _embedder = SentenceTransformerEmbedder(settings.EMBEDDING_MODEL)
+        elif settings.EMBEDDING_BACKEND == "hashing":
+            _embedder = HashingEmbedder(settings.EMBEDDING_DIM)
+        else:
+            raise RuntimeError(f"Unknown EMBEDDING_BACKEND: {settings.EMBEDDING_BACKEND}")
+    return _embedder
+
+def embedder_id(embedder) -> str:
+    """Identifies vectors that are comparable with each other."""
+    return f"{embedder.name}:{getattr(embedder, 'model_name', '')}:{embedder.dim}"
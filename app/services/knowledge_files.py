@@ -0,0 +1,179 @@
+"""
+Knowledge file operations shared by the knowledge endpoints and server-side ingestion.
+
+Uploads mirror what the frontend does for a manual upload: ask Millis for a presigned
+URL, PUT the file there, register it with create_file and record it in ``knowledges``.
+Agent assignments sent to set_agent_files are mirrored in ``agent_knowledge_files``, and
+their messages in ``agents.knowledge_messages``, so a replaced file can be swapped on every
+recorded agent without losing them. Text uploaded from here is also
+added to the local knowledge index for preview and search.
+"""
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import BinaryIO
+import httpx
+import json
+import logging
+
+from app.models import Agent, AgentKnowledgeFile, Knowledge, KnowledgeSource
+from app.services.knowledge_index import index_text, remove_from_index
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+def knowledge_id_from_object_key(object_key: str) -> str:
+    return object_key.split("/")[1].split("_")[0]
+
+async def create_knowledge_file(db: AsyncSession, user_id, payload: dict) -> dict:
+    """Register an uploaded object with Millis and record it for the user."""
+    async with millis_client() as client:
+        headers = get_httpx_headers()
+        response = await client.post(f"{httpx_base_url}/knowledge/create_file", data=json.dumps(payload), headers=headers)
+        if response.status_code != 200 and response.status_code != 201:
+            raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
+    db_knowledge = Knowledge(
+        id = knowledge_id_from_object_key(payload["object_key"]),
+        name = payload["name"],
+        description = payload["description"],
+        file_type = payload["file_type"],
+        size = payload["size"],
+        created_at = int(datetime.now(timezone.utc).timestamp()),
+        user_id = user_id
+    )
+    db.add(db_knowledge)
+    try:
+        await db.commit()
+        await db.refresh(db_knowledge)
+    except Exception as e:
+        print(f"Error while saving knowledge: {str(e)}")
+    return response.json()
+
+async def _read_chunks(file: BinaryIO):
+    file.seek(0)
+    while chunk := file.read(UPLOAD_CHUNK_SIZE):
+        yield chunk
+
+async def upload_knowledge_file(
+    db: AsyncSession,
+    user_id,
+    file: BinaryIO,
+    size: int,
+    filename: str,
+    name: str,
+    description: str,
+    file_type: str = "text/plain",
+) -> tuple[str, dict]:
+    """
+    Upload a file-like object as a new knowledge file, streaming it to the presigned URL.
+
+    Returns the new knowledge id and the Millis create_file response.
+    """
+    async with millis_client() as client:
+        headers = get_httpx_headers()
+        response = await client.post(f"{httpx_base_url}/knowledge/generate_presigned_url", json={"filename": filename}, headers=headers)
+        if response.status_code != 200 and response.status_code != 201:
+            raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
+        presigned = response.json()
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        response = await client.put(
+            presigned["url"],
+            content=_read_chunks(file),
+            headers={"Content-Length": str(size)},
+        )
+        if response.status_code >= 300:
+            raise HTTPException(status_code=502, detail=f"Upload failed with status {response.status_code}: {response.text}")
+
+    response = await create_knowledge_file(db, user_id, {
+        "object_key": presigned["object_key"],
+        "description": description,
+        "name": name,
+        "file_type": file_type,
+        "size": size,
+    })
+    knowledge_id = knowledge_id_from_object_key(presigned["object_key"])
+    if file_type.startswith("text/"):
+        # The index is a convenience; a failure here must not fail the upload
+        try:
+            file.seek(0)
+            await index_text(user_id, knowledge_id, file.read().decode("utf-8", errors="replace"))
+        except Exception as e:
+            logger.error(f"Failed to index knowledge {knowledge_id}: {str(e)}")
+    return knowledge_id, response
+
+async def delete_knowledge_file(db: AsyncSession, knowledge: Knowledge) -> str:
+    """Delete a knowledge file from Millis and forget it locally."""
+    async with millis_client() as client:
+        headers = get_httpx_headers()
+        response = await client.post(f"{httpx_base_url}/knowledge/delete_file", json={"id": knowledge.id}, headers=headers)
+        if response.status_code != 200 and response.status_code != 201:
+            raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
+    try:
+        await db.execute(delete(AgentKnowledgeFile).where(AgentKnowledgeFile.knowledge_id == knowledge.id))
+        await db.execute(delete(KnowledgeSource).where(KnowledgeSource.knowledge_id == knowledge.id))
+        await db.delete(knowledge)
+        await db.commit()
+    except Exception as e:
+        print(f"Failed to delete knowledge: {str(e)}")
+    if knowledge.user_id:
+        try:
+            await remove_from_index(knowledge.user_id, knowledge.id)
+        except Exception as e:
+            logger.error(f"Failed to remove knowledge {knowledge.id} from the index: {str(e)}")
+    return response.text
+
+async def set_agent_files(db: AsyncSession, agent_id: str, files: list[str], messages: list[str] = None) -> str:
+    """Assign knowledge files to an agent in Millis and mirror the assignment locally."""
+    async with millis_client() as client:
+        headers = get_httpx_headers()
+        payload = {"agent_id": agent_id, "files": files, "messages": messages}
+        response = await client.post(f"{httpx_base_url}/knowledge/set_agent_files", json=payload, headers=headers)
+        if response.status_code != 200 and response.status_code != 201:
+            raise HTTPException(status_code=response.status_code, detail=response.text or "Unknown Error")
+    try:
+        await db.execute(delete(AgentKnowledgeFile).where(AgentKnowledgeFile.agent_id == agent_id))
+        db.add_all([
+            AgentKnowledgeFile(agent_id=agent_id, knowledge_id=file_id, position=position)
+            for position, file_id in enumerate(dict.fromkeys(files))
+        ])
+        await db.execute(update(Agent).where(Agent.id == agent_id).values(knowledge_messages=messages or []))
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        print(f"Error while saving agent files: {str(e)}")
+    return response.text
+
+def register_source(
+    db: AsyncSession,
+    user_id,
+    knowledge_id: str,
+    source_type: str,
+    url: str,
+    content_hash: str,
+    size: int,
+    refresh_interval: int | None = None,
+    options: dict | None = None,
+) -> KnowledgeSource:
+    """Record where a knowledge file came from; the caller commits."""
+    now = int(datetime.now(timezone.utc).timestamp())
+    source = KnowledgeSource(
+        knowledge_id = knowledge_id,
+        source_type = source_type,
+        url = url,
+        options = options or {},
+        content_hash = content_hash,
+        size = size,
+        refresh_interval = refresh_interval,
+        next_refresh_at = now + refresh_interval if refresh_interval else None,
+        last_checked_at = now,
+        last_changed_at = now,
+        bytes_saved = 0,
+        created_at = now,
+        user_id = user_id
+    )
+    db.add(source)
+    return source
@@ -0,0 +1,290 @@
+"""
+Local chunk and vector index of knowledge file text, one per tenant.
+
+Millis keeps the knowledge that agents answer from, but offers no way to look inside it.
+Text that passes through this backend (scrapes, crawls, refreshes and files sent to the
+index endpoint) is chunked, embedded and appended to an index under KNOWLEDGE_INDEX_DIR:
+
+    <user_id>/manifest.json    embedder, row count and the row range of each file
+    <user_id>/vectors.<gen>.f32  float32 rows, L2-normalised, memory-mapped for search
+    <user_id>/offsets.<gen>.i64  (offset, length) of each chunk in texts.<gen>.bin
+    <user_id>/texts.<gen>.bin    chunk text, UTF-8
+
+A file's chunks are stored contiguously, so removing one rewrites the data as a new
+generation and then swaps the manifest, leaving a consistent index if interrupted. Search
+is a single matrix-vector product over the mapped rows plus a partial sort for the top k.
+Writes assume one writer per tenant, which holds as long as one process runs ingestion.
+"""
+from bisect import bisect_right
+from collections import OrderedDict
+import asyncio
+import json
+import logging
+import os
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embeddings import embedder_id, get_embedder
+from app.utils.chunking import chunk_text
+
+logger = logging.getLogger(__name__)
+
+MAX_OPEN_INDEXES = 32
+
+class IndexMismatch(ValueError):
+    """The index was built with a different embedder than the one configured."""
+
+class TenantIndex:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._manifest_mtime = None
+        self._load_manifest()
+
+    def _path(self, name: str, generation: int | None = None) -> str:
+        if generation is None:
+            return os.path.join(self.directory, name)
+        stem, suffix = name.split(".")
+        return os.path.join(self.directory, f"{stem}.{generation}.{suffix}")
+
+    def _load_manifest(self):
+        path = self._path("manifest.json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with open(path, "r", encoding="utf-8") as file:
+                self.manifest = json.load(file)
+        except FileNotFoundError:
+            mtime = None
+            self.manifest = {"embedder": None, "dim": 0, "generation": 0, "count": 0, "text_bytes": 0, "files": {}}
+        self._manifest_mtime = mtime
+        self._vectors = None
+        self._offsets = None
+        ranges = sorted((start, end, knowledge_id) for knowledge_id, (start, end) in self.manifest["files"].items())
+        self._starts = [start for start, _, _ in ranges]
+        self._ranges = ranges
+
+    def refresh(self):
+        """Pick up changes written by another process."""
+        try:
+            mtime = os.stat(self._path("manifest.json")).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._manifest_mtime:
+            self._load_manifest()
+
+    def _write_manifest(self, manifest: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path("manifest.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(manifest, file)
+        os.replace(f"{path}.tmp", path)
+        self._load_manifest()
+
+    @property
+    def count(self) -> int:
+        return self.manifest["count"]
+
+    def vectors(self) -> np.ndarray:
+        if self._vectors is None:
+            if not self.count:
+                return np.zeros((0, self.manifest["dim"]), dtype=np.float32)
+            self._vectors = np.memmap(
+                self._path("vectors.f32", self.manifest["generation"]),
+                dtype=np.float32,
+                mode="r",
+                shape=(self.count, self.manifest["dim"]),
+            )
+        return self._vectors
+
+    def offsets(self) -> np.ndarray:
+        if self._offsets is None:
+            if not self.count:
+                return np.zeros((0, 2), dtype=np.int64)
+            self._offsets = np.memmap(
+                self._path("offsets.i64", self.manifest["generation"]),
+                dtype=np.int64,
+                mode="r",
+                shape=(self.count, 2),
+            )
+        return self._offsets
+
+    def texts(self, rows) -> list[str]:
+        offsets = self.offsets()
+        with open(self._path("texts.bin", self.manifest["generation"]), "rb") as file:
+            result = []
+            for row in rows:
+                offset, length = offsets[row]
+                file.seek(int(offset))
+                result.append(file.read(int(length)).decode("utf-8"))
+        return result
+
+    def file_of(self, row: int) -> str:
+        position = bisect_right(self._starts, row) - 1
+        return self._ranges[position][2]
+
+    def add(self, knowledge_id: str, chunks: list[str], vectors: np.ndarray, embedder: str):
+        if knowledge_id in self.manifest["files"]:
+            self.remove(knowledge_id)
+        if self.count and self.manifest["embedder"] != embedder:
+            raise IndexMismatch(
+                f"Index at {self.directory} was built with {self.manifest['embedder']}, not {embedder}; rebuild it"
+            )
+        if not chunks:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = dict(self.manifest, files=dict(self.manifest["files"]))
+        generation = manifest["generation"]
+        dim = vectors.shape[1]
+
+        encoded = [chunk.encode("utf-8") for chunk in chunks]
+        lengths = np.array([len(chunk) for chunk in encoded], dtype=np.int64)
+        starts = manifest["text_bytes"] + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        # Truncate first: a write interrupted after the data but before the manifest
+        # would otherwise leave rows the manifest does not know about
+        appends = [
+            ("vectors.f32", manifest["count"] * dim * 4, vectors.astype(np.float32, copy=False).tobytes()),
+            ("offsets.i64", manifest["count"] * 16, np.column_stack((starts, lengths)).tobytes()),
+            ("texts.bin", manifest["text_bytes"], b"".join(encoded)),
+        ]
+        for name, size, data in appends:
+            with open(self._path(name, generation), "ab") as file:
+                file.truncate(size)
+                file.write(data)
+
+        start = manifest["count"]
+        manifest.update(
+            embedder=embedder,
+            dim=dim,
+            count=start + len(chunks),
+            text_bytes=manifest["text_bytes"] + int(lengths.sum()),
+        )
+        manifest["files"][knowledge_id] = [start, start + len(chunks)]
+        self._write_manifest(manifest)
+
+    def remove(self, knowledge_id: str) -> bool:
+        if knowledge_id not in self.manifest["files"]:
+            return False
+        manifest = dict(self.manifest, files={})
+        old_generation = manifest["generation"]
+        generation = old_generation + 1
+        kept = [(start, end, kid) for start, end, kid in self._ranges if kid != knowledge_id]
+
+        vectors = self.vectors()
+        offsets = self.offsets()
+        row = 0
+        text_bytes = 0
+        with open(self._path("vectors.f32", generation), "wb") as vector_file, \
+             open(self._path("offsets.i64", generation), "wb") as offset_file, \
+             open(self._path("texts.bin", generation), "wb") as text_file, \
+             open(self._path("texts.bin", old_generation), "rb") as old_texts:
+            for start, end, kid in kept:
+                vector_file.write(np.ascontiguousarray(vectors[start:end]).tobytes())
+                text_start, _ = offsets[start]
+                text_end = offsets[end - 1][0] + offsets[end - 1][1]
+                old_texts.seek(int(text_start))
+                text_file.write(old_texts.read(int(text_end - text_start)))
+                shifted = np.array(offsets[start:end])
+                shifted[:, 0] += text_bytes - text_start
+                offset_file.write(shifted.tobytes())
+                manifest["files"][kid] = [row, row + end - start]
+                row += end - start
+                text_bytes += int(text_end - text_start)
+
+        manifest.update(generation=generation, count=row, text_bytes=text_bytes)
+        self._vectors = None
+        self._offsets = None
+        self._write_manifest(manifest)
+        for name in ("vectors.f32", "offsets.i64", "texts.bin"):
+            try:
+                os.remove(self._path(name, old_generation))
+            except FileNotFoundError:
+                pass
+        return True
+
+    def search(self, query: np.ndarray, k: int, knowledge_ids: list[str] | None = None) -> list[tuple[int, float]]:
+        if not self.count:
+            return []
+        scores = self.vectors() @ query
+        if knowledge_ids is not None:
+            allowed = np.zeros(self.count, dtype=bool)
+            for knowledge_id in knowledge_ids:
+                if knowledge_id in self.manifest["files"]:
+                    start, end = self.manifest["files"][knowledge_id]
+                    allowed[start:end] = True
+            scores = np.where(allowed, scores, -np.inf)
+        k = min(k, self.count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top if np.isfinite(scores[row])]
+
+_indexes: OrderedDict[str, TenantIndex] = OrderedDict()
+_locks: dict[str, asyncio.Lock] = {}
+
+def _get_index(user_id) -> TenantIndex:
+    key = str(user_id)
+    index = _indexes.get(key)
+    if index is None:
+        index = TenantIndex(os.path.join(settings.KNOWLEDGE_INDEX_DIR, key))
+        _indexes[key] = index
+        if len(_indexes) > MAX_OPEN_INDEXES:
+            _indexes.popitem(last=False)
+    else:
+        _indexes.move_to_end(key)
+        index.refresh()
+    return index
+
+def _lock(user_id) -> asyncio.Lock:
+    return _locks.setdefault(str(user_id), asyncio.Lock())
+
+def _index_text(user_id, knowledge_id: str, text: str) -> int:
+    chunks = chunk_text(text, settings.KNOWLEDGE_CHUNK_CHARS, settings.KNOWLEDGE_CHUNK_OVERLAP)
+    embedder = get_embedder()
+    vectors = embedder.embed(chunks)
+    _get_index(user_id).add(knowledge_id, chunks, vectors, embedder_id(embedder))
+    return len(chunks)
+
+async def index_text(user_id, knowledge_id: str, text: str) -> int:
+    """Chunk, embed and index a knowledge file's text, replacing any earlier version; returns the chunk count."""
+    async with _lock(user_id):
+        return await asyncio.to_thread(_index_text, user_id, knowledge_id, text)
+
+async def remove_from_index(user_id, knowledge_id: str) -> bool:
+    async with _lock(user_id):
+        return await asyncio.to_thread(lambda: _get_index(user_id).remove(knowledge_id))
+
+def _search(user_id, query: str, k: int, knowledge_ids: list[str] | None) -> list[dict]:
+    embedder = get_embedder()
+    index = _get_index(user_id)
+    if index.count and index.manifest["embedder"] != embedder_id(embedder):
+        raise IndexMismatch(f"Knowledge index was built with {index.manifest['embedder']}; rebuild it")
+    hits = index.search(embedder.embed([query])[0], k, knowledge_ids)
+    texts = index.texts([row for row, _ in hits])
+    results = []
+    for (row, score), text in zip(hits, texts):
+        knowledge_id = index.file_of(row)
+        results.append({
+            "knowledge_id": knowledge_id,
+            "chunk": row - index.manifest["files"][knowledge_id][0],
+            "score": round(score, 4),
+            "text": text,
+        })
+    return results
+
+async def search(user_id, query: str, k: int = 5, knowledge_ids: list[str] | None = None) -> list[dict]:
+    """Top-k chunks across the tenant's indexed files by cosine similarity to ``query``."""
+    # Held so a concurrent removal cannot swap the files out from under the search
+    async with _lock(user_id):
+        return await asyncio.to_thread(_search, user_id, query, k, knowledge_ids)
+
+def _get_chunks(user_id, knowledge_id: str, offset: int, limit: int) -> dict | None:
+    index = _get_index(user_id)
+    if knowledge_id not in index.manifest["files"]:
+        return None
+    start, end = index.manifest["files"][knowledge_id]
+    rows = range(min(start + offset, end), min(start + offset + limit, end))
+    return {"knowledge_id": knowledge_id, "total": end - start, "chunks": index.texts(rows)}
+
+async def get_chunks(user_id, knowledge_id: str, offset: int = 0, limit: int = 20) -> dict | None:
+    """A page of a file's chunks in document order, or None if it is not indexed."""
+    async with _lock(user_id):
+        return await asyncio.to_thread(_get_chunks, user_id, knowledge_id, offset, limit)
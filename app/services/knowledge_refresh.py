@@ -0,0 +1,238 @@
+"""
+Scheduled refresh of knowledge files that were ingested from a URL or a website crawl.
+
+Due sources are re-scraped (through the scrape cache, so unchanged pages are mostly
+answered with a 304) and the sha256 of the resulting text is compared with what was last
+uploaded. Only changed content is uploaded again; the new file then replaces the old one
+on every agent recorded as using it, with one set_agent_files call per agent however many
+of its files changed, sending the messages last set with its files. Skipped uploads are
+reported as bytes saved.
+
+The old file is kept on Millis: assignments made before ``agent_knowledge_files`` existed,
+or outside this backend, are not recorded, and an agent using it would lose it. Only with
+KNOWLEDGE_REFRESH_DELETE_REPLACED, for deployments where every assignment goes through
+set_agent_files here, are old files deleted once swapped everywhere.
+"""
+from dataclasses import dataclass
+from io import BytesIO
+import asyncio
+import hashlib
+import logging
+import tempfile
+import time
+
+from sqlalchemy import func, select, update
+
+from app.core.config import settings
+from app.core.database import get_db_background
+from app.core.metrics import KNOWLEDGE_REFRESH_BYTES_SAVED, KNOWLEDGE_REFRESH_RESULTS, track_job
+from app.models import Agent, AgentKnowledgeFile, Knowledge, KnowledgeSource
+from app.services.crawler import CrawlJob, website_crawler
+from app.services.knowledge_files import delete_knowledge_file, set_agent_files, upload_knowledge_file
+from app.services.scraper import scrape_url
+from app.utils.urls import site_of
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RefreshOutcome:
+    result: str  # unchanged, updated, failed or orphaned
+    old_id: str | None = None
+    new_id: str | None = None
+    bytes_saved: int = 0
+    bytes_uploaded: int = 0
+
+async def _fetch_url(url: str) -> tuple[BytesIO, int, str]:
+    text = await scrape_url(url)
+    content = text.encode("utf-8")
+    return BytesIO(content), len(content), hashlib.sha256(content).hexdigest()
+
+async def _fetch_crawl(user_id, url: str, options: dict | None, output) -> tuple[int, str]:
+    options = options or {}
+    job = CrawlJob(
+        user_id,
+        url,
+        options.get("max_depth", 2),
+        min(options.get("max_pages", 50), settings.CRAWL_MAX_PAGES),
+        name="",
+        description="",
+    )
+    content_hash = await website_crawler.crawl_to_file(job, output)
+    return output.tell(), content_hash
+
+async def _save_source(source_id, **values):
+    async with get_db_background() as db:
+        await db.execute(update(KnowledgeSource).where(KnowledgeSource.id == source_id).values(**values))
+        await db.commit()
+
+async def refresh_source(source_id) -> RefreshOutcome:
+    """
+    Re-fetch one source and upload a replacement file if its content changed.
+
+    Scraping and uploading can take minutes, so no session is held meanwhile: the fields
+    needed are read up front and the outcome is saved in a fresh session.
+    """
+    async with get_db_background() as db:
+        source = await db.get(KnowledgeSource, source_id)
+        if source is None:
+            return RefreshOutcome("orphaned")
+        knowledge = await db.get(Knowledge, source.knowledge_id)
+        if knowledge is None:
+            # The file was deleted outside delete_knowledge_file; nothing left to refresh
+            await db.delete(source)
+            await db.commit()
+            return RefreshOutcome("orphaned")
+
+        now = int(time.time())
+        source.last_checked_at = now
+        source.next_refresh_at = now + source.refresh_interval
+        user_id, url, source_type, options = source.user_id, source.url, source.source_type, source.options
+        old_id, old_hash = source.knowledge_id, source.content_hash
+        name, description, file_type = knowledge.name, knowledge.description, knowledge.file_type
+        await db.commit()
+
+    try:
+        with tempfile.TemporaryFile() as output:
+            if source_type == "crawl":
+                size, content_hash = await _fetch_crawl(user_id, url, options, output)
+                file = output
+            else:
+                file, size, content_hash = await _fetch_url(url)
+
+            if content_hash == old_hash:
+                await _save_source(
+                    source_id,
+                    bytes_saved=func.coalesce(KnowledgeSource.bytes_saved, 0) + size,
+                    last_error=None,
+                )
+                return RefreshOutcome("unchanged", bytes_saved=size)
+
+            # The session only takes a connection once the file is uploaded, to record it
+            async with get_db_background() as db:
+                new_id, _ = await upload_knowledge_file(
+                    db,
+                    user_id,
+                    file,
+                    size,
+                    filename=f"{site_of(url) or 'website'}-{source_type}.txt",
+                    name=name,
+                    description=description,
+                    file_type=file_type or "text/plain",
+                )
+    except Exception as e:
+        logger.warning(f"Refreshing knowledge {old_id} from {url} failed: {str(e)}")
+        await _save_source(source_id, last_error=str(getattr(e, "detail", e)))
+        return RefreshOutcome("failed", old_id=old_id)
+
+    await _save_source(
+        source_id,
+        knowledge_id=new_id,
+        content_hash=content_hash,
+        size=size,
+        last_changed_at=now,
+        last_error=None,
+    )
+    return RefreshOutcome("updated", old_id=old_id, new_id=new_id, bytes_uploaded=size)
+
+async def replace_agent_files(replacements: dict[str, str]) -> set[str]:
+    """
+    Point every agent recorded as using a replaced file at its replacement, one update per
+    agent, keeping the messages last sent with its files.
+
+    Returns the old ids that could not be swapped everywhere and so must be kept.
+    """
+    kept: set[str] = set()
+    async with get_db_background() as db:
+        result = await db.execute(
+            select(AgentKnowledgeFile.agent_id, AgentKnowledgeFile.knowledge_id)
+            .where(AgentKnowledgeFile.agent_id.in_(
+                select(AgentKnowledgeFile.agent_id).where(AgentKnowledgeFile.knowledge_id.in_(list(replacements)))
+            ))
+            .order_by(AgentKnowledgeFile.agent_id, AgentKnowledgeFile.position)
+        )
+        files_by_agent: dict[str, list[str]] = {}
+        for agent_id, knowledge_id in result.all():
+            files_by_agent.setdefault(agent_id, []).append(knowledge_id)
+        result = await db.execute(select(Agent.id, Agent.knowledge_messages).where(Agent.id.in_(list(files_by_agent))))
+        messages_by_agent = dict(result.all())
+
+        for agent_id, files in files_by_agent.items():
+            messages = messages_by_agent.get(agent_id)
+            if messages is None:
+                # Its messages were never recorded, and sending none would clear them on Millis
+                logger.warning(f"Not swapping refreshed knowledge files on agent {agent_id}; its file messages are unknown")
+                kept.update(file_id for file_id in files if file_id in replacements)
+                continue
+            try:
+                await set_agent_files(db, agent_id, [replacements.get(file_id, file_id) for file_id in files], messages)
+            except Exception as e:
+                logger.error(f"Failed to swap refreshed knowledge files on agent {agent_id}: {str(getattr(e, 'detail', e))}")
+                kept.update(file_id for file_id in files if file_id in replacements)
+    return kept
+
+@track_job("refresh_knowledge_sources")
+async def refresh_knowledge_sources():
+    """Refresh the sources that are due, within KNOWLEDGE_REFRESH_CONCURRENCY."""
+    started = time.perf_counter()
+    now = int(time.time())
+    async with get_db_background() as db:
+        # Claimed by moving them to their next interval, so the job running in another
+        # worker process skips them rather than refreshing them again
+        due = (
+            select(KnowledgeSource.id)
+            .where(
+                KnowledgeSource.refresh_interval.isnot(None),
+                KnowledgeSource.next_refresh_at <= now,
+            )
+            .order_by(KnowledgeSource.next_refresh_at)
+            .limit(settings.KNOWLEDGE_REFRESH_BATCH)
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            update(KnowledgeSource)
+            .where(KnowledgeSource.id.in_(due))
+            .values(next_refresh_at=now + KnowledgeSource.refresh_interval)
+            .returning(KnowledgeSource.id)
+            .execution_options(synchronize_session=False)
+        )
+        source_ids = result.scalars().all()
+        await db.commit()
+    if not source_ids:
+        return
+
+    semaphore = asyncio.Semaphore(settings.KNOWLEDGE_REFRESH_CONCURRENCY)
+
+    async def run(source_id):
+        async with semaphore:
+            return await refresh_source(source_id)
+
+    outcomes = await asyncio.gather(*(run(source_id) for source_id in source_ids))
+
+    replacements = {outcome.old_id: outcome.new_id for outcome in outcomes if outcome.result == "updated"}
+    if replacements:
+        kept = await replace_agent_files(replacements)
+        if not settings.KNOWLEDGE_REFRESH_DELETE_REPLACED:
+            kept = set(replacements)
+        async with get_db_background() as db:
+            for old_id in replacements:
+                if old_id in kept:
+                    logger.info(f"Keeping replaced knowledge file {old_id}; an agent may still use it")
+                    continue
+                knowledge = await db.get(Knowledge, old_id)
+                if knowledge is None:
+                    continue
+                try:
+                    await delete_knowledge_file(db, knowledge)
+                except Exception as e:
+                    logger.error(f"Failed to delete replaced knowledge file {old_id}: {str(getattr(e, 'detail', e))}")
+
+    counts: dict[str, int] = {}
+    for outcome in outcomes:
+        counts[outcome.result] = counts.get(outcome.result, 0) + 1
+        KNOWLEDGE_REFRESH_RESULTS.labels(outcome.result).inc()
+    bytes_saved = sum(outcome.bytes_saved for outcome in outcomes)
+    KNOWLEDGE_REFRESH_BYTES_SAVED.inc(bytes_saved)
+    logger.info(
+        f"Knowledge refresh: {len(outcomes)} sources in {time.perf_counter() - started:.1f}s, {counts}, "
+        f"{sum(outcome.bytes_uploaded for outcome in outcomes)} bytes uploaded, {bytes_saved} bytes saved"
+    )
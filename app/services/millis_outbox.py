@@ -0,0 +1,429 @@
+"""
+Millis calls made through a transactional outbox, so local and remote state agree.
+
+Handlers used to call Millis and then commit locally, printing commit errors, so a failed
+commit left a Millis resource with no local row, and a client retry hit Millis again.
+Now a handler commits a ``millis_outbox`` row describing the Millis call, and the call is
+made afterwards, by the request itself or, while Millis is unavailable, by the background
+worker. The local change (saving a created agent, deleting a row, setting a caller) is
+applied only once Millis accepted the call, so a rejected call leaves local state as it was:
+
+- ``pending``: the call has not succeeded yet. It is retried with exponential backoff; a
+  4xx other than 404 on a delete, 408 or 429 fails the operation at once. A pending
+  delete is the marker that the resource is on its way out.
+- ``remote_done``: Millis accepted it and its response is saved, so later steps never
+  call Millis again. The local change is applied here.
+- ``done`` or ``failed``.
+
+Millis is not known to honour ``Idempotency-Key``, so a call that may have reached it
+without an answer is not simply repeated. Kinds in ``RECONCILERS`` send the operation id as
+``metadata.outbox_operation_id`` and, when an attempt's outcome is unknown (no response,
+a 5xx, or a worker lost mid-call), look on Millis for a resource carrying that marker. If
+none is found the operation fails for the user to check, rather than risk a duplicate.
+
+Rows are claimed with ``FOR UPDATE SKIP LOCKED``, so every API process can run a worker.
+"""
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import httpx
+import json
+import logging
+import random
+import time
+import uuid
+
+from app.core.config import settings
+from app.core.database import get_db_background
+from app.core.metrics import MILLIS_OUTBOX_OPERATIONS, MILLIS_OUTBOX_PENDING, track_job
+from app.models import Agent, Campaign, MillisOutbox, Phone
+from app.services.agent_links import clear_agent_links
+from app.utils.httpx import get_httpx_headers, httpx_base_url, millis_client
+
+logger = logging.getLogger(__name__)
+
+CLAIM_BATCH = 50
+# A claimed operation not resolved within this long is assumed lost with its worker
+STALE_CLAIM_SECONDS = 300
+# Failures that mean the request never reached Millis
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+def add_operation(
+    db: AsyncSession,
+    user_id,
+    kind: str,
+    method: str,
+    path: str,
+    payload: dict | None = None,
+    resource_id: str | None = None,
+    claim: bool = False,
+) -> MillisOutbox:
+    """
+    Record a Millis call to make once the caller commits.
+
+    With ``claim`` the request keeps it to run with ``millis_outbox.run_now`` after the
+    commit; otherwise call ``millis_outbox.notify()`` after the commit.
+    """
+    now = int(time.time())
+    operation = MillisOutbox(
+        id=uuid.uuid4(),
+        user_id=user_id,
+        kind=kind,
+        method=method,
+        path=path,
+        payload=payload,
+        resource_id=resource_id,
+        status="pending",
+        attempts=0,
+        outcome_unknown=False,
+        next_attempt_at=now,
+        locked_at=now if claim else None,
+        created_at=now,
+    )
+    db.add(operation)
+    return operation
+
+async def open_operation(db: AsyncSession, kind: str, resource_id: str) -> MillisOutbox | None:
+    """The operation of ``kind`` on ``resource_id`` that is not done or failed yet, if any."""
+    result = await db.execute(
+        select(MillisOutbox)
+        .where(
+            MillisOutbox.kind == kind,
+            MillisOutbox.resource_id == resource_id,
+            MillisOutbox.status.in_(["pending", "remote_done"]),
+        )
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+async def count_agent_slots(db: AsyncSession, user_id) -> int:
+    """Subscription slots the user's agents take, counting those still being created."""
+    agents = (await db.execute(select(func.count()).select_from(Agent).where(Agent.user_id == user_id))).scalar_one()
+    creating = (await db.execute(
+        select(func.count()).select_from(MillisOutbox).where(
+            MillisOutbox.user_id == user_id,
+            MillisOutbox.kind == "create_agent",
+            MillisOutbox.status.in_(["pending", "remote_done"]),
+        )
+    )).scalar_one()
+    return agents + creating
+
+async def submit_operation(
+    db: AsyncSession,
+    user_id,
+    kind: str,
+    method: str,
+    path: str,
+    payload: dict | None = None,
+    resource_id: str | None = None,
+) -> MillisOutbox:
+    """Record a Millis call, commit, and carry it out within the request."""
+    operation = add_operation(db, user_id, kind, method, path, payload, resource_id, claim=True)
+    await db.commit()
+    return await millis_outbox.run_now(operation)
+
+def operation_result(operation: MillisOutbox, result=None):
+    """
+    What a request returns for an operation it ran: ``result`` (by default the Millis
+    response) once done, Millis's error if it rejected the call, 202 while it is unavailable.
+    """
+    if operation.status == "failed":
+        raise HTTPException(status_code=operation.status_code or 500, detail=operation.last_error or "Unknown Error")
+    if operation.status != "done":
+        # The outbox worker keeps trying; the operation can be polled at /operations
+        return JSONResponse(status_code=202, content=operation_state(operation))
+    return operation.response if result is None else result
+
+def operation_state(operation: MillisOutbox) -> dict:
+    return {
+        "operation_id": str(operation.id),
+        "kind": operation.kind,
+        "status": operation.status,
+        "resource_id": operation.resource_id,
+        "attempts": operation.attempts,
+        "error": operation.last_error,
+        "created_at": operation.created_at,
+        "completed_at": operation.completed_at,
+    }
+
+def is_permanent(status_code: int) -> bool:
+    """Whether retrying cannot help: Millis rejected the request itself."""
+    return 400 <= status_code < 500 and status_code not in (408, 429)
+
+async def _complete_create_agent(db: AsyncSession, operation: MillisOutbox):
+    data = operation.response or {}
+    if not data.get("id"):
+        raise ValueError("Millis returned no agent id")
+    operation.resource_id = data.get("id")
+    if await db.get(Agent, data.get("id")) is None:
+        payload = operation.payload or {}
+        db.add(Agent(
+            id = data.get("id"),
+            name = payload.get("name"),
+            config = payload.get("config"),
+            user_id = operation.user_id,
+            created_at = data.get("created_at"),
+        ))
+
+async def _complete_delete_agent(db: AsyncSession, operation: MillisOutbox):
+    db_agent = await db.get(Agent, operation.resource_id)
+    if db_agent is not None:
+        await clear_agent_links(db, operation.resource_id)
+        await db.delete(db_agent)
+
+async def _complete_delete_phone(db: AsyncSession, operation: MillisOutbox):
+    db_phone = await db.get(Phone, operation.resource_id)
+    if db_phone is not None:
+        await db.delete(db_phone)
+
+async def _complete_delete_campaign(db: AsyncSession, operation: MillisOutbox):
+    db_campaign = await db.get(Campaign, operation.resource_id)
+    if db_campaign is not None:
+        await db.delete(db_campaign)
+
+async def _complete_set_caller(db: AsyncSession, operation: MillisOutbox):
+    db_campaign = await db.get(Campaign, operation.resource_id)
+    if db_campaign is not None:
+        db_campaign.caller = (operation.payload or {}).get("caller")
+
+# Local changes applied once Millis accepted the call
+COMPLETIONS = {
+    "create_agent": _complete_create_agent,
+    "delete_agent": _complete_delete_agent,
+    "delete_phone": _complete_delete_phone,
+    "delete_campaign": _complete_delete_campaign,
+    "set_caller": _complete_set_caller,
+}
+
+async def _find_created_agent(operation: MillisOutbox) -> dict | None:
+    """The Millis agent an earlier attempt of ``operation`` created, found by its marker."""
+    async with millis_client() as client:
+        response = await client.get(f"{httpx_base_url}/agents", headers=get_httpx_headers())
+    response.raise_for_status()
+    marker = str(operation.id)
+    for agent in response.json():
+        if agent.get("id") and (agent.get("metadata") or {}).get("outbox_operation_id") == marker:
+            return agent
+    return None
+
+# Kinds whose call Millis cannot deduplicate: after an attempt with an unknown outcome, look
+# for its result by the marker the request carried instead of sending again
+RECONCILERS = {
+    "create_agent": _find_created_agent,
+}
+
+def request_body(operation: MillisOutbox) -> dict | None:
+    payload = operation.payload
+    if payload is not None and operation.kind in RECONCILERS:
+        metadata = {**(payload.get("metadata") or {}), "outbox_operation_id": str(operation.id)}
+        payload = {**payload, "metadata": metadata}
+    return payload
+
+class MillisOutboxWorker:
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def notify(self):
+        """Wake the worker now rather than at its next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def run_now(self, operation: MillisOutbox) -> MillisOutbox:
+        """Carry out an operation the request claimed; a retryable failure is left to the worker."""
+        await self._process(operation)
+        if operation.status == "pending":
+            self.notify()
+        return operation
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self._drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Millis outbox worker failed: {str(e)}")
+                claimed = 0
+            if claimed >= CLAIM_BATCH:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.MILLIS_OUTBOX_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _claim(self) -> list[MillisOutbox]:
+        now = int(time.time())
+        async with get_db_background() as db:
+            result = await db.execute(
+                select(MillisOutbox)
+                .where(
+                    MillisOutbox.status.in_(["pending", "remote_done"]),
+                    MillisOutbox.next_attempt_at <= now,
+                    or_(MillisOutbox.locked_at.is_(None), MillisOutbox.locked_at < now - STALE_CLAIM_SECONDS),
+                )
+                .order_by(MillisOutbox.next_attempt_at)
+                .limit(CLAIM_BATCH)
+                .with_for_update(skip_locked=True)
+            )
+            operations = result.scalars().all()
+            for operation in operations:
+                operation.locked_at = now
+            pending = (await db.execute(
+                select(func.count()).select_from(MillisOutbox).where(MillisOutbox.status.in_(["pending", "remote_done"]))
+            )).scalar_one()
+            await db.commit()
+        MILLIS_OUTBOX_PENDING.set(pending)
+        return operations
+
+    async def _drain_once(self) -> int:
+        operations = await self._claim()
+        if operations:
+            await asyncio.gather(*(self._process(operation) for operation in operations))
+        return len(operations)
+
+    async def _process(self, operation: MillisOutbox):
+        if operation.status == "pending" and not await self._call(operation):
+            return
+        await self._complete(operation)
+
+    async def _call(self, operation: MillisOutbox) -> bool:
+        """Make the Millis call; returns whether it succeeded."""
+        now = int(time.time())
+        attempts = operation.attempts + 1
+        status_code = None
+        reconcile = RECONCILERS.get(operation.kind)
+        outcome_unknown = bool(operation.outcome_unknown)
+        try:
+            if reconcile is not None:
+                if outcome_unknown:
+                    found = await reconcile(operation)
+                    if found is not None:
+                        logger.warning(f"Millis {operation.kind} operation {operation.id} had succeeded, adopting {found.get('id')}")
+                        await self._update(
+                            operation, status="remote_done", attempts=attempts, status_code=None,
+                            response=found, last_error=None, outcome_unknown=False, next_attempt_at=now,
+                        )
+                        return True
+                    MILLIS_OUTBOX_OPERATIONS.labels(operation.kind, "failed").inc()
+                    logger.error(f"Millis {operation.kind} operation {operation.id} has an unknown outcome, not retrying")
+                    await self._update(
+                        operation, status="failed", attempts=attempts, locked_at=None, completed_at=now,
+                        last_error="Millis may have carried this out without answering; check before trying again",
+                    )
+                    return False
+                # Recorded before sending, so a worker that dies mid-call leaves it to be reconciled
+                outcome_unknown = True
+                await self._update(operation, attempts=attempts, outcome_unknown=True)
+            async with millis_client() as client:
+                headers = {**get_httpx_headers(), "Idempotency-Key": str(operation.id)}
+                payload = request_body(operation)
+                data = json.dumps(payload) if payload is not None else None
+                response = await client.request(operation.method, f"{httpx_base_url}{operation.path}", data=data, headers=headers)
+            status_code = response.status_code
+            # A 5xx may come after Millis acted; anything else, or an open circuit, means it did not
+            outcome_unknown = status_code >= 500 and not response.extensions.get("short_circuit")
+            # Deleting what Millis no longer has is the outcome we wanted
+            if status_code == 200 or status_code == 201 or (operation.method == "DELETE" and status_code == 404):
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = response.text
+                await self._update(
+                    operation, status="remote_done", attempts=attempts, status_code=status_code,
+                    response=body, last_error=None, outcome_unknown=False, next_attempt_at=now,
+                )
+                return True
+            error = response.text or "Unknown Error"
+        except Exception as e:
+            error = str(e)
+            if isinstance(e, NOT_SENT_ERRORS):
+                outcome_unknown = False
+        if reconcile is None:
+            outcome_unknown = False
+
+        if (status_code is not None and is_permanent(status_code)) or attempts >= settings.MILLIS_OUTBOX_MAX_ATTEMPTS:
+            MILLIS_OUTBOX_OPERATIONS.labels(operation.kind, "failed").inc()
+            logger.error(f"Millis {operation.kind} operation {operation.id} failed: {status_code} {error}")
+            await self._update(
+                operation, status="failed", attempts=attempts, status_code=status_code,
+                last_error=error, outcome_unknown=outcome_unknown, locked_at=None, completed_at=now,
+            )
+        else:
+            delay = min(settings.MILLIS_OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.MILLIS_OUTBOX_RETRY_MAX_SECONDS)
+            MILLIS_OUTBOX_OPERATIONS.labels(operation.kind, "retry").inc()
+            logger.warning(f"Millis {operation.kind} operation {operation.id} failed, retrying in {delay}s: {status_code} {error}")
+            await self._update(
+                operation, attempts=attempts, status_code=status_code, last_error=error,
+                outcome_unknown=outcome_unknown, locked_at=None,
+                next_attempt_at=now + int(delay * random.uniform(0.8, 1.2)),
+            )
+        return False
+
+    async def _complete(self, operation: MillisOutbox):
+        """Apply the local follow-up, if any, and finish the operation in one transaction."""
+        now = int(time.time())
+        try:
+            async with get_db_background() as db:
+                completion = COMPLETIONS.get(operation.kind)
+                if completion is not None:
+                    await completion(db, operation)
+                await db.execute(
+                    update(MillisOutbox)
+                    .where(MillisOutbox.id == operation.id)
+                    .values(status="done", resource_id=operation.resource_id, locked_at=None, completed_at=now)
+                )
+                await db.commit()
+        except Exception as e:
+            # Millis already has it; only the local step is retried
+            logger.error(f"Failed to complete Millis {operation.kind} operation {operation.id}: {str(e)}")
+            await self._update(
+                operation, locked_at=None, last_error=str(e),
+                next_attempt_at=now + settings.MILLIS_OUTBOX_RETRY_BASE_SECONDS,
+            )
+            return
+        operation.status = "done"
+        operation.locked_at = None
+        operation.completed_at = now
+        MILLIS_OUTBOX_OPERATIONS.labels(operation.kind, "done").inc()
+
+    async def _update(self, operation: MillisOutbox, **values):
+        for key, value in values.items():
+            setattr(operation, key, value)
+        try:
+            async with get_db_background() as db:
+                await db.execute(update(MillisOutbox).where(MillisOutbox.id == operation.id).values(**values))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to record Millis {operation.kind} operation {operation.id}: {str(e)}")
+
+millis_outbox = MillisOutboxWorker()
+
+@track_job("purge_millis_outbox")
+async def purge_millis_outbox():
+    """Drop done and failed operations older than MILLIS_OUTBOX_RETENTION_DAYS."""
+    cutoff = int(time.time()) - settings.MILLIS_OUTBOX_RETENTION_DAYS * 86400
+    async with get_db_background() as db:
+        await db.execute(
+            delete(MillisOutbox).where(MillisOutbox.status.in_(["done", "failed"]), MillisOutbox.created_at < cutoff)
+        )
+        await db.commit()
@@ -1,35 +1,61 @@
-from openai import OpenAI
+from collections import OrderedDict
+from typing import AsyncIterator
+import hashlib
+import json
+
+from openai import AsyncOpenAI
 from app.core.config import settings
+from app.core.metrics import PROMPT_CACHE_RESULTS, track_upstream
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+PROMPT_MODEL = "gpt-4o-mini"
 
+client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL or None)
 
-async def generate_prompt_with_openai(
+
+class PromptCache:
+    """LRU cache of generated prompts, keyed by a hash of the wizard fields."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, str] = OrderedDict()
+
+    @staticmethod
+    def key(**fields) -> str:
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        prompt = self._entries.get(key)
+        if prompt is not None:
+            self._entries.move_to_end(key)
+        PROMPT_CACHE_RESULTS.labels("hit" if prompt is not None else "miss").inc()
+        return prompt
+
+    def put(self, key: str, prompt: str):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = prompt
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+prompt_cache = PromptCache(settings.PROMPT_CACHE_SIZE)
+
+
+def _build_messages(
     agent_name: str,
     industry: str,
     description: str = None,
     purpose: str = None,
     personality: str = None,
     industry_prompt: str = None,
-) -> str:
-    """
-    Generate an optimized agent prompt using OpenAI.
-    
-    Args:
-        agent_name: Name of the agent
-        industry: Industry type
-        description: Optional compiled description from wizard
-        purpose: Optional primary purpose
-        personality: Optional personality traits
-        industry_prompt: Base industry-specific prompt
-    
-    Returns:
-        Generated prompt string
-    """
-
+) -> list[dict]:
     # Build context from provided fields
     context_parts = []
-    
+
     if description:
         context_parts.append(f"Additional context: {description}")
     else:
@@ -37,13 +63,13 @@ async def generate_prompt_with_openai(
             context_parts.append(f"Primary purpose: {purpose}")
         if personality:
             context_parts.append(f"Personality: {personality}")
-    
+
     context = "\n".join(context_parts) if context_parts else "No additional context provided"
-    
+
     system_prompt = """You are an expert AI prompt engineer. Your task is to create a comprehensive, 
 professional system prompt for an AI agent. The prompt should be clear, detailed, and optimized for 
 the agent to perform its role effectively."""
-    
+
     user_message = f"""Generate a professional system prompt for an AI agent with the following specifications:
 
 Agent Name: {agent_name}
@@ -61,15 +87,115 @@ Create a comprehensive prompt that:
 6. Ends with clear operational boundaries
 
 Provide only the prompt content, no preamble."""
-    
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message}
-        ],
-        temperature=0.7,
-        max_tokens=1000,
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message}
+    ]
+
+
+def _cache_key(**fields) -> str:
+    return PromptCache.key(model=PROMPT_MODEL, **fields)
+
+
+async def generate_prompt_with_openai(
+    agent_name: str,
+    industry: str,
+    description: str = None,
+    purpose: str = None,
+    personality: str = None,
+    industry_prompt: str = None,
+) -> str:
+    """
+    Generate an optimized agent prompt using OpenAI.
+
+    Identical requests are answered from an in-process LRU cache.
+
+    Args:
+        agent_name: Name of the agent
+        industry: Industry type
+        description: Optional compiled description from wizard
+        purpose: Optional primary purpose
+        personality: Optional personality traits
+        industry_prompt: Base industry-specific prompt
+
+    Returns:
+        Generated prompt string
+    """
+    fields = dict(
+        agent_name=agent_name,
+        industry=industry,
+        description=description,
+        purpose=purpose,
+        personality=personality,
+        industry_prompt=industry_prompt,
+    )
+    key = _cache_key(**fields)
+    cached = prompt_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with track_upstream("openai", "chat.completions.create"):
+        response = await client.chat.completions.create(
+            model=PROMPT_MODEL,
+            messages=_build_messages(**fields),
+            temperature=0.7,
+            max_tokens=1000,
+        )
+
+    prompt = response.choices[0].message.content.strip()
+    prompt_cache.put(key, prompt)
+    return prompt
+
+
+async def stream_prompt_with_openai(
+    agent_name: str,
+    industry: str,
+    description: str = None,
+    purpose: str = None,
+    personality: str = None,
+    industry_prompt: str = None,
+) -> AsyncIterator[str]:
+    """
+    Like generate_prompt_with_openai, but yields the prompt as it is generated.
+
+    A cached prompt is yielded in one piece. A completed stream is cached; one the client
+    abandons part way is not.
+    """
+    fields = dict(
+        agent_name=agent_name,
+        industry=industry,
+        description=description,
+        purpose=purpose,
+        personality=personality,
+        industry_prompt=industry_prompt,
     )
-    
-    return response.choices[0].message.content.strip()
+    key = _cache_key(**fields)
+    cached = prompt_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    with track_upstream("openai", "chat.completions.create"):
+        stream = await client.chat.completions.create(
+            model=PROMPT_MODEL,
+            messages=_build_messages(**fields),
+            temperature=0.7,
+            max_tokens=1000,
+            stream=True,
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                # Leading whitespace is dropped, as the non-streaming variant strips it
+                if not parts:
+                    delta = delta.lstrip()
+                    if not delta:
+                        continue
+                parts.append(delta)
+                yield delta
+
+    prompt_cache.put(key, "".join(parts).strip())
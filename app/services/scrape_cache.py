@@ -0,0 +1,100 @@
+"""
+Persistent cache of scraped pages with HTTP revalidation.
+
+Each entry keeps the validators the origin sent (ETag, Last-Modified), a hash of the raw
+document and the extracted text. Re-scraping sends If-None-Match/If-Modified-Since; a 304,
+or a 200 with an identical body, reuses the stored text without parsing. Entries not read
+for SCRAPE_CACHE_TTL_SECONDS are evicted, and the least recently read ones go first when
+the stored text exceeds SCRAPE_CACHE_MAX_BYTES.
+"""
+import logging
+import time
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.core.database import get_db_background
+from app.core.metrics import track_job
+from app.models import ScrapeCache
+
+logger = logging.getLogger(__name__)
+
+EVICTION_BATCH = 500
+
+async def get_entry(url: str) -> ScrapeCache | None:
+    try:
+        async with get_db_background() as db:
+            return await db.get(ScrapeCache, url)
+    except Exception as e:
+        logger.error(f"Failed to read scrape cache for {url}: {str(e)}")
+        return None
+
+async def mark_validated(url: str, revalidated: bool, etag: str | None = None, last_modified: str | None = None):
+    """
+    Record a cache hit; ``revalidated`` when the origin has just confirmed the entry,
+    in which case any new validators it sent are kept.
+    """
+    now = int(time.time())
+    values = {"accessed_at": now, "hit_count": ScrapeCache.hit_count + 1}
+    if revalidated:
+        values["validated_at"] = now
+        if etag:
+            values["etag"] = etag
+        if last_modified:
+            values["last_modified"] = last_modified
+    try:
+        async with get_db_background() as db:
+            await db.execute(update(ScrapeCache).where(ScrapeCache.url == url).values(**values))
+            await db.commit()
+    except Exception as e:
+        logger.error(f"Failed to update scrape cache for {url}: {str(e)}")
+
+async def store_entry(url: str, etag: str | None, last_modified: str | None, content_hash: str, text: str):
+    now = int(time.time())
+    values = {
+        "etag": etag,
+        "last_modified": last_modified,
+        "content_hash": content_hash,
+        "text": text,
+        "size": len(text.encode("utf-8")),
+        "fetched_at": now,
+        "validated_at": now,
+        "accessed_at": now,
+    }
+    statement = insert(ScrapeCache).values(url=url, hit_count=0, **values)
+    statement = statement.on_conflict_do_update(index_elements=[ScrapeCache.url], set_=values)
+    try:
+        async with get_db_background() as db:
+            await db.execute(statement)
+            await db.commit()
+    except Exception as e:
+        logger.error(f"Failed to store scrape cache for {url}: {str(e)}")
+
+@track_job("evict_scrape_cache")
+async def evict_scrape_cache():
+    """Drop expired entries, then the least recently read ones until under the size bound."""
+    async with get_db_background() as db:
+        cutoff = int(time.time()) - settings.SCRAPE_CACHE_TTL_SECONDS
+        await db.execute(delete(ScrapeCache).where(ScrapeCache.accessed_at < cutoff))
+        await db.commit()
+
+        total = (await db.execute(select(func.coalesce(func.sum(ScrapeCache.size), 0)))).scalar_one()
+        excess = total - settings.SCRAPE_CACHE_MAX_BYTES
+        while excess > 0:
+            result = await db.execute(
+                select(ScrapeCache.url, ScrapeCache.size)
+                .order_by(ScrapeCache.accessed_at)
+                .limit(EVICTION_BATCH)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            victims = []
+            for url, size in rows:
+                if excess <= 0:
+                    break
+                victims.append(url)
+                excess -= size
+            await db.execute(delete(ScrapeCache).where(ScrapeCache.url.in_(victims)))
+            await db.commit()
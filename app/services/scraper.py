@@ -0,0 +1,187 @@
+"""
+URL scraping for the knowledge base.
+
+Documents are streamed with a size cap and parsed in a small process pool, so a large page
+costs a worker process rather than blocking the event loop for every other request.
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import logging
+import multiprocessing
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import SCRAPE_CACHE_RESULTS
+from app.services import scrape_cache
+# Parsers come from app.utils.html, so the spawned workers do not import the app with them
+from app.utils.html import parse_document_page, parse_document_text
+from app.utils.urls import canonicalize_url
+
+logger = logging.getLogger(__name__)
+
+# Set headers to mimic a browser request
+SCRAPE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+_executor: ProcessPoolExecutor | None = None
+_semaphore: asyncio.Semaphore | None = None
+
+class DocumentTooLarge(ValueError):
+    pass
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, not fork: the API process runs scheduler and watchdog threads
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.SCRAPE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.SCRAPE_MAX_CONCURRENCY)
+    return _semaphore
+
+async def _run_parser(parser, content: bytes, encoding: str | None):
+    global _executor
+    if settings.SCRAPE_WORKERS <= 0:
+        return parser(content, encoding)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_executor(), parser, content, encoding)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool for later requests
+        logger.warning("Scraper process pool broken, recreating it")
+        _executor = None
+        return await loop.run_in_executor(_get_executor(), parser, content, encoding)
+
+async def parse_html(content: bytes, encoding: str | None = None) -> str:
+    """Extract text from a downloaded document without blocking the event loop."""
+    return await _run_parser(parse_document_text, content, encoding)
+
+async def parse_page(content: bytes, encoding: str | None = None) -> tuple[str, list[str], str | None]:
+    """Extract text, raw link targets and the canonical URL from a downloaded page."""
+    return await _run_parser(parse_document_page, content, encoding)
+
+async def fetch_document(client: httpx.AsyncClient, url: str, max_bytes: int, headers: dict = None) -> tuple[httpx.Response, bytes]:
+    """
+    Stream a document, aborting as soon as it exceeds ``max_bytes``; returns the response and its body.
+
+    A 304 answer to a conditional request is returned with an empty body.
+    """
+    async with client.stream("GET", url, headers=headers or SCRAPE_HEADERS) as response:
+        if response.status_code == 304:
+            return response, b""
+        response.raise_for_status()
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise DocumentTooLarge(f"Document at {url} is {declared} bytes, over the {max_bytes} byte limit")
+        chunks = []
+        received = 0
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            if received > max_bytes:
+                raise DocumentTooLarge(f"Document at {url} exceeds the {max_bytes} byte limit")
+            chunks.append(chunk)
+    return response, b"".join(chunks)
+
+async def scrape_url(url: str, timeout: int = 30, use_cache: bool = True) -> str:
+    """
+    Scrape text content from a URL.
+
+    Previously scraped pages are revalidated with the origin and, when unchanged, served
+    from the scrape cache without being parsed again.
+
+    Args:
+        url: The URL to scrape
+        timeout: Request timeout in seconds (default: 30)
+        use_cache: Read and update the scrape cache (default: True)
+
+    Returns:
+        Extracted text content
+
+    Raises:
+        ValueError: If URL is invalid, the document is too large or the request fails
+    """
+    # Validate URL format
+    if not url.startswith(('http://', 'https://')):
+        raise ValueError(f"Invalid URL format: {url}. URL must start with http:// or https://")
+
+    cache_key = canonicalize_url(url) if use_cache and settings.SCRAPE_CACHE_ENABLED else None
+    cached = await scrape_cache.get_entry(cache_key) if cache_key else None
+    if cached and time.time() - cached.validated_at < settings.SCRAPE_CACHE_MAX_AGE_SECONDS:
+        SCRAPE_CACHE_RESULTS.labels("fresh").inc()
+        await scrape_cache.mark_validated(cache_key, revalidated=False)
+        return cached.text
+
+    headers = dict(SCRAPE_HEADERS)
+    if cached and cached.etag:
+        headers['If-None-Match'] = cached.etag
+    if cached and cached.last_modified:
+        headers['If-Modified-Since'] = cached.last_modified
+
+    try:
+        async with _get_semaphore():
+            async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+                response, content = await fetch_document(client, url, settings.SCRAPE_MAX_BYTES, headers=headers)
+
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if cached and response.status_code == 304:
+                SCRAPE_CACHE_RESULTS.labels("not_modified").inc()
+                await scrape_cache.mark_validated(cache_key, revalidated=True, etag=etag, last_modified=last_modified)
+                return cached.text
+
+            # Origins without validators still often serve byte-identical pages
+            content_hash = hashlib.sha256(content).hexdigest()
+            if cached and cached.content_hash == content_hash:
+                SCRAPE_CACHE_RESULTS.labels("unchanged").inc()
+                await scrape_cache.mark_validated(cache_key, revalidated=True, etag=etag, last_modified=last_modified)
+                return cached.text
+
+            # Check content type
+            content_type = response.headers.get('Content-Type', '').lower()
+            if 'text/html' not in content_type and 'text/plain' not in content_type:
+                logger.warning(f"Unexpected content type: {content_type} for URL: {url}")
+
+            text = await parse_html(content, response.charset_encoding)
+
+        if not text or len(text.strip()) == 0:
+            raise ValueError(f"No text content found on the page: {url}")
+
+        if cache_key:
+            SCRAPE_CACHE_RESULTS.labels("miss").inc()
+            await scrape_cache.store_entry(cache_key, etag, last_modified, content_hash, text)
+        return text
+
+    except httpx.TimeoutException as e:
+        raise ValueError(f"Request timeout after {timeout} seconds for URL: {url}") from e
+    except httpx.ConnectError as e:
+        raise ValueError(f"Connection error while fetching URL: {url}") from e
+    except httpx.HTTPStatusError as e:
+        raise ValueError(f"HTTP error {e.response.status_code} while fetching URL: {url}") from e
+    except httpx.HTTPError as e:
+        raise ValueError(f"HTTP error while fetching URL {url}: {str(e)}") from e
+    except ValueError:
+        # Includes DocumentTooLarge, which the caller reports separately
+        raise
+    except Exception as e:
+        raise ValueError(f"Error scraping URL {url}: {str(e)}") from e
+
+def shutdown_scraper():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
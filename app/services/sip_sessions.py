@@ -0,0 +1,65 @@
+"""
+SIP sessions, kept in their own indexed table.
+
+Every call started through /sip used to be appended to the owning agent's ``sip`` JSON map
+and never removed, and hanging up found the agent by substring-matching that map across
+the user's agents. Sessions now live in ``sip_sessions``, looked up by call id, and are
+dropped SIP_SESSION_TTL_HOURS after they began.
+"""
+from sqlalchemy import Text, cast, delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+import logging
+import time
+
+from app.core.config import settings
+from app.core.database import get_db_background
+from app.core.metrics import track_job
+from app.models import Agent, SipSession
+
+logger = logging.getLogger(__name__)
+
+MIGRATE_BATCH = 500
+
+@track_job("purge_sip_sessions")
+async def purge_sip_sessions():
+    """Drop sessions that began more than SIP_SESSION_TTL_HOURS ago."""
+    cutoff = int(time.time()) - settings.SIP_SESSION_TTL_HOURS * 3600
+    async with get_db_background() as db:
+        await db.execute(delete(SipSession).where(SipSession.created_at < cutoff))
+        await db.commit()
+
+async def migrate_agent_sip():
+    """
+    Move the call ids left in ``Agent.sip`` into ``sip_sessions`` and empty the maps.
+
+    Runs at startup. Sessions already past their TTL are dropped rather than moved.
+    """
+    cutoff = int(time.time()) - settings.SIP_SESSION_TTL_HOURS * 3600
+    moved = 0
+    try:
+        async with get_db_background() as db:
+            while True:
+                rows = (await db.execute(
+                    select(Agent.id, Agent.user_id, Agent.sip)
+                    .where(cast(Agent.sip, Text) != "{}")
+                    .order_by(Agent.id)
+                    .limit(MIGRATE_BATCH)
+                )).all()
+                if not rows:
+                    break
+                sessions = [
+                    {"call_id": call_id, "agent_id": agent_id, "user_id": user_id, "created_at": int(started)}
+                    for agent_id, user_id, sip in rows
+                    for call_id, started in (sip or {}).items()
+                    if call_id and isinstance(started, (int, float)) and started >= cutoff
+                ]
+                if sessions:
+                    inserted = await db.execute(insert(SipSession).values(sessions).on_conflict_do_nothing())
+                    moved += inserted.rowcount
+                await db.execute(update(Agent).where(Agent.id.in_([row[0] for row in rows])).values(sip={}))
+                await db.commit()
+    except Exception as e:
+        logger.error(f"Failed to move agent SIP sessions: {str(e)}")
+        return
+    if moved:
+        logger.info(f"Moved {moved} SIP sessions out of agents")
@@ -0,0 +1,341 @@
+"""
+Delivering call and campaign events to users' automation webhooks.
+
+Events are written to ``webhook_outbox``, one row per event and webhook, in the same
+transaction as the change they describe, and delivered by a background deliverer over
+one pooled HTTP client. A webhook saved with ``batch`` receives up to WEBHOOK_BATCH_SIZE
+events per request as ``{"events": [...]}``; others get one event per request. Failures
+are retried with exponential backoff; a 4xx other than 408 or 429 fails the event at once.
+
+Each request runs as its own task, at most WEBHOOK_MAX_CONNECTIONS at a time and at most
+WEBHOOK_ENDPOINT_CONCURRENCY to one URL. The deliverer only claims events it can send right
+away, so a slow endpoint holds its own slots, not the claim loop, and no claimed event
+waits longer than one request.
+
+An endpoint that fails WEBHOOK_BREAKER_THRESHOLD times in a row is not called for
+WEBHOOK_BREAKER_COOLDOWN_SECONDS; its events wait without using up attempts, and after the
+cooldown one request probes whether it is back. Breaker state is per process.
+
+Rows are claimed with ``FOR UPDATE SKIP LOCKED``, so every API process can run a deliverer.
+"""
+from dataclasses import dataclass
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import httpx
+import logging
+import random
+import time
+
+from app.core.config import settings
+from app.core.database import get_db_background
+from app.core.metrics import (
+    WEBHOOK_BREAKERS_OPEN,
+    WEBHOOK_DELIVERIES,
+    WEBHOOK_DELIVERY_LAG,
+    WEBHOOK_OUTBOX_PENDING,
+    track_job,
+)
+from app.models import AutomationWebhook, WebhookOutbox
+
+logger = logging.getLogger(__name__)
+
+CLAIM_BATCH = 200
+# A claimed event not resolved within this long is assumed lost with its deliverer; claimed
+# events are sent at once and a request is cut off after WEBHOOK_TIMEOUT_SECONDS
+STALE_CLAIM_SECONDS = 300
+
+def stale_claim_seconds() -> float:
+    return max(STALE_CLAIM_SECONDS, 2 * settings.WEBHOOK_TIMEOUT_SECONDS)
+
+async def add_webhook_events(db: AsyncSession, events: list[tuple]) -> int:
+    """
+    Queue ``(user_id, event_type, payload)`` events for every webhook of their users.
+
+    The caller commits, then calls ``webhook_deliverer.notify()``.
+    """
+    user_ids = {user_id for user_id, _, _ in events if user_id is not None}
+    if not user_ids:
+        return 0
+    result = await db.execute(select(AutomationWebhook).where(AutomationWebhook.user_id.in_(user_ids)))
+    webhooks: dict = {}
+    for webhook in result.scalars().all():
+        webhooks.setdefault(webhook.user_id, []).append(webhook)
+    now = int(time.time())
+    rows = [
+        WebhookOutbox(
+            webhook_id=webhook.id,
+            user_id=user_id,
+            webhook_url=webhook.webhook_url,
+            event_type=event_type,
+            payload=payload,
+            status="pending",
+            attempts=0,
+            next_attempt_at=now,
+            created_at=now,
+        )
+        for user_id, event_type, payload in events
+        for webhook in webhooks.get(user_id, [])
+    ]
+    db.add_all(rows)
+    return len(rows)
+
+def event_body(row: WebhookOutbox) -> dict:
+    return {"id": str(row.id), "type": row.event_type, "created_at": row.created_at, "data": row.payload}
+
+def is_permanent(status_code: int) -> bool:
+    """Whether retrying cannot help: the endpoint rejected the request itself."""
+    return 400 <= status_code < 500 and status_code not in (408, 429)
+
+@dataclass
+class _Breaker:
+    failures: int = 0
+    open_until: float = 0.0
+    probing: bool = False
+
+class EndpointBreakers:
+    """Consecutive-failure circuit breaker per webhook URL."""
+
+    def __init__(self):
+        self._breakers: dict[str, _Breaker] = {}
+
+    def allow(self, url: str) -> bool:
+        breaker = self._breakers.get(url)
+        if breaker is None or breaker.failures < settings.WEBHOOK_BREAKER_THRESHOLD:
+            return True
+        if time.monotonic() < breaker.open_until or breaker.probing:
+            return False
+        # Cooldown over: let one request through to see whether the endpoint is back
+        breaker.probing = True
+        return True
+
+    def retry_at(self, url: str) -> int:
+        breaker = self._breakers.get(url)
+        wait = max(breaker.open_until - time.monotonic(), 0) if breaker else 0
+        return int(time.time() + max(wait, settings.WEBHOOK_POLL_INTERVAL_SECONDS))
+
+    def record(self, url: str, ok: bool):
+        breaker = self._breakers.setdefault(url, _Breaker())
+        breaker.probing = False
+        if ok:
+            self._breakers.pop(url, None)
+        else:
+            breaker.failures += 1
+            if breaker.failures >= settings.WEBHOOK_BREAKER_THRESHOLD:
+                if breaker.failures == settings.WEBHOOK_BREAKER_THRESHOLD:
+                    logger.warning(f"Webhook {url} failed {breaker.failures} times in a row, pausing deliveries")
+                breaker.open_until = time.monotonic() + settings.WEBHOOK_BREAKER_COOLDOWN_SECONDS
+        WEBHOOK_BREAKERS_OPEN.set(sum(
+            1 for breaker in self._breakers.values() if breaker.failures >= settings.WEBHOOK_BREAKER_THRESHOLD
+        ))
+
+class WebhookDeliverer:
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._deliveries: set[asyncio.Task] = set()
+        self._active: dict[str, int] = {}  # requests in flight per URL
+        self.breakers = EndpointBreakers()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._client = httpx.AsyncClient(
+            timeout=settings.WEBHOOK_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=settings.WEBHOOK_MAX_CONNECTIONS),
+        )
+        self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Let requests in flight finish, so their events are not sent again after a restart
+        if self._deliveries:
+            _, unfinished = await asyncio.wait(self._deliveries, timeout=settings.WEBHOOK_TIMEOUT_SECONDS)
+            for task in unfinished:
+                task.cancel()
+        await self._client.aclose()
+
+    def notify(self):
+        """Wake the deliverer now rather than at its next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    def _capacity(self) -> int:
+        return max(settings.WEBHOOK_MAX_CONNECTIONS, 1) - len(self._deliveries)
+
+    async def _run(self):
+        while True:
+            try:
+                started = await self._drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook deliverer failed: {str(e)}")
+                started = 0
+            if started and self._capacity() > 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.WEBHOOK_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _claim(self, capacity: int) -> list[list[WebhookOutbox]]:
+        """Claim the due events that can be sent right away, grouped into at most ``capacity`` requests."""
+        now = int(time.time())
+        endpoint_slots = max(settings.WEBHOOK_ENDPOINT_CONCURRENCY, 1)
+        busy = [url for url, active in self._active.items() if active >= endpoint_slots]
+        async with get_db_background() as db:
+            await db.execute(
+                update(WebhookOutbox)
+                .where(WebhookOutbox.status == "delivering", WebhookOutbox.locked_at < now - stale_claim_seconds())
+                .values(status="pending")
+            )
+            query = select(WebhookOutbox).where(WebhookOutbox.status == "pending", WebhookOutbox.next_attempt_at <= now)
+            if busy:
+                # Their events wait in the table, not in this process
+                query = query.where(WebhookOutbox.webhook_url.notin_(busy))
+            result = await db.execute(
+                query.order_by(WebhookOutbox.next_attempt_at).limit(CLAIM_BATCH).with_for_update(skip_locked=True)
+            )
+            rows = result.scalars().all()
+            by_webhook: dict = {}
+            for row in rows:
+                by_webhook.setdefault(row.webhook_id, []).append(row)
+            batching = await self._batching(db, list(by_webhook)) if by_webhook else set()
+
+            requests = []
+            free: dict[str, int] = {}
+            for webhook_id, events in by_webhook.items():
+                url = events[0].webhook_url
+                size = max(settings.WEBHOOK_BATCH_SIZE, 1) if webhook_id in batching else 1
+                for index in range(0, len(events), size):
+                    free.setdefault(url, endpoint_slots - self._active.get(url, 0))
+                    if free[url] <= 0 or len(requests) >= capacity:
+                        break
+                    free[url] -= 1
+                    requests.append(events[index:index + size])
+            # Rows left out stay pending and unlocked once this transaction ends
+            for events in requests:
+                for row in events:
+                    row.status = "delivering"
+                    row.locked_at = now
+            pending = (await db.execute(
+                select(func.count()).select_from(WebhookOutbox).where(WebhookOutbox.status == "pending")
+            )).scalar_one()
+            await db.commit()
+        WEBHOOK_OUTBOX_PENDING.set(pending)
+        return requests
+
+    async def _drain_once(self) -> int:
+        capacity = self._capacity()
+        if capacity <= 0:
+            return 0
+        requests = await self._claim(capacity)
+        for events in requests:
+            self._start(events)
+        return len(requests)
+
+    async def _batching(self, db: AsyncSession, webhook_ids: list) -> set:
+        """The webhooks among ``webhook_ids`` that take several events per request."""
+        result = await db.execute(
+            select(AutomationWebhook.id).where(AutomationWebhook.id.in_(webhook_ids), AutomationWebhook.batch.is_(True))
+        )
+        return set(result.scalars().all())
+
+    def _start(self, events: list[WebhookOutbox]):
+        url = events[0].webhook_url
+        self._active[url] = self._active.get(url, 0) + 1
+        task = asyncio.create_task(self._deliver(events))
+        self._deliveries.add(task)
+        task.add_done_callback(lambda task: self._finished(task, url))
+
+    def _finished(self, task: asyncio.Task, url: str):
+        self._deliveries.discard(task)
+        self._active[url] -= 1
+        if self._active[url] <= 0:
+            del self._active[url]
+        # A slot is free again
+        self.notify()
+
+    async def _deliver(self, events: list[WebhookOutbox]):
+        url = events[0].webhook_url
+        if not self.breakers.allow(url):
+            await self._defer(events, self.breakers.retry_at(url))
+            return
+        if len(events) > 1:
+            body = {"events": [event_body(event) for event in events]}
+        else:
+            body = event_body(events[0])
+        status_code = None
+        try:
+            # Bounds the whole request, which the client's timeout only does per read
+            response = await asyncio.wait_for(
+                self._client.post(url, json=body, headers={"X-Webhook-Event": events[0].event_type}),
+                timeout=settings.WEBHOOK_TIMEOUT_SECONDS,
+            )
+            status_code = response.status_code
+            error = None if 200 <= status_code < 300 else f"{status_code}: {response.text[:500]}"
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+        # A permanent rejection is the request's fault, not a sign the endpoint is down
+        self.breakers.record(url, error is None or (status_code is not None and is_permanent(status_code)))
+        await self._record(events, error, status_code)
+
+    async def _defer(self, events: list[WebhookOutbox], retry_at: int):
+        WEBHOOK_DELIVERIES.labels("deferred").inc(len(events))
+        await self._update(
+            [event.id for event in events],
+            status="pending", locked_at=None, next_attempt_at=retry_at, last_error="Endpoint circuit open",
+        )
+
+    async def _record(self, events: list[WebhookOutbox], error: str | None, status_code: int | None):
+        now = int(time.time())
+        attempts = max(event.attempts for event in events) + 1
+        ids = [event.id for event in events]
+        if error is None:
+            WEBHOOK_DELIVERIES.labels("delivered").inc(len(events))
+            for event in events:
+                WEBHOOK_DELIVERY_LAG.observe(max(now - event.created_at, 0))
+            await self._update(ids, status="delivered", attempts=attempts, locked_at=None, delivered_at=now, last_error=None)
+        elif (status_code is not None and is_permanent(status_code)) or attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            WEBHOOK_DELIVERIES.labels("failed").inc(len(events))
+            logger.error(f"Failed to deliver {len(events)} events to webhook {events[0].webhook_url}: {error}")
+            await self._update(ids, status="failed", attempts=attempts, locked_at=None, last_error=error)
+        else:
+            delay = min(settings.WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.WEBHOOK_RETRY_MAX_SECONDS)
+            WEBHOOK_DELIVERIES.labels("retry").inc(len(events))
+            logger.warning(f"Delivering to webhook {events[0].webhook_url} failed, retrying in {delay}s: {error}")
+            await self._update(
+                ids, status="pending", attempts=attempts, locked_at=None, last_error=error,
+                next_attempt_at=now + int(delay * random.uniform(0.8, 1.2)),
+            )
+
+    async def _update(self, ids: list, **values):
+        try:
+            async with get_db_background() as db:
+                await db.execute(update(WebhookOutbox).where(WebhookOutbox.id.in_(ids)).values(**values))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to record delivery of webhook events {ids}: {str(e)}")
+
+webhook_deliverer = WebhookDeliverer()
+
+@track_job("purge_webhook_outbox")
+async def purge_webhook_outbox():
+    """Drop delivered and failed events older than WEBHOOK_OUTBOX_RETENTION_DAYS."""
+    cutoff = int(time.time()) - settings.WEBHOOK_OUTBOX_RETENTION_DAYS * 86400
+    async with get_db_background() as db:
+        await db.execute(
+            delete(WebhookOutbox).where(WebhookOutbox.status.in_(["delivered", "failed"]), WebhookOutbox.created_at < cutoff)
+        )
+        await db.commit()
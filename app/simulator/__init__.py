@@ -0,0 +1,4 @@
+"""Local simulator of the Millis API for load and integration testing."""
+
+from .config import SimulatorConfig
+from .millis import create_app
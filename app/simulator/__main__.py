@@ -0,0 +1,22 @@
+import argparse
+import uvicorn
+
+from app.simulator import SimulatorConfig, create_app
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local Millis API simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float)
+    parser.add_argument("--error-rate", type=float)
+    parser.add_argument("--rate-limit", type=float, dest="rate_limit_per_second")
+    parser.add_argument("--call-logs", type=int, dest="call_log_count")
+    parser.add_argument("--agents", type=int, dest="agent_count")
+    parser.add_argument("--seed", type=int)
+    args = vars(parser.parse_args())
+    host, port = args.pop("host"), args.pop("port")
+    overrides = {key: value for key, value in args.items() if value is not None}
+    uvicorn.run(create_app(SimulatorConfig(**overrides)), host=host, port=port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
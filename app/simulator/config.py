@@ -0,0 +1,27 @@
+import os
+from pydantic import BaseModel
+
+class SimulatorConfig(BaseModel):
+    """Behaviour of the fake Millis service. Every field can be set via MILLIS_SIM_<FIELD>."""
+    # Latency added to every request, in milliseconds
+    latency_ms: float = float(os.getenv("MILLIS_SIM_LATENCY_MS", "0"))
+    latency_jitter_ms: float = float(os.getenv("MILLIS_SIM_LATENCY_JITTER_MS", "0"))
+
+    # Fraction (0..1) of requests answered with a 5xx error
+    error_rate: float = float(os.getenv("MILLIS_SIM_ERROR_RATE", "0"))
+    error_status_code: int = int(os.getenv("MILLIS_SIM_ERROR_STATUS_CODE", "503"))
+
+    # Token bucket rate limit; 0 disables it. Excess requests get 429 + Retry-After
+    rate_limit_per_second: float = float(os.getenv("MILLIS_SIM_RATE_LIMIT_PER_SECOND", "0"))
+    rate_limit_burst: int = int(os.getenv("MILLIS_SIM_RATE_LIMIT_BURST", "20"))
+
+    # Synthetic data set, fully determined by the seed
+    seed: int = int(os.getenv("MILLIS_SIM_SEED", "42"))
+    agent_count: int = int(os.getenv("MILLIS_SIM_AGENT_COUNT", "10"))
+    call_log_count: int = int(os.getenv("MILLIS_SIM_CALL_LOG_COUNT", "1000"))
+    call_log_start_ts: float = float(os.getenv("MILLIS_SIM_CALL_LOG_START_TS", "1700000000"))
+    call_log_spacing_seconds: float = float(os.getenv("MILLIS_SIM_CALL_LOG_SPACING_SECONDS", "60"))
+
+    # Delay between streamed chat completion chunks, in milliseconds
+    chat_chunk_delay_ms: float = float(os.getenv("MILLIS_SIM_CHAT_CHUNK_DELAY_MS", "0"))
+    chat_chunk_count: int = int(os.getenv("MILLIS_SIM_CHAT_CHUNK_COUNT", "20"))
@@ -0,0 +1,62 @@
+"""
+Pytest fixtures for the Millis simulator.
+
+Enable them from a conftest.py with ``pytest_plugins = ["app.simulator.fixtures"]``.
+"""
+import socket
+import sys
+import threading
+import time
+
+from fastapi.testclient import TestClient
+import pytest
+import uvicorn
+
+from app.simulator import SimulatorConfig, create_app
+
+@pytest.fixture
+def millis_simulator_config() -> SimulatorConfig:
+    """Override in a test module to change latency, error rates or data volume."""
+    return SimulatorConfig(latency_ms=0, error_rate=0, rate_limit_per_second=0)
+
+@pytest.fixture
+def millis_simulator_app(millis_simulator_config):
+    return create_app(millis_simulator_config)
+
+@pytest.fixture
+def millis_simulator(millis_simulator_app):
+    """In-process client talking to the simulator without opening a socket."""
+    with TestClient(millis_simulator_app, base_url="http://millis-simulator") as client:
+        yield client
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def millis_simulator_server(millis_simulator_app, monkeypatch):
+    """
+    Serve the simulator on a local port and point every loaded backend module at it.
+
+    Yields the base URL. Modules import ``httpx_base_url`` by value, so each copy is patched.
+    """
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(millis_simulator_app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Millis simulator did not start")
+        time.sleep(0.01)
+
+    base_url = f"http://127.0.0.1:{port}"
+    monkeypatch.setenv("MILLIS_API_BASE_URL", base_url)
+    for name, module in list(sys.modules.items()):
+        if name.startswith("app.") and isinstance(getattr(module, "httpx_base_url", None), str):
+            monkeypatch.setattr(module, "httpx_base_url", base_url)
+    yield base_url
+
+    server.should_exit = True
+    thread.join(timeout=10)
@@ -0,0 +1,497 @@
+"""
+Fake Millis API implementing the endpoints this backend calls.
+
+Run standalone with ``python -m app.simulator`` and point the backend at it with
+``MILLIS_API_BASE_URL=http://127.0.0.1:9000``.
+"""
+import asyncio
+import json
+import random
+import time
+
+from fastapi import APIRouter, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from app.simulator.config import SimulatorConfig
+from app.simulator.store import SimulatorStore
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+
+    def take(self) -> float:
+        """Consume a token. Returns 0 on success, otherwise seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+def _route_key(request: Request) -> str:
+    route = request.scope.get("route")
+    return f"{request.method} {getattr(route, 'path', request.url.path)}"
+
+def create_app(config: SimulatorConfig | None = None) -> FastAPI:
+    """Build a simulator app. Each app owns its own state, so tests can run several side by side."""
+    config = config or SimulatorConfig()
+    app = FastAPI(title="Millis API simulator")
+    app.state.config = config
+    app.state.store = SimulatorStore(config)
+    app.state.bucket = _TokenBucket(config.rate_limit_per_second, config.rate_limit_burst)
+    app.state.rng = random.Random(config.seed)
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        if request.url.path.startswith("/_sim"):
+            return await call_next(request)
+        current = app.state.config
+        if current.rate_limit_per_second > 0:
+            retry_after = app.state.bucket.take()
+            if retry_after:
+                return JSONResponse(
+                    status_code=429,
+                    content={"detail": "Rate limit exceeded"},
+                    headers={"Retry-After": f"{retry_after:.3f}"},
+                )
+        if current.latency_ms or current.latency_jitter_ms:
+            delay = current.latency_ms + app.state.rng.uniform(-1, 1) * current.latency_jitter_ms
+            await asyncio.sleep(max(delay, 0) / 1000)
+        if current.error_rate and app.state.rng.random() < current.error_rate:
+            return JSONResponse(status_code=current.error_status_code, content={"detail": "Simulated upstream error"})
+        response = await call_next(request)
+        app.state.store.count_request(_route_key(request))
+        return response
+
+    app.include_router(_admin_router())
+    app.include_router(_agents_router())
+    app.include_router(_call_logs_router())
+    app.include_router(_campaigns_router())
+    app.include_router(_phones_router())
+    app.include_router(_chat_router())
+    app.include_router(_voices_router())
+    app.include_router(_knowledge_router())
+    app.include_router(_sip_router())
+    app.include_router(_calls_router())
+    return app
+
+def _store(request: Request) -> SimulatorStore:
+    return request.app.state.store
+
+def _get_or_404(items: dict, key: str, kind: str) -> dict:
+    item = items.get(key)
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"{kind} {key} not found")
+    return item
+
+def _admin_router() -> APIRouter:
+    router = APIRouter(prefix="/_sim")
+
+    @router.get("/config")
+    async def get_config(request: Request):
+        return request.app.state.config
+
+    @router.put("/config")
+    async def update_config(request: Request, changes: dict):
+        """Change latency, error rate or rate limit while the simulator is running."""
+        config = request.app.state.config.model_copy(update=changes)
+        request.app.state.config = config
+        request.app.state.bucket = _TokenBucket(config.rate_limit_per_second, config.rate_limit_burst)
+        return config
+
+    @router.get("/stats")
+    async def get_stats(request: Request):
+        return {"requests": _store(request).request_counts}
+
+    @router.post("/reset")
+    async def reset(request: Request):
+        request.app.state.store = SimulatorStore(request.app.state.config)
+        return {"status": "ok"}
+
+    return router
+
+def _agents_router() -> APIRouter:
+    router = APIRouter(prefix="/agents")
+
+    @router.get("")
+    async def list_agents(request: Request):
+        return list(_store(request).agents.values())
+
+    @router.post("")
+    async def create_agent(request: Request):
+        body = json.loads(await request.body() or b"{}")
+        store = _store(request)
+        agent = {
+            "id": store.new_id("agent"),
+            "name": body.get("name"),
+            "config": body.get("config") or {},
+            "metadata": body.get("metadata") or {},
+            "status": "active",
+            "created_at": store.now(),
+        }
+        store.agents[agent["id"]] = agent
+        return agent
+
+    @router.get("/{agent_id}")
+    async def get_agent(agent_id: str, request: Request):
+        return _get_or_404(_store(request).agents, agent_id, "Agent")
+
+    @router.put("/{agent_id}")
+    async def update_agent(agent_id: str, request: Request):
+        agent = _get_or_404(_store(request).agents, agent_id, "Agent")
+        body = json.loads(await request.body() or b"{}")
+        if body.get("name") is not None:
+            agent["name"] = body["name"]
+        agent["config"] = {**agent.get("config", {}), **(body.get("config") or {})}
+        return "ok"
+
+    @router.delete("/{agent_id}")
+    async def delete_agent(agent_id: str, request: Request):
+        _get_or_404(_store(request).agents, agent_id, "Agent")
+        _store(request).agents.pop(agent_id)
+        return "ok"
+
+    @router.post("/{agent_id}/duplicate")
+    async def duplicate_agent(agent_id: str, request: Request):
+        store = _store(request)
+        agent = _get_or_404(store.agents, agent_id, "Agent")
+        copy = {**json.loads(json.dumps(agent)), "id": store.new_id("agent"), "created_at": store.now()}
+        copy["name"] = f"{agent.get('name')} (copy)"
+        store.agents[copy["id"]] = copy
+        return copy
+
+    @router.post("/{agent_id}/status")
+    async def set_status(agent_id: str, body: dict, request: Request):
+        agent = _get_or_404(_store(request).agents, agent_id, "Agent")
+        agent["status"] = body.get("status")
+        return "ok"
+
+    @router.post("/{agent_id}/embed")
+    async def set_embed(agent_id: str, body: dict, request: Request):
+        agent = _get_or_404(_store(request).agents, agent_id, "Agent")
+        agent["embed"] = body
+        return "ok"
+
+    @router.get("/{agent_id}/call-histories")
+    async def call_histories(agent_id: str, request: Request, limit: int = 20, start_at: float = None):
+        _get_or_404(_store(request).agents, agent_id, "Agent")
+        return _store(request).agent_call_histories(agent_id, limit, start_at)
+
+    return router
+
+def _call_logs_router() -> APIRouter:
+    router = APIRouter(prefix="/call-logs")
+
+    @router.get("")
+    async def list_call_logs(request: Request, limit: int = 100, start_after_ts: float = None, start_time: float = None):
+        return _store(request).list_call_logs(min(limit, 100), start_after_ts, start_time)
+
+    @router.delete("/{session_id}")
+    async def delete_call_log(session_id: str, request: Request):
+        _store(request).deleted_sessions.add(session_id)
+        return "ok"
+
+    return router
+
+def _campaigns_router() -> APIRouter:
+    router = APIRouter(prefix="/campaigns")
+
+    @router.get("")
+    async def list_campaigns(request: Request):
+        return list(_store(request).campaigns.values())
+
+    @router.post("")
+    async def create_campaign(body: dict, request: Request):
+        store = _store(request)
+        campaign = {
+            "id": store.new_id("campaign"),
+            "name": body.get("name"),
+            "status": "idle",
+            "records": [],
+            "caller": None,
+            "include_metadata_in_prompt": False,
+            "created_at": store.now(),
+        }
+        store.campaigns[campaign["id"]] = campaign
+        return campaign
+
+    @router.get("/{campaign_id}/info")
+    async def get_info(campaign_id: str, request: Request):
+        return _get_or_404(_store(request).campaigns, campaign_id, "Campaign")
+
+    @router.put("/{campaign_id}/info")
+    async def update_info(campaign_id: str, body: dict, request: Request):
+        campaign = _get_or_404(_store(request).campaigns, campaign_id, "Campaign")
+        campaign.update({k: v for k, v in body.items() if v is not None})
+        return campaign
+
+    @router.post("/{campaign_id}/records")
+    async def upload_records(campaign_id: str, records: list[dict], request: Request):
+        campaign = _get_or_404(_store(request).campaigns, campaign_id, "Campaign")
+        existing = {record.get("phone"): record for record in campaign["records"]}
+        for record in records:
+            existing.setdefault(record.get("phone"), record)
+        campaign["records"] = list(existing.values())
+        return "ok"
+
+    @router.delete("/{campaign_id}/records/{phone}")
+    async def delete_record(campaign_id: str, phone: str, request: Request):
+        campaign = _get_or_404(_store(request).campaigns, campaign_id, "Campaign")
+        campaign["records"] = [record for record in campaign["records"] if record.get("phone") != phone]
+        return "ok"
+
+    @router.post("/{campaign_id}/set_caller")
+    async def set_caller(campaign_id: str, body: dict, request: Request):
+        campaign = _get_or_404(_store(request).campaigns, campaign_id, "Campaign")
+        campaign["caller"] = body.get("caller")
+        return "ok"
+
+    @router.post("/{campaign_id}/start")
+    async def start(campaign_id: str, request: Request):
+        _get_or_404(_store(request).campaigns, campaign_id, "Campaign")["status"] = "started"
+        return "ok"
+
+    @router.post("/{campaign_id}/stop")
+    async def stop(campaign_id: str, request: Request):
+        _get_or_404(_store(request).campaigns, campaign_id, "Campaign")["status"] = "paused"
+        return "ok"
+
+    @router.delete("/{campaign_id}")
+    async def delete(campaign_id: str, request: Request):
+        _get_or_404(_store(request).campaigns, campaign_id, "Campaign")
+        _store(request).campaigns.pop(campaign_id)
+        return "ok"
+
+    return router
+
+def _phones_router() -> APIRouter:
+    router = APIRouter()
+
+    def _new_phone(store: SimulatorStore, number: str, body: dict) -> dict:
+        phone = {"id": number, "agent_id": None, "tags": [], "status": "active", "created_at": store.now(), **body}
+        store.phones[number] = phone
+        return phone
+
+    @router.get("/phones")
+    async def list_phones(request: Request):
+        return list(_store(request).phones.values())
+
+    @router.post("/phones/import")
+    async def import_phone(body: dict, request: Request):
+        _new_phone(_store(request), body.get("phone"), body)
+        return "ok"
+
+    @router.post("/phones/purchase", response_class=PlainTextResponse)
+    async def purchase_phone(body: dict, request: Request):
+        store = _store(request)
+        number = f"+1{body.get('area_code', '555')}{len(store.phones):07d}"
+        _new_phone(store, number, body)
+        return number
+
+    @router.get("/phones/{phone_id}")
+    async def get_phone(phone_id: str, request: Request):
+        return _get_or_404(_store(request).phones, phone_id, "Phone")
+
+    @router.put("/phones/{phone_id}")
+    async def update_phone(phone_id: str, body: dict, request: Request):
+        _get_or_404(_store(request).phones, phone_id, "Phone").update(body)
+        return "ok"
+
+    @router.delete("/phones/{phone_id}")
+    async def delete_phone(phone_id: str, request: Request):
+        _get_or_404(_store(request).phones, phone_id, "Phone")
+        _store(request).phones.pop(phone_id)
+        return "ok"
+
+    @router.post("/phones/{phone_id}/agent-config-override")
+    async def set_override(phone_id: str, body: dict, request: Request):
+        _get_or_404(_store(request).phones, phone_id, "Phone")["agent_config_override"] = body
+        return "ok"
+
+    @router.post("/phones/{phone_id}/set_agent")
+    async def set_agent(phone_id: str, body: dict, request: Request):
+        _get_or_404(_store(request).phones, phone_id, "Phone")["agent_id"] = body.get("agent_id")
+        return "ok"
+
+    @router.post("/set_phone_agent")
+    async def set_phone_agent(body: dict, request: Request):
+        _get_or_404(_store(request).phones, body.get("phone"), "Phone")["agent_id"] = body.get("agent_id")
+        return "ok"
+
+    return router
+
+def _chat_router() -> APIRouter:
+    router = APIRouter()
+
+    @router.post("/chat/completions")
+    async def chat_completions(body: dict, request: Request):
+        config = request.app.state.config
+        messages = body.get("messages") or []
+        last = messages[-1].get("content", "") if messages else ""
+
+        async def stream():
+            for index in range(config.chat_chunk_count):
+                if config.chat_chunk_delay_ms:
+                    await asyncio.sleep(config.chat_chunk_delay_ms / 1000)
+                chunk = {"type": "content", "index": index, "content": f"token{index} "}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield f"data: {json.dumps({'type': 'end', 'echo': last})}\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @router.post("/openai/v1/chat/completions")
+    async def openai_chat_completions(body: dict, request: Request):
+        """
+        OpenAI-compatible stub, so prompt generation can run offline with
+        ``OPENAI_BASE_URL=http://127.0.0.1:9000/openai/v1``.
+        """
+        config = request.app.state.config
+        created = int(time.time())
+        model = body.get("model", "gpt-4o-mini")
+        tokens = [f"prompt{index} " for index in range(config.chat_chunk_count)]
+
+        if not body.get("stream"):
+            if config.chat_chunk_delay_ms:
+                await asyncio.sleep(config.chat_chunk_delay_ms * len(tokens) / 1000)
+            return {
+                "id": "chatcmpl-sim",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+            }
+
+        def chunk(delta: dict, finish_reason: str | None = None) -> str:
+            payload = {
+                "id": "chatcmpl-sim",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def stream():
+            yield chunk({"role": "assistant", "content": ""})
+            for token in tokens:
+                if config.chat_chunk_delay_ms:
+                    await asyncio.sleep(config.chat_chunk_delay_ms / 1000)
+                yield chunk({"content": token})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return router
+
+def _voices_router() -> APIRouter:
+    router = APIRouter(prefix="/voices")
+    voices = [
+        {"voice_id": f"sim-voice-{index}", "name": f"Voice {index}", "provider": "simulator"}
+        for index in range(12)
+    ]
+
+    @router.get("")
+    async def list_voices(lang_code: str = "en"):
+        return [{**voice, "lang_code": lang_code} for voice in voices]
+
+    @router.get("/custom")
+    async def list_custom_voices(lang_code: str = "en"):
+        return [{**voice, "lang_code": lang_code, "custom": True} for voice in voices[:2]]
+
+    return router
+
+def _knowledge_router() -> APIRouter:
+    router = APIRouter()
+
+    @router.post("/knowledge/generate_presigned_url")
+    async def generate_presigned_url(body: dict, request: Request):
+        store = _store(request)
+        file_id = store.new_id("file")
+        object_key = f"knowledge/{file_id}_{body.get('filename', 'file')}"
+        return {"url": f"{str(request.base_url).rstrip('/')}/_uploads/{object_key}", "object_key": object_key}
+
+    @router.put("/_uploads/{object_key:path}")
+    async def upload(object_key: str, request: Request):
+        _store(request).uploads[object_key] = await request.body()
+        return "ok"
+
+    @router.post("/knowledge/create_file")
+    async def create_file(request: Request):
+        body = json.loads(await request.body() or b"{}")
+        store = _store(request)
+        file_id = body.get("object_key", "/").split("/")[1].split("_")[0]
+        store.files[file_id] = {"id": file_id, **body, "created_at": store.now()}
+        return store.files[file_id]
+
+    @router.post("/knowledge/delete_file")
+    async def delete_file(body: dict, request: Request):
+        _get_or_404(_store(request).files, body.get("id"), "File")
+        _store(request).files.pop(body.get("id"))
+        return "ok"
+
+    @router.post("/knowledge/set_agent_files")
+    async def set_agent_files(body: dict, request: Request):
+        _store(request).agent_files[body.get("agent_id")] = body.get("files") or []
+        return "ok"
+
+    @router.get("/knowledge/list_files")
+    async def list_files(request: Request):
+        return list(_store(request).files.values())
+
+    return router
+
+def _sip_router() -> APIRouter:
+    router = APIRouter()
+
+    @router.post("/sip")
+    async def create_sip(body: dict, request: Request):
+        store = _store(request)
+        call_id = store.new_id("sip")
+        store.sips[call_id] = body
+        return {"sip": call_id, "uri": f"sip:{call_id}@sip.simulator.invalid"}
+
+    @router.delete("/sip/{call_id}")
+    async def delete_sip(call_id: str, request: Request):
+        _store(request).sips.pop(call_id, None)
+        return "ok"
+
+    @router.post("/webrtc/offer")
+    async def webrtc_offer(body: dict):
+        return {"sdp": "v=0\r\n", "type": "answer", "agent_id": body.get("agent_id")}
+
+    return router
+
+def _calls_router() -> APIRouter:
+    router = APIRouter()
+
+    @router.post("/register_call")
+    async def register_call(request: Request):
+        return {"session_id": _store(request).new_id("session"), "status": "registered"}
+
+    @router.post("/register_sip_call", response_class=PlainTextResponse)
+    async def register_sip_call(request: Request):
+        return _store(request).new_id("sip-session")
+
+    @router.post("/start_outbound_call")
+    async def start_outbound_call(request: Request):
+        return {"session_id": _store(request).new_id("session"), "status": "queued"}
+
+    @router.post("/sessions/{session_id}/terminate")
+    async def terminate(session_id: str):
+        return "ok"
+
+    @router.get("/user/info")
+    async def user_info():
+        return {"id": "sim-user", "credit": 1_000_000}
+
+    return router
@@ -0,0 +1,143 @@
+"""In-memory state and deterministic synthetic data for the Millis simulator."""
+import itertools
+import json
+import random
+import time
+
+from app.simulator.config import SimulatorConfig
+
+CALL_STATUSES = [
+    "user-ended", "agent-ended", "api-ended", "in-progress", "chat_completion",
+    "voicemail-hangup", "voicemail-message", "no-answer", "timeout", "canceled",
+    "busy", "failed", "error",
+]
+
+class SimulatorStore:
+    """
+    Holds every resource the fake Millis API knows about.
+
+    Call logs are never materialised: log ``i`` is derived from ``(seed, i)``,
+    so millions of logs can be paged through with constant memory.
+    """
+
+    def __init__(self, config: SimulatorConfig):
+        self.config = config
+        self._ids = itertools.count(1)
+        self.agents: dict[str, dict] = {}
+        self.campaigns: dict[str, dict] = {}
+        self.phones: dict[str, dict] = {}
+        self.files: dict[str, dict] = {}
+        self.uploads: dict[str, bytes] = {}
+        self.agent_files: dict[str, list[str]] = {}
+        self.sips: dict[str, dict] = {}
+        self.deleted_sessions: set[str] = set()
+        self.request_counts: dict[str, int] = {}
+        for index in range(config.agent_count):
+            agent_id = agent_id_for(index)
+            self.agents[agent_id] = {
+                "id": agent_id,
+                "name": f"Simulated Agent {index}",
+                "config": {"prompt": f"You are simulated agent {index}."},
+                "status": "active",
+                "created_at": int(config.call_log_start_ts),
+            }
+
+    def new_id(self, prefix: str) -> str:
+        # The "n" keeps created ids apart from the seeded ones (sim-agent-0, sim-agent-1, ...)
+        return f"sim-{prefix}-n{next(self._ids)}"
+
+    # Call logs
+
+    def call_log_ts(self, index: int) -> float:
+        rng = random.Random(self.config.seed * 1_000_003 + index)
+        spacing = self.config.call_log_spacing_seconds
+        # Jitter stays below half the spacing so ts order always equals index order
+        return round(self.config.call_log_start_ts + index * spacing + rng.random() * spacing * 0.5, 3)
+
+    def call_log(self, index: int) -> dict:
+        rng = random.Random(self.config.seed * 1_000_003 + index)
+        rng.random()  # consumed by call_log_ts
+        agent_id = agent_id_for(rng.randrange(max(self.config.agent_count, 1)))
+        duration = round(rng.uniform(5, 600), 2)
+        turns = rng.randint(1, 6)
+        chat = [
+            {"role": "user" if turn % 2 == 0 else "assistant", "content": f"Simulated message {turn} of call {index}"}
+            for turn in range(turns)
+        ]
+        return {
+            "agent_id": agent_id,
+            "agent_config": {"prompt": "simulated"},
+            "duration": duration,
+            "ts": self.call_log_ts(index),
+            "chat": json.dumps(chat),
+            "chars_used": float(sum(len(message["content"]) for message in chat)),
+            "session_id": f"sim-session-{index}",
+            "call_id": f"sim-call-{index}",
+            "cost_breakdown": [
+                {"type": "llm", "credit": round(duration * rng.uniform(0.01, 0.05), 4)},
+                {"type": "tts", "credit": round(duration * rng.uniform(0.01, 0.03), 4)},
+                {"type": "voip", "credit": round(duration * 0.01, 4)},
+            ],
+            "voip": {"from": f"+1555{rng.randint(1000000, 9999999)}", "to": f"+1555{rng.randint(1000000, 9999999)}"},
+            "recording": {"recording_url": f"https://recordings.invalid/{index}.wav"},
+            "metadata": {"index": index},
+            "function_calls": [],
+            "call_status": rng.choice(CALL_STATUSES),
+        }
+
+    def _first_index_at_or_after(self, ts: float) -> int:
+        """Smallest index whose ts is >= ts (binary search over the implicit sorted sequence)."""
+        low, high = 0, self.config.call_log_count
+        while low < high:
+            mid = (low + high) // 2
+            if self.call_log_ts(mid) < ts:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def list_call_logs(self, limit: int, start_after_ts: float = None, start_time: float = None) -> dict:
+        """
+        Page through call logs newest first, matching the Millis cursor semantics:
+        ``start_after_ts`` returns logs older than the cursor, ``start_time`` logs at or after it.
+        """
+        end = self.config.call_log_count
+        begin = 0
+        if start_after_ts:
+            end = self._first_index_at_or_after(start_after_ts)
+        if start_time:
+            begin = self._first_index_at_or_after(start_time)
+        histories = []
+        index = end - 1
+        while index >= begin and len(histories) < limit:
+            if f"sim-session-{index}" not in self.deleted_sessions:
+                histories.append(self.call_log(index))
+            index -= 1
+        next_cursor = histories[-1]["ts"] if histories and index >= begin else None
+        return {"histories": histories, "next_cursor": next_cursor}
+
+    def agent_call_histories(self, agent_id: str, limit: int, start_at: float = None) -> dict:
+        histories = []
+        index = self.config.call_log_count - 1
+        if start_at:
+            index = self._first_index_at_or_after(start_at) - 1
+        # Bounded scan so a very large data set cannot stall the simulator
+        scanned = 0
+        while index >= 0 and len(histories) < limit and scanned < 100_000:
+            log = self.call_log(index)
+            if log["agent_id"] == agent_id:
+                histories.append(log)
+            index -= 1
+            scanned += 1
+        return {"histories": histories, "next_cursor": histories[-1]["ts"] if histories and index >= 0 else None}
+
+    # Misc
+
+    def count_request(self, key: str):
+        self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+    def now(self) -> int:
+        return int(time.time())
+
+def agent_id_for(index: int) -> str:
+    return f"sim-agent-{index}"
@@ -15,6 +15,7 @@ from app.core.config import settings
 from app.models import User, OAuthAccount, VerificationCode
 from app.core.database import get_db
 from app.utils.email import email_service
+from app.utils.email_templates import locale_from_accept_language
 
 class UserDatabase(SQLAlchemyUserDatabase[User, OAuthAccount]):
     async def get_by_oauth_account(self, oauth: str, account_id: str) -> Optional[User]:
@@ -82,7 +83,8 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
         try:
             email_sent = await email_service.send_verification_email(
                 to_email=user.email,
-                verification_code=verification_code
+                verification_code=verification_code,
+                locale=locale_from_accept_language(request.headers.get("accept-language")) if request else None
             )
             if email_sent:
                 logging.info(f"Verification email sent successfully to {user.email}")
@@ -0,0 +1,43 @@
+import re
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def _pieces(text: str, max_chars: int):
+    """Paragraphs, split further into sentences and then hard-wrapped when too long."""
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            yield paragraph
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > max_chars // 2 else max_chars
+                yield sentence[:cut].strip()
+                sentence = sentence[cut:]
+            if sentence.strip():
+                yield sentence.strip()
+
+def chunk_text(text: str, max_chars: int = 1200, overlap: int = 200) -> list[str]:
+    """
+    Split text into chunks of at most ``max_chars``, preferring paragraph and sentence
+    boundaries. Each chunk starts with up to ``overlap`` characters of the previous one so
+    a passage cut at a boundary can still be matched.
+    """
+    chunks: list[str] = []
+    current = ""
+    for piece in _pieces(text, max_chars):
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current)
+            tail = current[-overlap:] if overlap else ""
+            # Start the overlap on a word boundary
+            space = tail.find(" ")
+            tail = tail[space + 1:] if space != -1 else tail
+            current = tail if len(tail) + len(piece) + 1 <= max_chars else ""
+        current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
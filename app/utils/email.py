@@ -1,177 +1,98 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from typing import Optional
 import logging
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
 from app.core.config import settings
+from app.services.email_sender import enqueue_email
+from app.utils.email_templates import email_templates
 
 logger = logging.getLogger(__name__)
 
 class EmailService:
-    """Service for sending emails via SMTP."""
+    """Service for sending emails via SMTP, through the email outbox."""
     
-    def __init__(self):
-        self.smtp_server = settings.SMTP_SERVER
-        self.smtp_port = settings.SMTP_PORT
-        self.smtp_username = settings.SMTP_USERNAME
-        self.smtp_password = settings.SMTP_PASSWORD
-        self.from_email = settings.SMTP_FROM_EMAIL
-        self.from_name = settings.SMTP_FROM_NAME
-        self.use_tls = settings.SMTP_USE_TLS
-        self.executor = ThreadPoolExecutor(max_workers=3)
-    
-    def _send_email_sync(
+    async def send_email(
         self,
         to_email: str,
         subject: str,
         html_content: str,
-        text_content: Optional[str] = None
+        text_content: Optional[str] = None,
+        kind: Optional[str] = None
     ) -> bool:
         """
-        Synchronous email sending function to run in thread pool.
+        Queue an email for delivery by the background SMTP sender.
         
         Args:
             to_email: Recipient email address
             subject: Email subject
             html_content: HTML email body
             text_content: Plain text email body (optional)
+            kind: Label stored with the message, e.g. "verification" (optional)
             
         Returns:
-            True if email sent successfully, False otherwise
+            True if email was queued successfully, False otherwise
         """
-        try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = f"{self.from_name} <{self.from_email}>"
-            msg['To'] = to_email
-            
-            # Add text and HTML parts
-            if text_content:
-                text_part = MIMEText(text_content, 'plain')
-                msg.attach(text_part)
-            
-            html_part = MIMEText(html_content, 'html')
-            msg.attach(html_part)
-            
-            # Connect to SMTP server and send
-            with smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30) as server:
-                if self.use_tls:
-                    server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
-            
-            logger.info(f"Email sent successfully to {to_email}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to send email to {to_email}: {str(e)}")
-            return False
-        
-    async def send_email(
+        return await enqueue_email(to_email, subject, html_content, text_content, kind)
+    
+    async def send_template_email(
         self,
         to_email: str,
-        subject: str,
-        html_content: str,
-        text_content: Optional[str] = None
+        template: str,
+        locale: Optional[str] = None,
+        **values
     ) -> bool:
         """
-        Send an email via SMTP (async wrapper).
+        Render an email template (app/templates/email) and queue it.
         
         Args:
             to_email: Recipient email address
-            subject: Email subject
-            html_content: HTML email body
-            text_content: Plain text email body (optional)
+            template: Template name, e.g. "password_reset"
+            locale: Preferred locale, e.g. "es" (optional, falls back to the default)
+            **values: Template variables
             
         Returns:
-            True if email sent successfully, False otherwise
+            True if email was queued successfully, False otherwise
         """
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            self.executor,
-            self._send_email_sync,
-            to_email,
-            subject,
-            html_content,
-            text_content
+        try:
+            rendered = email_templates.render(template, locale, **values)
+        except Exception as e:
+            logger.error(f"Failed to render email template {template}: {str(e)}")
+            return False
+        return await self.send_email(
+            to_email=to_email,
+            subject=rendered.subject,
+            html_content=rendered.html,
+            text_content=rendered.text,
+            kind=template
         )
     
     async def send_verification_email(
         self,
         to_email: str,
-        verification_code: Optional[str] = None
+        verification_code: Optional[str] = None,
+        locale: Optional[str] = None
     ) -> bool:
         """
-        Send email verification email with either a URL or code.
+        Send email verification email with a code.
         
         Args:
             to_email: Recipient email address
-            verification_url: URL for email verification
-            verification_code: Optional verification code (alternative to URL)
+            verification_code: Verification code
+            locale: Preferred locale (optional)
             
         Returns:
-            True if email sent successfully, False otherwise
+            True if email was queued successfully, False otherwise
         """
-        app_name = settings.APP_NAME
-
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Verify Your Email</title>
-        </head>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
-            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 30px; text-align: center; border-radius: 10px 10px 0 0;">
-                <h1 style="color: white; margin: 0;">Verify Your Email</h1>
-            </div>
-            <div style="background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; border: 1px solid #e0e0e0;">
-                <p style="font-size: 16px; margin-bottom: 20px;">Hello,</p>
-                <p style="font-size: 16px; margin-bottom: 20px;">
-                    Thank you for registering with {app_name}! Please verify your email address by entering the verification code below:
-                </p>
-                <div style="background: white; padding: 20px; border-radius: 8px; border: 2px solid #667eea; text-align: center; margin: 30px 0;">
-                    <p style="font-size: 14px; color: #666; margin: 0 0 10px 0;">Your verification code is:</p>
-                    <p style="font-size: 32px; font-weight: bold; color: #667eea; letter-spacing: 5px; margin: 0;">{verification_code}</p>
-                </div>
-                <p style="font-size: 14px; color: #666; margin-top: 20px;">
-                    This code will expire in 24 hours. If you didn't create an account with {app_name}, please ignore this email.
-                </p>
-            </div>
-            <div style="text-align: center; margin-top: 20px; padding-top: 20px; border-top: 1px solid #e0e0e0; color: #999; font-size: 12px;">
-                <p>© {app_name}. All rights reserved.</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Verify Your Email
-        
-        Hello,
-        
-        Thank you for registering with {app_name}! Please verify your email address by entering the verification code below:
-        
-        Verification Code: {verification_code}
-        
-        This code will expire in 24 hours. If you didn't create an account with {app_name}, please ignore this email.
-        """
-
-        return await self.send_email(
-            to_email=to_email,
-            subject=f"Verify Your {app_name} Email Address",
-            html_content=html_content,
-            text_content=text_content
+        return await self.send_template_email(
+            to_email,
+            "verification",
+            locale,
+            verification_code=verification_code
         )
 
     async def send_password_reset_email(
         self,
         to_email: str,
-        reset_token: str
+        reset_token: str,
+        locale: Optional[str] = None
     ) -> bool:
         """
         Send password reset email with a reset token.
@@ -179,70 +100,18 @@ class EmailService:
         Args:
             to_email: Recipient email address
             reset_token: Password reset token
+            locale: Preferred locale (optional)
             
         Returns:
-            True if email sent successfully, False otherwise
+            True if email was queued successfully, False otherwise
         """
-        app_name = settings.APP_NAME
         # Construct the reset URL - this will be the frontend URL
         reset_url = f"{settings.FRONTEND_URL}/reset-password?token={reset_token}"
-
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Reset Your Password</title>
-        </head>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
-            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 30px; text-align: center; border-radius: 10px 10px 0 0;">
-                <h1 style="color: white; margin: 0;">Reset Your Password</h1>
-            </div>
-            <div style="background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; border: 1px solid #e0e0e0;">
-                <p style="font-size: 16px; margin-bottom: 20px;">Hello,</p>
-                <p style="font-size: 16px; margin-bottom: 20px;">
-                    We received a request to reset your password for your {app_name} account. Click the button below to reset your password:
-                </p>
-                <div style="text-align: center; margin: 30px 0;">
-                    <a href="{reset_url}" style="display: inline-block; padding: 15px 30px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; text-decoration: none; border-radius: 8px; font-weight: bold; font-size: 16px;">
-                        Reset Password
-                    </a>
-                </div>
-                <p style="font-size: 14px; color: #666; margin-top: 20px;">
-                    Or copy and paste this link into your browser:
-                </p>
-                <p style="font-size: 12px; color: #667eea; word-break: break-all; background: white; padding: 10px; border-radius: 5px; border: 1px solid #e0e0e0;">
-                    {reset_url}
-                </p>
-                <p style="font-size: 14px; color: #666; margin-top: 20px;">
-                    This link will expire in 1 hour. If you didn't request a password reset, please ignore this email or contact support if you have concerns.
-                </p>
-            </div>
-            <div style="text-align: center; margin-top: 20px; padding-top: 20px; border-top: 1px solid #e0e0e0; color: #999; font-size: 12px;">
-                <p>© {app_name}. All rights reserved.</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Reset Your Password
-        
-        Hello,
-        
-        We received a request to reset your password for your {app_name} account. Click the link below to reset your password:
-        
-        {reset_url}
-        
-        This link will expire in 1 hour. If you didn't request a password reset, please ignore this email or contact support if you have concerns.
-        """
-
-        return await self.send_email(
-            to_email=to_email,
-            subject=f"Reset Your {app_name} Password",
-            html_content=html_content,
-            text_content=text_content
+        return await self.send_template_email(
+            to_email,
+            "password_reset",
+            locale,
+            reset_url=reset_url
         )
 
 # Global email service instance
@@ -0,0 +1,113 @@
+"""
+Email templates, compiled once and rendered per message.
+
+Each email is one Jinja2 file per locale, ``app/templates/email/<locale>/<name>.jinja``,
+with ``subject``, ``title``, ``html`` and ``text`` blocks. The HTML body is wrapped in the
+locale's ``_layout.html``. Layouts only depend on settings, so they are rendered once per
+locale at load time and cached as static segments around the title and content; a send
+renders just the email's own blocks. Locales fall back from ``es-MX`` to ``es`` to
+EMAIL_DEFAULT_LOCALE.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+import re
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, Template
+from markupsafe import Markup
+
+from app.core.config import settings
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates" / "email"
+
+_TITLE = "\x00title\x00"
+_CONTENT = "\x00content\x00"
+_SLOTS = re.compile("(\x00title\x00|\x00content\x00)")
+
+@dataclass
+class RenderedEmail:
+    subject: str
+    html: str
+    text: str
+
+class EmailTemplates:
+    def __init__(self, directory: Path = TEMPLATE_DIR):
+        self.directory = directory
+        self.env = Environment(
+            loader=FileSystemLoader(str(directory)),
+            autoescape=True,
+            auto_reload=False,
+            undefined=StrictUndefined,
+            trim_blocks=True,
+            lstrip_blocks=True,
+        )
+        self._templates: dict[tuple[str, str], Template] = {}
+        self._layouts: dict[str, list[str]] = {}
+        self.locales: list[str] = []
+        self.loaded = False
+
+    def load(self):
+        """Compile every template and pre-render the layouts."""
+        self.env.globals.update(app_name=settings.APP_NAME, frontend_url=settings.FRONTEND_URL)
+        self.locales = sorted(path.name for path in self.directory.iterdir() if path.is_dir())
+        for locale in self.locales:
+            for path in sorted((self.directory / locale).glob("*.jinja")):
+                self._templates[(locale, path.stem)] = self.env.get_template(f"{locale}/{path.name}")
+            layout = self.env.get_template(f"{locale}/_layout.html").render(
+                title=Markup(_TITLE), content=Markup(_CONTENT)
+            )
+            self._layouts[locale] = _SLOTS.split(layout)
+        self.loaded = True
+
+    def resolve_locale(self, locale: str | None, name: str) -> str:
+        candidates = []
+        if locale:
+            locale = locale.replace("_", "-").lower()
+            candidates += [locale, locale.split("-")[0]]
+        candidates.append(settings.EMAIL_DEFAULT_LOCALE)
+        for candidate in candidates:
+            if (candidate, name) in self._templates:
+                return candidate
+        raise KeyError(f"No email template {name} for locale {locale or settings.EMAIL_DEFAULT_LOCALE}")
+
+    @staticmethod
+    def _block(template: Template, block: str, context) -> str:
+        return "".join(template.blocks[block](context)).strip()
+
+    def render(self, name: str, locale: str | None = None, **values) -> RenderedEmail:
+        if not self.loaded:
+            self.load()
+        locale = self.resolve_locale(locale, name)
+        template = self._templates[(locale, name)]
+        context = template.new_context(dict(values, locale=locale))
+        # The title block is autoescaped HTML, like the content
+        title = self._block(template, "title", context)
+        content = self._block(template, "html", context)
+        segments = self._layouts.get(locale) or self._layouts[settings.EMAIL_DEFAULT_LOCALE]
+        body = "".join(
+            title if segment == _TITLE else content if segment == _CONTENT else segment
+            for segment in segments
+        )
+        return RenderedEmail(
+            subject=self._block(template, "subject", context),
+            html=body,
+            text=self._block(template, "text", context) + "\n",
+        )
+
+email_templates = EmailTemplates()
+
+def locale_from_accept_language(header: str | None) -> str | None:
+    """The highest-weighted language in an Accept-Language header, e.g. ``es-MX``."""
+    if not header:
+        return None
+    best, best_weight = None, 0.0
+    for part in header.split(","):
+        tag, _, params = part.strip().partition(";")
+        weight = 1.0
+        if params.strip().startswith("q="):
+            try:
+                weight = float(params.strip()[2:])
+            except ValueError:
+                continue
+        if tag and tag != "*" and weight > best_weight:
+            best, best_weight = tag, weight
+    return best
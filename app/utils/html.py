@@ -0,0 +1,96 @@
+"""
+HTML to text extraction.
+
+Kept free of app imports so it loads quickly in the scraper's worker processes.
+"""
+from bs4 import BeautifulSoup
+import lxml.etree
+import lxml.html
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:  # optional, lxml is used instead
+    HTMLParser = None
+
+NON_CONTENT_TAGS = ['script', 'style', 'noscript', 'meta', 'link', 'head']
+
+def clean_whitespace(text: str) -> str:
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+def decode_html(content: bytes, encoding: str | None) -> str:
+    """Decode a response body the way httpx does: declared charset, else UTF-8."""
+    try:
+        return content.decode(encoding or 'utf-8', errors='replace')
+    except LookupError:
+        return content.decode('utf-8', errors='replace')
+
+def _parse_with_selectolax(html: str) -> tuple[str, list[str], str | None]:
+    tree = HTMLParser(html)
+    hrefs = [node.attributes.get('href') or '' for node in tree.css('a[href]')]
+    canonical = tree.css_first('link[rel="canonical"]')
+    canonical = canonical.attributes.get('href') if canonical else None
+    tree.strip_tags(NON_CONTENT_TAGS)
+    text = tree.root.text(separator=' ', strip=True) if tree.root else ''
+    return text, hrefs, canonical
+
+def _parse_with_lxml(html: str) -> tuple[str, list[str], str | None]:
+    document = lxml.html.document_fromstring(html)
+    hrefs = document.xpath('//a/@href')
+    canonical = document.xpath('//link[@rel="canonical"]/@href')
+    for element in list(document.iter(*NON_CONTENT_TAGS)):
+        element.drop_tree()
+    # Comments and processing instructions carry no page text
+    lxml.etree.strip_elements(document, lxml.etree.Comment, lxml.etree.ProcessingInstruction, with_tail=False)
+    text = ' '.join(part.strip() for part in document.itertext() if part.strip())
+    return text, [str(href) for href in hrefs], str(canonical[0]) if canonical else None
+
+def _parse_with_beautifulsoup(html: str) -> tuple[str, list[str], str | None]:
+    soup = BeautifulSoup(html, 'html5lib')
+    hrefs = [anchor.get('href') for anchor in soup.find_all('a', href=True)]
+    canonical = soup.find('link', rel='canonical', href=True)
+    canonical = canonical['href'] if canonical else None
+    for element in soup(NON_CONTENT_TAGS):
+        element.decompose()
+    return soup.get_text(separator=' ', strip=True), hrefs, canonical
+
+def extract_page(html: str) -> tuple[str, list[str], str | None]:
+    """
+    Parse an HTML page into its clean text, raw link targets and canonical URL.
+
+    Uses selectolax when installed, then lxml, and only falls back to the slower but
+    more forgiving html5lib parser when neither can handle the document.
+    """
+    parsers = [_parse_with_lxml, _parse_with_beautifulsoup]
+    if HTMLParser is not None:
+        parsers.insert(0, _parse_with_selectolax)
+    for parser in parsers[:-1]:
+        try:
+            text, hrefs, canonical = parser(html)
+            break
+        except Exception:
+            continue
+    else:
+        text, hrefs, canonical = parsers[-1](html)
+    return clean_whitespace(text), hrefs, canonical
+
+def extract_text_from_html(html: str) -> str:
+    """
+    Extract clean text from HTML content.
+
+    Args:
+        html: HTML content as string
+
+    Returns:
+        Clean text content
+    """
+    return extract_page(html)[0]
+
+def parse_document_text(content: bytes, encoding: str | None) -> str:
+    """Text of a downloaded document; run in the scraper's worker processes."""
+    return extract_text_from_html(decode_html(content, encoding))
+
+def parse_document_page(content: bytes, encoding: str | None) -> tuple[str, list[str], str | None]:
+    """Text, raw link targets and canonical URL of a downloaded page; run in the scraper's worker processes."""
+    return extract_page(decode_html(content, encoding))
@@ -1,8 +1,46 @@
+from contextlib import asynccontextmanager
+import httpx
 import os
 
-httpx_base_url = 'https://api-west.millis.ai'
+from app.core.config import settings
+from app.core.metrics import InstrumentedTransport, request_scope
+from app.core.resilience import ResilientTransport, millis_breaker
+
+# Overridable so the backend can be pointed at a local Millis simulator
+httpx_base_url = os.getenv('MILLIS_API_BASE_URL', 'https://api-west.millis.ai')
+
+# One client per pool: "interactive" for API requests, "background" for jobs and workers
+_millis_clients: dict[str, httpx.AsyncClient] = {}
 
 def get_httpx_headers():
     return {
         "Authorization": os.getenv('MILLIS_API_PRIVATE_KEY')
     }
+
+def get_httpx_client(background: bool | None = None) -> httpx.AsyncClient:
+    """
+    Shared Millis client: pooled keep-alive connections, per-call latency metrics, and
+    endpoint timeouts, retries and the circuit breaker of ``app.core.resilience``.
+
+    Work outside an API request uses the background pool unless ``background`` says otherwise.
+    """
+    if background is None:
+        background = request_scope.get() is None
+    pool = "background" if background else "interactive"
+    client = _millis_clients.get(pool)
+    if client is None or client.is_closed:
+        size = settings.MILLIS_BACKGROUND_MAX_CONNECTIONS if background else settings.MILLIS_INTERACTIVE_MAX_CONNECTIONS
+        limits = httpx.Limits(max_connections=size, max_keepalive_connections=size)
+        transport = InstrumentedTransport("millis", httpx.AsyncHTTPTransport(limits=limits))
+        client = _millis_clients[pool] = httpx.AsyncClient(transport=ResilientTransport(transport, millis_breaker))
+    return client
+
+@asynccontextmanager
+async def millis_client(background: bool | None = None):
+    """Drop-in for ``async with httpx.AsyncClient() as client`` that reuses the shared client."""
+    yield get_httpx_client(background)
+
+async def close_httpx_clients():
+    for client in _millis_clients.values():
+        await client.aclose()
+    _millis_clients.clear()
@@ -0,0 +1,321 @@
+"""
+End-to-end load test for the API.
+
+Drives the running backend with concurrent asyncio clients, one scenario at a time, and
+reports throughput and p50/p95/p99 latency. The backend should use a local Postgres and
+the Millis simulator; ``--start-stack`` launches both the simulator and uvicorn itself.
+
+    python -m benchmarks.load_test --start-stack --workers 4 --duration 30 --output bench.json
+    python -m benchmarks.load_test --start-stack --baseline bench.json
+
+Exit status is 1 when ``--baseline`` is given and any scenario regressed. Baselines only
+compare on the machine that produced them, so CI records one from the target branch in the
+same job (see the README) rather than committing it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.stats import compare_to_baseline, print_report, summarize
+
+API = "/api/v1"
+BENCH_EMAIL = "loadtest@bench.invalid"
+BENCH_PASSWORD = "loadtest-password"
+
+# Scenarios
+
+async def scenario_dashboard(client: httpx.AsyncClient, ctx: dict):
+    return await client.get(f"{API}/dashboard/", params={"time_period": random.choice(["today", "week", "month"])})
+
+async def scenario_call_logs(client: httpx.AsyncClient, ctx: dict):
+    return await client.get(f"{API}/call-logs/", params={"limit": 50, "agent_id": random.choice(ctx["agent_ids"])})
+
+async def scenario_agent_crud(client: httpx.AsyncClient, ctx: dict):
+    """One operation is create, update, read and delete of a fresh agent."""
+    response = await client.post(f"{API}/agent/", json={"name": "bench", "config": {"prompt": "benchmark"}})
+    if response.status_code >= 400:
+        return response
+    agent_id = response.json()["id"]
+    for request in (
+        client.put(f"{API}/agent/{agent_id}", json={"name": "bench", "config": {"prompt": "updated"}}),
+        client.get(f"{API}/agent/{agent_id}"),
+        client.delete(f"{API}/agent/{agent_id}"),
+    ):
+        response = await request
+        if response.status_code >= 400:
+            return response
+    return response
+
+async def scenario_campaign_records(client: httpx.AsyncClient, ctx: dict):
+    return await client.post(f"{API}/campaigns/{ctx['campaign_id']}/records", json=ctx["campaign_records"])
+
+async def scenario_chat(client: httpx.AsyncClient, ctx: dict):
+    payload = {"messages": [{"role": "user", "content": "Hello there"}], "agent": ctx["chat_agent"]}
+    return await client.post(f"{API}/chat/completions", json=payload)
+
+async def scenario_auth(client: httpx.AsyncClient, ctx: dict):
+    """Password login followed by a token-authenticated profile read."""
+    response = await client.post(
+        f"{API}/auth/jwt/login",
+        data={"username": BENCH_EMAIL, "password": BENCH_PASSWORD},
+        headers={"Authorization": ""},
+    )
+    if response.status_code >= 400:
+        return response
+    token = response.json()["access_token"]
+    return await client.get(f"{API}/auth/users/me", headers={"Authorization": f"Bearer {token}"})
+
+SCENARIOS = {
+    "dashboard": scenario_dashboard,
+    "call_logs": scenario_call_logs,
+    "agent_crud": scenario_agent_crud,
+    "campaign_records": scenario_campaign_records,
+    "chat": scenario_chat,
+    "auth": scenario_auth,
+}
+
+# Seeding
+
+async def seed_database(agent_count: int, call_log_count: int, seed: int) -> dict:
+    """Create the benchmark user, its agents and a deterministic set of recent call logs."""
+    from fastapi_users.jwt import generate_jwt
+    from fastapi_users.password import PasswordHelper
+    from sqlalchemy import delete, select
+
+    from app.core.config import settings
+    from app.core.database import Base, SessionLocal, engine
+    from app.models import Agent, CallLog, User
+    from app.simulator import SimulatorConfig
+    from app.simulator.store import SimulatorStore, agent_id_for
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    spacing = 30.0
+    store = SimulatorStore(SimulatorConfig(
+        seed=seed,
+        agent_count=agent_count,
+        call_log_count=call_log_count,
+        call_log_spacing_seconds=spacing,
+        # Logs end now so "today"/"week" dashboards have data
+        call_log_start_ts=time.time() - call_log_count * spacing,
+    ))
+
+    async with SessionLocal() as session:
+        result = await session.execute(select(User).where(User.email == BENCH_EMAIL))
+        user = result.unique().scalar_one_or_none()
+        if not user:
+            user = User(email=BENCH_EMAIL, hashed_password=PasswordHelper().hash(BENCH_PASSWORD))
+            session.add(user)
+        user.is_active = True
+        user.is_verified = True
+        user.subscription_status = "active"
+        user.subscription_quantity = 1_000_000
+        user.total_credit = 1e12
+        await session.flush()
+
+        agent_ids = [agent_id_for(index) for index in range(agent_count)]
+        for index, agent_id in enumerate(agent_ids):
+            await session.merge(Agent(
+                id=agent_id,
+                name=f"Simulated Agent {index}",
+                config={"prompt": f"You are simulated agent {index}."},
+                sip={},
+                tools=[],
+                user_id=user.id,
+                created_at=int(time.time()),
+            ))
+
+        await session.execute(delete(CallLog).where(CallLog.session_id.like("sim-session-%")))
+        batch = []
+        for index in range(call_log_count):
+            log = store.call_log(index)
+            batch.append(CallLog(
+                agent_id=log["agent_id"],
+                agent_config=log["agent_config"],
+                duration=log["duration"],
+                ts=log["ts"],
+                chat=log["chat"],
+                chars_used=log["chars_used"],
+                session_id=log["session_id"],
+                call_id=log["call_id"],
+                cost_breakdown=log["cost_breakdown"],
+                voip=log["voip"],
+                recording=log["recording"],
+                call_metadata=log["metadata"],
+                function_calls=log["function_calls"],
+                call_status=log["call_status"],
+            ))
+            if len(batch) >= 1000:
+                session.add_all(batch)
+                await session.flush()
+                batch = []
+        session.add_all(batch)
+        await session.commit()
+        user_id = user.id
+
+    await engine.dispose()
+    token = generate_jwt(
+        data={"sub": str(user_id), "aud": ["fastapi-users:auth"]},
+        secret=settings.JWT_SECRET_KEY,
+        lifetime_seconds=24 * 3600,
+    )
+    return {"token": token, "agent_ids": agent_ids}
+
+async def prepare_context(client: httpx.AsyncClient, seeded: dict) -> dict:
+    response = await client.post(f"{API}/campaigns/", json={"name": "Benchmark campaign"})
+    response.raise_for_status()
+    return {
+        **seeded,
+        "campaign_id": response.json()["id"],
+        # Fixed phone set so the stored records list does not grow during the run
+        "campaign_records": [{"phone": f"+1555{index:07d}", "name": f"Lead {index}"} for index in range(100)],
+        "chat_agent": {
+            "id": seeded["agent_ids"][0],
+            "name": "Simulated Agent 0",
+            "config": {"prompt": "You are simulated agent 0."},
+            "created_at": 0,
+        },
+    }
+
+# Runner
+
+async def run_scenario(name: str, client: httpx.AsyncClient, ctx: dict, concurrency: int, duration: float, warmup: float) -> dict:
+    operation = SCENARIOS[name]
+    latencies: list[float] = []
+    errors = 0
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def worker():
+        nonlocal errors
+        while True:
+            begin = time.perf_counter()
+            if begin >= deadline:
+                return
+            try:
+                response = await operation(client, ctx)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            if begin < measure_from:
+                continue
+            if failed:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - begin)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - measure_from)
+
+async def wait_until_healthy(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                response = await client.get(url)
+                if response.status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"{url} did not become healthy within {timeout}s")
+
+def start_stack(args) -> list[subprocess.Popen]:
+    """Launch the Millis simulator and the API under uvicorn, wired together."""
+    simulator_url = f"http://127.0.0.1:{args.simulator_port}"
+    env = {**os.environ, "MILLIS_API_BASE_URL": simulator_url}
+    simulator = subprocess.Popen(
+        [sys.executable, "-m", "app.simulator", "--port", str(args.simulator_port),
+         "--latency-ms", str(args.upstream_latency_ms), "--agents", str(args.agents), "--seed", str(args.seed),
+         # Call logs are seeded straight into Postgres; keep the background ingester idle
+         "--call-logs", "0"],
+        env=env,
+    )
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.api_port),
+         "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+        env=env,
+    )
+    return [simulator, api]
+
+async def main_async(args) -> int:
+    processes = start_stack(args) if args.start_stack else []
+    try:
+        base_url = args.base_url or f"http://127.0.0.1:{args.api_port}"
+        await wait_until_healthy(f"{base_url}{API}/health")
+        seeded = await seed_database(args.agents, args.call_logs, args.seed)
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        headers = {"Authorization": f"Bearer {seeded['token']}"}
+        async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+            ctx = await prepare_context(client, seeded)
+            scenarios = {}
+            for name in args.scenarios:
+                print(f"Running {name} for {args.duration}s at concurrency {args.concurrency}...")
+                scenarios[name] = await run_scenario(name, client, ctx, args.concurrency, args.duration, args.warmup)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "workers": args.workers if args.start_stack else None,
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "upstream_latency_ms": args.upstream_latency_ms,
+            "agents": args.agents,
+            "call_logs": args.call_logs,
+            "seed": args.seed,
+        },
+        "scenarios": scenarios,
+    }
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the API")
+    parser.add_argument("--base-url", help="Target an already running API instead of the default port")
+    parser.add_argument("--start-stack", action="store_true", help="Launch the simulator and uvicorn")
+    parser.add_argument("--api-port", type=int, default=8100)
+    parser.add_argument("--simulator-port", type=int, default=9100)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when using --start-stack")
+    parser.add_argument("--upstream-latency-ms", type=float, default=50, help="Simulated Millis latency")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20, help="Measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds before each scenario")
+    parser.add_argument("--agents", type=int, default=10)
+    parser.add_argument("--call-logs", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here (use it as a future baseline)")
+    parser.add_argument("--baseline", help="Compare against a previous JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_async(parse_args())))
@@ -0,0 +1,58 @@
+"""Latency statistics and baseline comparison shared by the benchmark scripts."""
+import json
+import math
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    """Summarize per-request latencies (seconds) into the report format, in milliseconds."""
+    values = sorted(latencies)
+    count = len(values) + errors
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+def compare_to_baseline(results: dict, baseline_path: str, tolerance: float) -> list[str]:
+    """
+    Return a list of regressions against a saved baseline.
+
+    A scenario regresses when its p95 grows, or its throughput drops, by more than
+    ``tolerance`` (a fraction), or when its error rate rises by more than one point.
+    """
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms vs baseline {previous['p95_ms']}ms")
+        if previous["throughput_rps"] and current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput_rps']}rps vs baseline {previous['throughput_rps']}rps")
+        if current["error_rate"] > previous["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {current['error_rate']} vs baseline {previous['error_rate']}")
+    return regressions
+
+def print_report(results: dict):
+    header = f"{'scenario':<24}{'reqs':>8}{'errors':>8}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, row in results["scenarios"].items():
+        print(
+            f"{name:<24}{row['requests']:>8}{row['errors']:>8}{row['throughput_rps']:>10}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+        )
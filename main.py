@@ -4,17 +4,33 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi_users import exceptions as fau_exceptions
+from sqlalchemy import text
 import asyncio
 import nest_asyncio
 
 from app.core.config import settings
 from app.core.database import Base, engine
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import MetricsMiddleware, instrument_stripe, register_pool_metrics
 from app.utils.log import check_folder_exist
 from app.routers.api import api_router
+from app.routers.metrics import router as metrics_router
 from app.routers.call_logs import get_all_logs, get_next_logs
 from app.services.campaign_scheduler import campaign_scheduler
 from app.routers.stripe import process_all_auto_refills
+from app.services.agent_links import backfill_agent_links
 from app.services.agent_credit_monitor import monitor_agent_credit
+from app.services.agent_sync import sync_agents
+from app.services.crawler import website_crawler
+from app.services.email_sender import email_sender, purge_email_outbox
+from app.services.knowledge_refresh import refresh_knowledge_sources
+from app.services.millis_outbox import millis_outbox, purge_millis_outbox
+from app.services.scrape_cache import evict_scrape_cache
+from app.services.scraper import shutdown_scraper
+from app.services.sip_sessions import migrate_agent_sip, purge_sip_sessions
+from app.services.webhook_deliverer import purge_webhook_outbox, webhook_deliverer
+from app.utils.email_templates import email_templates
+from app.utils.httpx import close_httpx_clients
 
 # Apply nest_asyncio to allow nested event loops
 nest_asyncio.apply()
@@ -22,12 +38,31 @@ nest_asyncio.apply()
 async def init_models():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # create_all does not add columns or indexes to existing tables
+        await conn.execute(text("ALTER TABLE tools ADD COLUMN IF NOT EXISTS function_spec JSONB"))
+        await conn.execute(text("ALTER TABLE agents ADD COLUMN IF NOT EXISTS app_functions_hash VARCHAR(64)"))
+        await conn.execute(text("ALTER TABLE agents ADD COLUMN IF NOT EXISTS status TEXT"))
+        await conn.execute(text("ALTER TABLE agents ADD COLUMN IF NOT EXISTS remote_hash VARCHAR(64)"))
+        await conn.execute(text("ALTER TABLE agents ADD COLUMN IF NOT EXISTS synced_at BIGINT"))
+        await conn.execute(text("ALTER TABLE agents ADD COLUMN IF NOT EXISTS knowledge_messages JSON"))
+        await conn.execute(text("ALTER TABLE automation_webhooks ADD COLUMN IF NOT EXISTS batch BOOLEAN NOT NULL DEFAULT FALSE"))
+        await conn.execute(text("ALTER TABLE millis_outbox ADD COLUMN IF NOT EXISTS outcome_unknown BOOLEAN NOT NULL DEFAULT FALSE"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_agents_user_id ON agents (user_id)"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_call_logs_agent_id_ts ON call_logs (agent_id, ts)"))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Get the current event loop
     loop = asyncio.get_running_loop()
     
+    # Expose pool usage and Stripe call latency on /metrics
+    register_pool_metrics(engine)
+    instrument_stripe()
+    
+    # Measure event loop lag and log the stack of anything that blocks it
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    
     # Create scheduler with the current event loop
     scheduler = AsyncIOScheduler(event_loop=loop)
     
@@ -39,6 +74,27 @@ async def lifespan(app: FastAPI):
     
     # Monitor agent credit and stop/start agents accordingly
     scheduler.add_job(monitor_agent_credit, trigger='interval', minutes=1, id='monitor_agent_credit')
+    
+    # Reconcile the agents table with Millis and record the drift it finds
+    scheduler.add_job(sync_agents, trigger='interval', minutes=settings.AGENT_SYNC_INTERVAL_MINUTES, id='sync_agents', max_instances=1)
+    
+    # Keep the scrape cache within its TTL and size bound
+    scheduler.add_job(evict_scrape_cache, trigger='interval', hours=1, id='evict_scrape_cache')
+    
+    # Re-scrape URL-sourced knowledge that is due and re-upload what changed
+    scheduler.add_job(refresh_knowledge_sources, trigger='interval', minutes=5, id='refresh_knowledge_sources', max_instances=1)
+    
+    # Drop SIP sessions past their TTL
+    scheduler.add_job(purge_sip_sessions, trigger='interval', hours=1, id='purge_sip_sessions')
+    
+    # Drop old sent/failed emails from the outbox
+    scheduler.add_job(purge_email_outbox, trigger='interval', hours=6, id='purge_email_outbox')
+    
+    # Drop old delivered/failed events from the webhook outbox
+    scheduler.add_job(purge_webhook_outbox, trigger='interval', hours=6, id='purge_webhook_outbox')
+    
+    # Drop old done/failed Millis operations from the outbox
+    scheduler.add_job(purge_millis_outbox, trigger='interval', hours=6, id='purge_millis_outbox')
 
     # Start scheduler
     scheduler.start()
@@ -46,9 +102,25 @@ async def lifespan(app: FastAPI):
     # Initialize database
     await init_models()
     
+    # Index which agents use which tools and calendars, for agents saved before the link tables
+    await backfill_agent_links()
+    
+    # Move SIP call ids out of the agents' sip maps into sip_sessions
+    await migrate_agent_sip()
+    
     # Start campaign scheduler
     await campaign_scheduler.start()
     
+    # Compile email templates up front, then send queued emails over pooled SMTP connections
+    email_templates.load()
+    email_sender.start()
+    
+    # Deliver queued call and campaign events to automation webhooks
+    webhook_deliverer.start()
+    
+    # Carry out Millis calls recorded with local changes, retrying until Millis has them
+    millis_outbox.start()
+    
     # Ensure folder exists
     check_folder_exist()
     
@@ -61,6 +133,13 @@ async def lifespan(app: FastAPI):
     scheduler.remove_job('get_next_logs')
     scheduler.remove_job('check_auto_refills')
     scheduler.remove_job('monitor_agent_credit')
+    scheduler.remove_job('sync_agents')
+    scheduler.remove_job('evict_scrape_cache')
+    scheduler.remove_job('refresh_knowledge_sources')
+    scheduler.remove_job('purge_sip_sessions')
+    scheduler.remove_job('purge_email_outbox')
+    scheduler.remove_job('purge_webhook_outbox')
+    scheduler.remove_job('purge_millis_outbox')
     scheduler.shutdown()
     campaign_scheduler.shutdown()
     
@@ -70,6 +149,14 @@ async def lifespan(app: FastAPI):
         await logs_task
     except asyncio.CancelledError:
         pass
+    
+    await website_crawler.shutdown()
+    await email_sender.shutdown()
+    await webhook_deliverer.shutdown()
+    await millis_outbox.shutdown()
+    await close_httpx_clients()
+    shutdown_scraper()
+    await loop_monitor.stop()
 
 app = FastAPI(
     title=settings.APP_NAME,
@@ -95,7 +182,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost middleware so latency covers CORS and every router
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(api_router)
+app.include_router(metrics_router)
 # app.get("/all_log", tags=["Fetch log"])(get_msg_log)
 
 @app.get("/")
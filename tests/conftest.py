@@ -0,0 +1 @@
+pytest_plugins = ["app.simulator.fixtures"]
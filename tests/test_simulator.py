@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from app.simulator import SimulatorConfig
+
+def test_create_agent_keeps_metadata(millis_simulator):
+    # The outbox finds agents created without an answer by this marker
+    response = millis_simulator.post("/agents", json={"name": "Support", "metadata": {"outbox_operation_id": "op-1"}})
+    assert response.status_code == 200
+    agent = response.json()
+
+    agents = millis_simulator.get("/agents").json()
+    assert agent in agents
+    assert agent["metadata"] == {"outbox_operation_id": "op-1"}
+
+def test_call_logs_cursor_reaches_every_log(millis_simulator):
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 100}
+        if cursor:
+            params["start_after_ts"] = cursor
+        page = millis_simulator.get("/call-logs", params=params).json()
+        seen.extend(history["session_id"] for history in page["histories"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen)) == 1000
+
+class TestRateLimit:
+    @pytest.fixture
+    def millis_simulator_config(self):
+        return SimulatorConfig(latency_ms=0, error_rate=0, rate_limit_per_second=0.001, rate_limit_burst=1)
+
+    def test_excess_requests_get_retry_after(self, millis_simulator):
+        assert millis_simulator.get("/agents").status_code == 200
+        response = millis_simulator.get("/agents")
+        assert response.status_code == 429
+        assert float(response.headers["Retry-After"]) > 0
+
+def test_backend_client_reaches_server(millis_simulator_server):
+    from app.utils.httpx import close_httpx_clients, get_httpx_client
+
+    async def list_agents():
+        try:
+            return await get_httpx_client(background=True).get(f"{millis_simulator_server}/agents")
+        finally:
+            await close_httpx_clients()
+
+    response = asyncio.run(list_agents())
+    assert response.status_code == 200
+    assert len(response.json()) == SimulatorConfig().agent_count